@@ -51,6 +51,29 @@ if __name__ == '__main__':
     pyjs.translator.main()
 """
 
+pyjsserve = """#!%(exec)s
+
+pyjsversion = r'%(ver)s'
+pyjspth = r'%(pyjspth)s'
+
+import os
+import sys
+sys.path[0:0] = [r'%(pth)s']
+sys.path.append(os.path.join(pyjspth, 'pgen'))
+import pyjs
+pyjs.pyjspth = pyjspth
+pyjs.path += [os.path.join(pyjspth, 'library'),
+os.path.join(pyjspth, 'addons'),
+]
+
+import pyjs.serve
+if __name__ == '__main__':
+    if "--version" in sys.argv:
+        print "Version:", pyjsversion
+        sys.exit(0)
+    pyjs.serve.serve_script()
+"""
+
 pyjdinitpth = os.path.join("pyjd", "__init__.py.in")
 pyjdinit = open(pyjdinitpth, "r").read()
 
@@ -120,6 +143,7 @@ if __name__ == '__main__':
 
     make_cmd(prefix, pth, version, pyjspth, "pyjsbuild", pyjsbuild)
     make_cmd(prefix, pth, version, pyjspth, "pyjscompile", pyjscompile)
+    make_cmd(prefix, pth, version, pyjspth, "pyjsserve", pyjsserve)
 
     # create pyjd/__init__.py
     pyjdinitpth = os.path.join("pyjd", "__init__.py")
@@ -1,39 +1,226 @@
 #!/usr/bin/env python
-import os, sys, glob
-
-options = " ".join(sys.argv[1:])
-if not options:
-    options = "-O"
-for pyjsbuild in ('../bin/pyjsbuild.py', '../bin/pyjsbuild', None):
-    if os.path.exists(pyjsbuild):
-        break
-if not pyjsbuild:
-    sys.stderr.write("Cannot find pyjsbuild")
-    sys.exit(1)
+"""Builds all examples.
+
+The examples are built in this process, or in several worker processes
+with --workers, instead of running pyjsbuild once per example. All
+builds share a translation cache, so pyjslib and the library modules
+are translated once for all examples.
+
+Options which buildall.py does not know are passed to pyjsbuild (-O if
+there are none). An example is built like its build.sh does, with the
+options and applications of its pyjsbuild lines.
+
+    python buildall.py --workers 4 --report report.json -O
+"""
+import os, sys, glob, time, shlex, traceback
+from cStringIO import StringIO
+from optparse import OptionParser, BadOptionError, AmbiguousOptionError
+
+examples = os.path.dirname(os.path.abspath(__file__))
+pyjspth = os.path.dirname(examples)
+sys.path[0:0] = [os.path.join(pyjspth, 'pyjs', 'src')]
+sys.path.append(os.path.join(pyjspth, 'pgen'))
+import pyjs
+pyjs.pyjspth = pyjspth
+pyjs.path += [os.path.join(pyjspth, 'library'),
+              os.path.join(pyjspth, 'addons'),
+             ]
+from pyjs import browser
+from pyjs import linker
+try:
+    import json
+except ImportError:
+    import simplejson as json
+
+library_path = pyjs.path[1:]
+
+
+class PassThroughParser(OptionParser):
+    """keeps the options it does not know in the arguments"""
+
+    def _process_args(self, largs, rargs, values):
+        while rargs:
+            try:
+                OptionParser._process_args(self, largs, rargs, values)
+            except (BadOptionError, AmbiguousOptionError), e:
+                largs.append(e.opt_str)
+
 
 def guessMainScriptName(d):
-    if os.path.isfile('build.sh'):
-        for line in file('build.sh'):
-            line = line.strip()
-            if not line or line.startswith('#'): continue
-            name = line.split()[-1]
-            f = name + '.py'
-            if os.path.isfile(f): return name
     for f in glob.glob('*.py'):
         name, ext = os.path.splitext(f)
         if name.lower() in d.lower(): return name
     return ''
 
-for d in os.listdir('.'):
-    if os.path.isdir(d):
-        os.chdir(d)
+def buildCommands(d):
+    """returns (options, applications) of the pyjsbuild lines of
+    build.sh, or guesses the application"""
+    commands = []
+    if os.path.isfile('build.sh'):
+        for line in file('build.sh'):
+            line = line.strip()
+            if not line or line.startswith('#'): continue
+            try:
+                words = shlex.split(line)
+            except ValueError:
+                continue
+            if not words or not words[0].endswith('pyjsbuild'): continue
+            options, apps = [], []
+            command = False
+            for word in words[1:]:
+                if word.startswith('`') or command:
+                    # the output of a command is not known here
+                    command = not word.endswith('`') or word == '`'
+                    continue
+                if word.startswith('$'):
+                    # the options of build.sh
+                    continue
+                if word.startswith('-') or options and options[-1] in (
+                        '--dynamic', '--include-js', '-j', '-o', '-I',
+                        '--output', '--library_dir', '-P', '--platforms'):
+                    options.append(word)
+                else:
+                    apps.append(word)
+            apps = [a for a in apps if os.path.isfile(a + '.py')]
+            if apps:
+                commands.append((options, apps))
+    if not commands:
+        name = guessMainScriptName(d)
+        if name:
+            commands.append(([], [name]))
+    return commands
+
+def build(d, options, apps, pyjsbuild_args):
+    """builds apps in the current directory, returns a result for the
+    report"""
+    argv = ['pyjsbuild'] + options + pyjsbuild_args + [a + '.py' for a in apps]
+    result = dict(example=d, apps=apps, args=argv[1:])
+    pyjs.path[:] = [os.path.abspath('')] + library_path
+    linker.clear_path_cache()
+    log = StringIO()
+    save_argv, save_stdout = sys.argv, sys.stdout
+    sys.argv, sys.stdout = argv, log
+    start = time.time()
+    try:
         try:
-            if os.path.isdir('output'): continue
-            name = guessMainScriptName(d)
-            if not name: continue
-            f = name + '.py'
-            print("********** Building %s **********" % name.upper())
-            os.system("python ../%s %s %s" % (pyjsbuild, options, f))
-        finally:
-            #raw_input('Press any key')
-            os.chdir("..")
+            browser.build_script()
+            result['status'] = 'ok'
+        except SystemExit, e:
+            result['status'] = e.code and 'failed' or 'ok'
+        except Exception:
+            traceback.print_exc(file=log)
+            result['status'] = 'failed'
+    finally:
+        sys.argv, sys.stdout = save_argv, save_stdout
+    result['seconds'] = round(time.time() - start, 3)
+    if result['status'] != 'ok':
+        result['log'] = log.getvalue()
+    return result
+
+def buildExample(d, pyjsbuild_args, force=False):
+    """builds the applications of an example directory one after the
+    other, they may share the output directory"""
+    os.chdir(os.path.join(examples, d))
+    if not force and os.path.isdir('output'):
+        return [dict(example=d, status='skipped')]
+    return [build(d, options, apps, pyjsbuild_args)
+            for options, apps in buildCommands(d)]
+
+def worker(queue, results, pyjsbuild_args, force):
+    # not a multiprocessing.Pool, so that builds can use --jobs and
+    # --gzip, which start processes of their own
+    while True:
+        d = queue.get()
+        if d is None:
+            break
+        try:
+            results.put(buildExample(d, pyjsbuild_args, force))
+        except Exception:
+            results.put([dict(example=d, status='failed',
+                              log=traceback.format_exc())])
+
+def buildAll(dirs, pyjsbuild_args, workers=1, force=False):
+    """yields the results of the builds of the example directories as
+    they finish"""
+    if workers <= 1:
+        for d in dirs:
+            for result in buildExample(d, pyjsbuild_args, force):
+                yield result
+        return
+    import multiprocessing
+    queue = multiprocessing.Queue()
+    results = multiprocessing.Queue()
+    for d in dirs:
+        queue.put(d)
+    processes = []
+    for i in range(min(workers, len(dirs))):
+        queue.put(None)
+        p = multiprocessing.Process(target=worker,
+                                    args=(queue, results, pyjsbuild_args,
+                                          force))
+        p.start()
+        processes.append(p)
+    try:
+        for i in range(len(dirs)):
+            for result in results.get():
+                yield result
+    finally:
+        for p in processes:
+            p.join()
+
+def main():
+    usage = """
+    usage: %prog [options] [pyjsbuild options]
+    """
+    parser = PassThroughParser(usage=usage)
+    parser.add_option("--workers", dest="workers", type="int", default=1,
+                      help="number of processes building examples")
+    parser.add_option("--example", dest="examples", action="append",
+                      default=[],
+                      help="build this example directory (all by default)")
+    parser.add_option("--force", dest="force", action="store_true",
+                      default=False,
+                      help="build examples which have an output directory")
+    parser.add_option("--report", dest="report", default=None,
+                      help="write the results as json to this file")
+    options, pyjsbuild_args = parser.parse_args()
+    if not pyjsbuild_args:
+        pyjsbuild_args = ["-O"]
+    if not [a for a in pyjsbuild_args if a.startswith('--cache-dir')]:
+        pyjsbuild_args += ['--cache-dir', os.path.join(examples, '.pyjscache')]
+    report = options.report and os.path.abspath(options.report)
+
+    dirs = options.examples
+    if not dirs:
+        dirs = sorted([d for d in os.listdir(examples)
+                       if os.path.isdir(os.path.join(examples, d))
+                       and not d.startswith('.')])
+
+    start = time.time()
+    results = []
+    for result in buildAll(dirs, pyjsbuild_args, options.workers,
+                           options.force):
+        results.append(result)
+        name = result['example']
+        if result.get('apps'):
+            name += '/' + ','.join(result['apps'])
+        print "%-8s %7.2fs %s" % (result['status'], result.get('seconds', 0),
+                                  name)
+        if result['status'] == 'failed':
+            sys.stdout.write(result['log'])
+        sys.stdout.flush()
+    failed = [r for r in results if r['status'] == 'failed']
+    total = time.time() - start
+    print "Built %d applications in %.2fs, %d failed" % (
+        len([r for r in results if r['status'] != 'skipped']), total,
+        len(failed))
+    if report:
+        f = open(report, 'w')
+        json.dump(dict(seconds=round(total, 3), args=pyjsbuild_args,
+                       results=results), f, indent=1, sort_keys=True)
+        f.close()
+    if failed:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -719,6 +719,30 @@ class ArgsTest(UnitTest):
         self.assertEqual(fn(), 1)
         self.assertEqual(A().fn(), 1)
 
+    def testKeywordOrder(self):
+        order = []
+        def arg(value):
+            order.append(value)
+            return value
+        self.assertEqual(foo(c=arg(3), a=arg(1), b=arg(2)), [1, 2, 3])
+        self.assertEqual(order, [3, 1, 2])
+        self.assertEqual(foo3(c=5), [1, 2, 5])
+        self.assertEqual(foo3(1, c=5, b=4), [1, 4, 5])
+        obj = ArgsTestClass_foo3(b=7)
+        self.assertEqual(obj.x, [1, 7, 3])
+        obj = ArgsTestClass_foo3_sub(c=8)
+        self.assertEqual(obj.x, [1, 2, 8])
+        try:
+            foo(1, a=1)
+            self.fail("TypeError 'foo() got multiple values for keyword argument 'a'' not raised")
+        except TypeError:
+            pass
+        try:
+            foo3(d=1)
+            self.fail("TypeError 'foo3() got an unexpected keyword argument 'd'' not raised")
+        except TypeError:
+            pass
+
 
 def foo(a, b, c):
     return [a, b, c]
@@ -756,6 +780,9 @@ class ArgsTestClass_foo3:
     def __init__(self, a=1, b=2, c=3):
         self.x = [a, b, c]
 
+class ArgsTestClass_foo3_sub(ArgsTestClass_foo3):
+    pass
+
 class ArgsTestClass_foo4:
     def __init__(self, a, b, c, *args):
         self.x = a, b, c, args
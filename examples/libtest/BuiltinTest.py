@@ -1,4 +1,5 @@
 from UnitTest import UnitTest
+import math
 
 try:
     builtin_value = builtin.value
@@ -11,6 +12,8 @@ import builtin
 from imports.cls import CLS
 from imports.cls1 import CLS as CLS1
 
+CONSTANT_WIDTH = 2 * 5
+CONSTANT_NAME = 'con' + 'stant'
 
 def other(**kwargs):
     return kwargs
@@ -278,3 +281,112 @@ class BuiltinTest(UnitTest):
         self.assertEqual(str(xrange(3,4,5)), "xrange(3, 8, 5)")
         self.assertEqual(str(xrange(14,3,-5)), "xrange(14, -1, -5)")
 
+    def testRangeLoop(self):
+        def loop(*args):
+            r = []
+            for i in range(*args):
+                r.append(i)
+            return r
+        n, m, step = 3, 15, 3
+        r = []
+        for i in range(n):
+            r.append(i)
+        self.assertEqual(r, loop(3))
+        r = []
+        for i in range(n, m, step):
+            r.append(i)
+        self.assertEqual(r, loop(3, 15, 3))
+        r = []
+        for i in xrange(m, n, -step):
+            r.append(i)
+        self.assertEqual(r, [15, 12, 9, 6])
+        r = []
+        for i in range(15, 2, -3):
+            r.append(i)
+        self.assertEqual(r, [15, 12, 9, 6, 3])
+        r = []
+        for i in xrange(-6, -2, -1):
+            r.append(i)
+        self.assertEqual(r, [])
+
+        i = 'unchanged'
+        for i in range(0):
+            pass
+        self.assertEqual(i, 'unchanged')
+        for i in range(5):
+            if i == 3:
+                break
+        self.assertEqual(i, 3)
+        r = []
+        for i in range(3):
+            r.append(i)
+            i = 10
+        self.assertEqual(r, [0, 1, 2])
+        self.assertEqual(i, 10)
+
+        try:
+            for i in range(0, 5, step - 3):
+                pass
+            self.fail("range() with step 0 should raise ValueError")
+        except ValueError:
+            pass
+        try:
+            for i in xrange('3'):
+                pass
+            self.fail("xrange('3') should raise TypeError")
+        except TypeError:
+            pass
+
+    def testRangeLoopShadowed(self):
+        def range(*args):
+            return ['x']
+        r = []
+        for i in range(3):
+            r.append(i)
+        self.assertEqual(r, ['x'])
+
+
+    def testNumericLocals(self):
+        total = 0
+        count = 0
+        for i in range(10):
+            total += i * 2 - 1
+            if i % 3 == 0:
+                count = count + 1
+        self.assertEqual(total, 80)
+        self.assertEqual(count, 4)
+        self.assertTrue(0 < count <= 4)
+        self.assertFalse(count != 4)
+
+        n = len([1, 2, 3])
+        x = float(n) / 2
+        self.assertEqual(x, 1.5)
+        self.assertEqual(n // 2, 1)
+        self.assertEqual(-n, -3)
+        self.assertTrue(x < n)
+
+        s = 0
+        s = 'no longer a number'
+        self.assertEqual(s + '!', 'no longer a number!')
+
+    def testConstantExpressions(self):
+        self.assertEqual(2 * 3.5 + 1, 8.0)
+        self.assertEqual('a' + 'b', 'ab')
+        self.assertEqual(-1 + 0, -1)
+        self.assertEqual(-(-2), 2)
+        self.assertEqual(1 << 16, 65536)
+        self.assertEqual(~0 | 8 & 12 ^ 1, -1)
+        self.assertEqual(7 / 2.0, 3.5)
+        self.assertEqual(-7 // 2, -4)
+        self.assertEqual(7 % 3, 1)
+        self.assertEqual(2 ** 10, 1024)
+        self.assertEqual(2 * math.pi, math.pi + math.pi)
+
+        self.assertEqual(CONSTANT_WIDTH * 2, 20)
+        self.assertEqual(CONSTANT_NAME, 'constant')
+        x = 1 if CONSTANT_WIDTH > 5 else 2
+        self.assertEqual(x, 1)
+        if not CONSTANT_WIDTH:
+            self.fail("Constant condition is false")
+        while 0:
+            self.fail("Constant condition is true")
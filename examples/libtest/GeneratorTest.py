@@ -576,12 +576,69 @@ class GeneratorTest(UnitTest):
         self.assertEqual(g.next(), 1)
         self.assertEqual(g.next(), 2)
 
+    def testIterationProtocol(self):
+        # loops and builtins do not need StopIteration to end, but
+        # iterators which raise it must work as well
+        self.assertEqual(list(Countdown(3)), [2, 1, 0])
+        self.assertEqual(tuple(Countdown(2)), (1, 0))
+        self.assertEqual(dict([(i, str(i)) for i in Countdown(2)]),
+                         {0: '0', 1: '1'})
+        self.assertEqual(','.join(str(i) for i in Countdown(3)), '2,1,0')
+        def args(*a):
+            return a
+        self.assertEqual(args(*Countdown(2)), (1, 0))
+
+        l = []
+        for i in Countdown(3):
+            l.append(i)
+        self.assertEqual(l, [2, 1, 0])
+        self.assertEqual(i, 0)
+        for i in Countdown(0):
+            self.fail("empty iterator")
+        self.assertEqual(i, 0)
+
+        def fn():
+            yield 1
+            raise KeyError('test')
+        l = []
+        try:
+            for i in fn():
+                l.append(i)
+            self.fail("KeyError expected")
+        except KeyError, e:
+            self.assertEqual(e[0], 'test')
+        self.assertEqual(l, [1])
+
+        def fn():
+            try:
+                yield 1
+            except TypeError:
+                pass
+        g = fn()
+        self.assertEqual(g.next(), 1)
+        try:
+            g.throw(TypeError, 'test')
+            self.fail("StopIteration expected")
+        except StopIteration:
+            self.assertTrue(True)
+
 
 class A(object):
     def fn(self):
         yield 1
         yield 2
 
+class Countdown(object):
+    def __init__(self, n):
+        self.n = n
+    def __iter__(self):
+        return self
+    def next(self):
+        if self.n == 0:
+            raise StopIteration
+        self.n -= 1
+        return self.n
+
 inorder = None
 # A binary tree class.
 class Tree:
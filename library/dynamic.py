@@ -161,26 +161,135 @@ def ajax_import(url, namespace=None, names=None):
         module = __imported__[url]
     else:
         req = load(url, None, None, False)
-        module = None
-        name_getter = []
-        if names is None:
-            names = []
-        for name in names:
-            name_getter.append("$pyjs$moduleObject['%s'] = %s;" % (name, name))
-        
-        script = """(function ( ) {
+        module = eval_import(url, req.responseText, names)
+    inject(module, namespace, names)
+
+def eval_import(url, code, names=None):
+    module = None
+    name_getter = []
+    if names is None:
+        names = []
+    for name in names:
+        name_getter.append("$pyjs$moduleObject['%s'] = %s;" % (name, name))
+
+    script = """(function ( ) {
 $pyjs$moduleObject={};
 %s;
 %s
 return $pyjs$moduleObject;
-})();""" % (req.responseText, "\n".join(name_getter))
-        try:
-            module = eval(script)
-        except:
-            e = sys.exc_info()
-            raise AjaxError("Error in %s: %s" % (url, e.message))
-        __imported__[url] = module
-    inject(module, namespace, names)
+})();""" % (code, "\n".join(name_getter))
+    if JS("$pyjs.options.source_map"):
+        # name the evaluated code after its url, so that its stack
+        # frames are resolved through the source map of the url. the
+        # code starts on the third line of the script
+        script += "\n//# sourceURL=" + url
+        JS("sys.source_line_offsets[url] = 2;")
+    try:
+        module = eval(script)
+    except:
+        e = sys.exc_info()
+        raise AjaxError("Error in %s: %s" % (url, e.message))
+    __imported__[url] = module
+    return module
+
+#
+#  module_url(name)
+#
+#  @param name      module name
+#  @returns         url of the module file if the module is loaded
+#                   dynamically, None otherwise
+#
+
+def module_url(name):
+    if JS("""typeof $pyjs.dynamic_manifest == 'undefined'
+             || typeof $pyjs.dynamic_manifest[name] == 'undefined'"""):
+        return None
+    return JS("""$pyjs.dynamic_manifest[name][0]""")
+
+#
+#  module_closure(names)
+#
+#  @param names     module names
+#  @returns         list of the dynamic modules which are not loaded yet
+#                   and needed by names, each as (name, url). modules
+#                   sharing a file (a chunk) are listed once
+#
+
+def module_closure(names):
+    closure = []
+    seen = {}
+    urls = {}
+    pending = list(names)
+    while pending:
+        name = pending.pop()
+        if seen.has_key(name):
+            continue
+        seen[name] = True
+        url = module_url(name)
+        if url is None:
+            continue
+        if (    JS("""typeof $pyjs.loaded_modules[name] == 'undefined'""")
+            and not urls.has_key(url)
+           ):
+            urls[url] = True
+            closure.append((name, url))
+        pending.extend(list(JS("""$pyjs.dynamic_manifest[name][1]""")))
+    return closure
+
+#
+#  load_modules(names, on_load_fn, on_error_fn)
+#
+#  Loads the dynamic modules names and the dynamic modules they import
+#  in parallel, without blocking. When all of them are available,
+#  on_load_fn() is called and the modules can be imported without any
+#  further request.
+#
+#  @param names         module names
+#  @param on_load_fn    function called when all modules are loaded
+#  @param on_error_fn   function called with the url and status code
+#                       of the first module which could not be loaded
+#
+
+def load_modules(names, on_load_fn=None, on_error_fn=None):
+    setCompilerOptions("noDebug")
+    closure = module_closure(names)
+    state = {'missing': len(closure), 'failed': False}
+    sources = {}
+
+    def loaded():
+        # evaluate in manifest order, so that the result does not
+        # depend on the order of the responses
+        for name, url in closure:
+            if JS("""typeof $pyjs.loaded_modules[name] == 'undefined'"""):
+                eval_import(url, sources[url])
+        if not on_load_fn is None:
+            on_load_fn()
+
+    def request(url):
+        req = createHttpRequest()
+        def onreadystatechange():
+            if req.readyState != 4 or state['failed']:
+                return
+            if req.status == 200 or (req.status == 0 and req.responseText):
+                sources[url] = req.responseText
+                state['missing'] -= 1
+                if state['missing'] == 0:
+                    loaded()
+            else:
+                state['failed'] = True
+                if not on_error_fn is None:
+                    on_error_fn(url, req.status)
+        # next line is in JS() for IE6
+        JS("req.onreadystatechange = onreadystatechange")
+        req.open("GET", url, True)
+        req.send(None)
+
+    if not closure:
+        if not on_load_fn is None:
+            on_load_fn()
+        return
+    for name, url in closure:
+        request(url)
 
 
 # From here, just converted from dynamicajax.js
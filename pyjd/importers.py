@@ -35,11 +35,18 @@ _suffix = '.py' + _suffix_char
 # the C_EXTENSION suffixes
 _c_suffixes = filter(lambda x: x[2] == imp.C_EXTENSION, imp.get_suffixes())
 
-from modcompile import PlatformParser, Module
+from modcompile import PlatformParser, Module, astcache
 
-pp = PlatformParser('platform', verbose=1)
+# parsed modules are kept in ~/.pyjd/astcache between runs
+if astcache is not None:
+    ast_cache = astcache.ASTCache(os.path.join(os.environ.get('HOME', '.'),
+                                               '.pyjd', 'astcache'))
+else:
+    ast_cache = None
+
+pp = PlatformParser('platform', verbose=1, ast_cache=ast_cache)
 pp.platform =  pyjd.engine
-parser = PlatformParser(verbose=1, chain_plat=pp)
+parser = PlatformParser(verbose=1, chain_plat=pp, ast_cache=ast_cache)
 
 def _timestamp(pathname):
     "Return the file modification time as a Long."
@@ -22,13 +22,24 @@ from compiler import misc # good grief, this doesn't look good
 import os
 import copy
 import imp
+try:
+    from pyjs import astcache
+except ImportError:
+    astcache = None
 
 from compiler.pycodegen import ModuleCodeGenerator
 
+def parseFile(file_name, ast_cache=None):
+    if ast_cache is None:
+        return compiler.parseFile(file_name)
+    return ast_cache.parse(compiler, file_name)
+
 class PlatformParser:
-    def __init__(self, platform_dir = "", verbose=True, chain_plat=None):
+    def __init__(self, platform_dir = "", verbose=True, chain_plat=None,
+                       ast_cache=None):
         self.platform_dir = platform_dir
         self.parse_cache = {}
+        self.ast_cache = ast_cache
         self.platform = ""
         self.verbose = verbose
         self.chain_plat = chain_plat
@@ -44,7 +55,7 @@ class PlatformParser:
             if self.chain_plat:
                 mod, _ov = self.chain_plat.parseModule(module_name, file_name)
             else:
-                mod = compiler.parseFile(file_name)
+                mod = parseFile(file_name, self.ast_cache)
             self.parse_cache[file_name] = mod
         else:
             mod = self.parse_cache[file_name]
@@ -54,7 +65,7 @@ class PlatformParser:
         print "platform", platform_file_name
         if self.platform and os.path.isfile(platform_file_name):
             mod = copy.deepcopy(mod)
-            mod_override = compiler.parseFile(platform_file_name)
+            mod_override = parseFile(platform_file_name, self.ast_cache)
             if self.verbose:
                 print "Merging", module_name, self.platform
             merge(module_name, mod, mod_override)
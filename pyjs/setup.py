@@ -14,5 +14,6 @@ setup(
         'build=pyjs.browser:build_script',
         'translate=pyjs.translator:main',
         'smbuild=pyjs.sm:build_script',
+        'serve=pyjs.serve:serve_script',
     ]},
     )
@@ -0,0 +1,92 @@
+"""Cache of parsed modules.
+
+Parsing is a large part of translating a module. The cache keeps the
+trees of parsed files pickled on disk, keyed on the content of the
+file, the compiler module which parsed it (compiler or lib2to3's
+compiler, see --internal-ast) and the python version. Loading a tree
+is several times faster than parsing the file again.
+
+Every lookup loads a fresh tree, so callers may modify it, e.g. when
+merging platform overrides.
+"""
+
+import os
+import sys
+import hashlib
+import cPickle
+import logging
+
+# bump this if the layout of the entries changes
+AST_FORMAT = 1
+
+
+class ASTCache(object):
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, compiler, source):
+        h = hashlib.md5()
+        h.update('%s\n%s\n' % (AST_FORMAT, sys.version))
+        h.update('%s\n' % getattr(compiler, '__name__', compiler))
+        h.update(source)
+        return h.hexdigest()
+
+    def entry_path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key)
+
+    def parse(self, compiler, file_name):
+        """returns the tree of a python file parsed by compiler, from
+        the cache if the file did not change"""
+        f = open(file_name, 'rb')
+        source = f.read()
+        f.close()
+        path = self.entry_path(self.key(compiler, source))
+        if os.path.isfile(path):
+            try:
+                f = open(path, 'rb')
+                try:
+                    tree = cPickle.load(f)
+                finally:
+                    f.close()
+                self.hits += 1
+                return tree
+            except (IOError, EOFError, ValueError, AttributeError,
+                    ImportError, cPickle.UnpicklingError), e:
+                logging.warning('Ignoring broken ast cache entry %r: %s' % (
+                    path, e))
+        self.misses += 1
+        tree = compiler.parseFile(file_name)
+        self.put(path, tree)
+        return tree
+
+    def put(self, path, tree):
+        dir_name = os.path.dirname(path)
+        if not os.path.isdir(dir_name):
+            try:
+                os.makedirs(dir_name)
+            except OSError:
+                # created concurrently
+                pass
+        try:
+            data = cPickle.dumps(tree, cPickle.HIGHEST_PROTOCOL)
+        except (cPickle.PicklingError, TypeError, RuntimeError), e:
+            # e.g. a tree which is nested too deeply
+            logging.debug('Not caching the tree of %r: %s' % (path, e))
+            return
+        tmp_path = '%s.%s.tmp' % (path, os.getpid())
+        f = open(tmp_path, 'wb')
+        try:
+            f.write(data)
+        finally:
+            f.close()
+        os.rename(tmp_path, path)
+
+
+def parse_file(compiler, file_name, ast_cache=None):
+    """parses a python file, with ast_cache if it is not None"""
+    if ast_cache is None:
+        return compiler.parseFile(file_name)
+    return ast_cache.parse(compiler, file_name)
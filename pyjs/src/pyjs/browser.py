@@ -1,11 +1,19 @@
 import os
+from pyjs import buildcache
+from pyjs import buildprofile
 from pyjs import linker
 from pyjs import translator
+from pyjs import minify
+from pyjs import modulegraph
+from pyjs import sourcemap
+from pyjs import splitting
 from pyjs import util
+from pyjs import vendor
 from cStringIO import StringIO
 from optparse import OptionParser
 import pyjs
 import re
+import time
 
 AVAILABLE_PLATFORMS = ('IE6', 'Opera', 'OldMoz', 'Safari', 'Mozilla')
 
@@ -47,8 +55,18 @@ class BrowserLinker(linker.BaseLinker):
         self.cache_buster = kwargs.pop('cache_buster', False)
         self.bootstrap_file = kwargs.pop('bootstrap_file', 'bootstrap.js')
         self.public_folder = kwargs.pop('public_folder', 'public')
+        self.hardlink_public = kwargs.pop('hardlink_public', False)
         self.runtime_options = kwargs.pop('runtime_options', [])
+        self.minify = kwargs.pop('minify', False)
+        self.gzip = kwargs.pop('gzip', False)
+        # with defer_app_files the app files are generated later, by
+        # link_apps
+        self.defer_app_files = False
+        # platform -> (bundle file, modules in the bundle)
+        self.vendor_bundles = {}
+        self.split_modules = kwargs.pop('split_modules', [])
         super(BrowserLinker, self).__init__(*args, **kwargs)
+        self.source_map = self.translator_arguments.get('source_map', False)
 
     def visit_start(self):
         super(BrowserLinker, self).visit_start()
@@ -58,30 +76,73 @@ class BrowserLinker(linker.BaseLinker):
         self.merged_public = set()
         self.app_files = {}
         self.renamed_libs = {}
+        self.original_paths = {}
+        self.content_files = set()
+        self.file_contents = {}
+        self.minified = []
+        self.chunk_files = []
+        self._split_points = None
+        self.source_contents = {}
+        self.compressed = []
+        self.gzip_pending = []
+        self.gzip_pool = None
+        self.inlined_modules = {}
+
+    def read_output_file(self, fname):
+        """returns the content of a generated file. the content is read
+        only once and shared by all platforms"""
+        if not fname in self.file_contents:
+            f = file(fname)
+            self.file_contents[fname] = f.read()
+            f.close()
+        return self.file_contents[fname]
 
     def visit_end_platform(self, platform):
         if not platform:
             return
         if self.cache_buster:
-            import hashlib
-            # rename the files to their hashed equivalents
+            # rename the files to their content addressed names. files
+            # which are identical for several platforms are kept once
             renamed = []
+            original_paths = self.original_paths.setdefault(platform, {})
             for p in self.done[platform]:
                 if p in self.renamed_libs:
                     new_p = self.renamed_libs[p]
                 else:
-                    f = open(p)
-                    md5 = hashlib.md5(f.read()).hexdigest()
-                    f.close()
-                    name, ext = os.path.splitext(p)
-                    new_p = name + '.' + md5 + ext
-                    os.rename(p, new_p)
+                    new_p = self.content_path(p)
+                    if new_p in self.content_files:
+                        os.remove(p)
+                    else:
+                        os.rename(p, new_p)
+                        self.content_files.add(new_p)
                     self.renamed_libs[p] = new_p
+                original_paths[new_p] = p
                 renamed.append(new_p)
-            self.done[platform] = renamed
+            self.done[platform] = modulegraph.UniqueList(renamed)
+        start = time.time()
         self.app_files[platform] = self._generate_app_file(platform)
+        if self.profile is not None:
+            self.profile.add('generate_app_file', time.time() - start,
+                             platform=platform)
+        if self.gzip and not self.defer_app_files:
+            # the app file is final, compress it while the next platform
+            # is linked
+            self.start_gzip([self.app_files[platform]])
+
+    def content_path(self, path):
+        """returns the name of a module file after its content, without
+        the platform it was translated for"""
+        name, ext = os.path.splitext(path)
+        dir_name, name = os.path.split(name)
+        parts = name.split('.')
+        if len(parts) > 1 and parts[-1].startswith('__') and parts[-1].endswith('__'):
+            del parts[-1]
+        parts.append(self.output_digest(path))
+        return os.path.join(dir_name, '.'.join(parts) + ext)
 
     def visit_end(self):
+        if self.defer_app_files:
+            return
         html_output_filename = os.path.join(self.output, self.top_module + '.html')
         if not os.path.exists(html_output_filename):
             # autogenerate
@@ -89,25 +150,145 @@ class BrowserLinker(linker.BaseLinker):
         self._create_nocache_html()
         if not self.keep_lib_files:
             for fname in self.remove_files:
-                if fname.find(self.output) == 0:
+                # files shared with other apps may be removed already
+                if fname.find(self.output) == 0 and os.path.exists(fname):
                     os.unlink(fname)
+        if self.minify:
+            start = time.time()
+            self.minify_lib_files()
+            if self.profile is not None:
+                self.profile.add('minify', time.time() - start)
+        if self.source_map:
+            start = time.time()
+            self.source_map_lib_files()
+            if self.profile is not None:
+                self.profile.add('source_map', time.time() - start)
+        if self.gzip:
+            start = time.time()
+            self.start_gzip(self.lib_files())
+            self.finish_gzip()
+            if self.profile is not None:
+                self.profile.add('gzip', time.time() - start)
+
+    def start_gzip(self, files):
+        """starts writing .gz files at maximum compression next to
+        files, in a pool of worker processes"""
+        if self.gzip_pool is None:
+            import multiprocessing
+            self.gzip_pool = multiprocessing.Pool(max(self.jobs, 2))
+        for fname in files:
+            self.gzip_pending.append(
+                self.gzip_pool.apply_async(util.gzip_file, (fname,)))
+
+    def finish_gzip(self):
+        try:
+            for result in self.gzip_pending:
+                self.compressed.append(result.get())
+        finally:
+            self.gzip_pending = []
+            self.gzip_pool.close()
+            self.gzip_pool.join()
+            self.gzip_pool = None
+
+    def lib_files(self):
+        """returns the module files which are loaded by the app files
+        or dynamically"""
+        done = set()
+        files = []
+        for platform in [None] + self.platforms:
+            files.extend(self.done.get(platform, []))
+        for fname in files + self.chunk_files:
+            if fname in done or not os.path.isfile(fname):
+                continue
+            done.add(fname)
+            yield fname
+
+    def minify_code(self, path, code, func=minify.minify):
+        minified = func(code)
+        self.minified.append((path, len(code), len(minified)))
+        return minified
+
+    def minify_lib_files(self):
+        for fname in self.lib_files():
+            f = file(fname)
+            code = f.read()
+            f.close()
+            f = file(fname, 'w')
+            f.write(self.minify_code(fname, code))
+            f.close()
+
+    def map_source(self, module_name):
+        """returns the name and the content of the python source of a
+        module, as listed in the source maps"""
+        path = self.module_files.get(module_name, (None, None))[0]
+        name = module_name.replace('.', '/')
+        if path is None:
+            return name + '.py', None
+        if os.path.basename(path) == '__init__.py':
+            name += '/__init__'
+        if not path in self.source_contents:
+            f = file(path)
+            self.source_contents[path] = f.read()
+            f.close()
+        return name + '.py', self.source_contents[path]
+
+    def extract_source_map(self, code):
+        """removes the source map markers from code. returns the code
+        and its source map"""
+        source_map = sourcemap.SourceMap(None, self.map_source)
+        return sourcemap.extract(code, source_map), source_map
+
+    def write_source_map(self, path, source_map):
+        source_map.file_name = os.path.basename(path)
+        f = file(path + '.map', 'w')
+        f.write(source_map.to_json())
+        f.close()
+
+    def source_map_lib_files(self):
+        for fname in self.lib_files():
+            f = file(fname)
+            code, source_map = self.extract_source_map(f.read())
+            f.close()
+            if source_map.segments:
+                self.write_source_map(fname, source_map)
+                code += '//# sourceMappingURL=%s.map\n' % (
+                    os.path.basename(fname))
+            f = file(fname, 'w')
+            f.write(code)
+            f.close()
+
+    def split_points(self):
+        """returns the modules which are marked with #@PYJS_SPLIT_POINT
+        or match one of the split_modules expressions"""
+        if self._split_points is None:
+            split_modules = [re.compile(m) for m in self.split_modules]
+            self._split_points = set()
+            for module_name, sources in self.module_sources.items():
+                for m in split_modules:
+                    if m.match(module_name):
+                        self._split_points.add(module_name)
+                for src in sources:
+                    if splitting.SPLIT_POINT_FLAG in translator.module_flags(src):
+                        self._split_points.add(module_name)
+        return self._split_points
 
     def merge_resources(self, dir_name):
         if not dir_name in self.merged_public:
             public_folder = os.path.join(dir_name, self.public_folder)
-            if os.path.exists(public_folder) and os.path.isdir(public_folder):
+            if linker.is_dir(public_folder):
                 util.copytree_exists(public_folder,
-                                     self.output)
+                                     self.output,
+                                     hardlink=self.hardlink_public)
                 self.merged_public.add(dir_name)
         for libs in [self.js_libs, self.dynamic_js_libs,
                      self.static_js_libs, self.early_static_js_libs, self.late_static_js_libs]:
             for lib in libs:
+                # every lib is looked up once per build
                 if not lib in self.merged_public:
-                    for path in self.path:
-                        if os.path.exists(lib) and os.path.isfile(lib):
-                            util.copy_exists(lib, os.path.join(self.output, os.path.basename(lib)))
-                            self.merged_public.add(lib)
-                            break
+                    self.merged_public.add(lib)
+                    if os.path.isfile(lib):
+                        util.copy_exists(lib, os.path.join(self.output, os.path.basename(lib)),
+                                         hardlink=self.hardlink_public)
 
     def find_boilerplate(self, name):
         if not self.top_module_path:
@@ -124,6 +305,12 @@ class BrowserLinker(linker.BaseLinker):
                 return bp
         raise RuntimeError("Boilerplate not found %r" % name)
 
+    def js_sources(self):
+        code = super(BrowserLinker, self).js_sources()
+        code.append(self.read_boilerplate('all.cache.html'))
+        code.append(self.read_boilerplate('home.nocache.html'))
+        return code
+
     def read_boilerplate(self, name):
         f = file(self.find_boilerplate(name))
         res = f.read()
@@ -175,8 +362,7 @@ class BrowserLinker(linker.BaseLinker):
                     name = os.path.basename(lib)
                 if not msg is None:
                     code.append("/* start %s: %s */" % (msg, name))
-                f = file(fname)
-                code.append(f.read())
+                code.append(self.read_output_file(fname))
                 if not msg is None:
                     code.append("/* end %s */" % (name,))
                 self.remove_files[fname] = True
@@ -191,43 +377,152 @@ class BrowserLinker(linker.BaseLinker):
         def js_modname(path):
             return 'js@'+os.path.basename(path)+'.'+hashlib.md5(path).hexdigest()
 
-        def skip_unlinked(lst):
+        import hashlib
+        # cache busting renames the module files
+        original_paths = self.original_paths.get(platform, {})
+        unlinked_app_libs = []
+
+        def lib_module_name(path):
+            fname = os.path.basename(original_paths.get(path, path))[:-3]
+            if fname.endswith('.__%s__' % platform_name):
+                fname = '.'.join(fname.split('.')[:-1])
+            return fname
+
+        def lib_dependencies(path, names):
+            """returns the modules in names imported by the module in
+            path, including the packages they are part of"""
+            deps = []
+            for dep in self.dependencies.get(original_paths.get(path, path), []):
+                parts = dep.split('.')
+                for i in range(1, len(parts) + 1):
+                    dep = '.'.join(parts[:i])
+                    if dep in names and not dep in deps:
+                        deps.append(dep)
+            return deps
+
+        # module name -> whether it is unlinked, the patterns are only
+        # matched once per module
+        unlinked_names = {}
+        def is_unlinked(fname):
+            if not fname in unlinked_names:
+                unlinked_names[fname] = (
+                        not [m for m in not_unlinked_modules if m.match(fname)]
+                    and bool([m for m in unlinked_modules if m.match(fname)]))
+            return unlinked_names[fname]
+
+        def skip_unlinked(lst, unlinked=None):
             new_lst = []
-            pltfrm = '.__%s__' % platform_name
             for path in lst:
-                fname = os.path.basename(path)[:-3]
-                if fname.endswith(pltfrm):
-                    fname = '.'.join(fname.split('.')[:-1])
-                in_not_unlinked_modules = False
-                for m in not_unlinked_modules:
-                    if m.match(fname):
-                        in_not_unlinked_modules = True
-                        new_lst.append(path)
-                        break
-                if not in_not_unlinked_modules:
-                    in_unlinked_modules = False
-                    for m in unlinked_modules:
-                        if m.match(fname):
-                            in_unlinked_modules = True
-                            if fname in available_modules:
-                                available_modules.remove(fname)
-                    if not in_unlinked_modules:
-                        new_lst.append(path)
+                fname = lib_module_name(path)
+                if not is_unlinked(fname):
+                    new_lst.append(path)
+                    continue
+                if fname in available_modules:
+                    available_modules.remove(fname)
+                if unlinked is not None:
+                    unlinked.append((fname, path))
             return new_lst
 
+        early_app_libs = set(early_static_app_libs)
         if self.multi_file:
             dynamic_js_libs = self.unique_list_values(dynamic_js_libs + [m for m in list(self.js_libs) if not m in static_js_libs])
-            dynamic_app_libs = self.unique_list_values([m for m in done if not m in early_static_app_libs])
+            dynamic_app_libs = self.unique_list_values([m for m in done if not m in early_app_libs])
         else:
             static_js_libs = self.unique_list_values(static_js_libs + [m for m in list(self.js_libs) if not m in dynamic_js_libs])
-            static_app_libs = self.unique_list_values([m for m in done if not m in early_static_app_libs])
+            static_app_libs = self.unique_list_values([m for m in done if not m in early_app_libs])
 
         dynamic_js_libs = skip_unlinked(dynamic_js_libs)
-        dynamic_app_libs = skip_unlinked(dynamic_app_libs)
+        dynamic_app_libs = skip_unlinked(dynamic_app_libs, unlinked_app_libs)
         static_js_libs = skip_unlinked(static_js_libs)
-        static_app_libs = skip_unlinked(static_app_libs)
-        
-        import hashlib
+        static_app_libs = skip_unlinked(static_app_libs, unlinked_app_libs)
+        # module name, module file, file the module is loaded from
+        manifest_libs = [(name, path, path) for name, path in unlinked_app_libs]
+
+        split_points = self.split_points()
+        if split_points:
+            # move the modules behind split points into chunks which are
+            # loaded on demand
+            if self.multi_file:
+                app_libs = dynamic_app_libs
+            else:
+                app_libs = static_app_libs
+            names = dict([(lib_module_name(path), path) for path in app_libs])
+            graph = dict([(name, lib_dependencies(path, names))
+                          for name, path in names.items()])
+            roots = [self.top_module] + [name for name in names
+                                         if [m for m in not_unlinked_modules
+                                             if m.match(name)]]
+            initial, chunks = splitting.partition(graph, roots, split_points)
+            for chunk_name in sorted(chunks.keys()):
+                libs = [path for path in app_libs
+                        if lib_module_name(path) in chunks[chunk_name]]
+                code = []
+                for path in libs:
+                    code.append(self.read_output_file(path))
+                    if not self.multi_file:
+                        self.remove_files[path] = True
+                code = '\n'.join(code)
+                if self.cache_buster:
+                    # identical chunks of several platforms are shared
+                    chunk_parts = ['chunk', chunk_name,
+                                   hashlib.md5(code).hexdigest(), 'js']
+                else:
+                    chunk_parts = ['chunk', chunk_name, platform_name, 'js']
+                chunk_path = os.path.join(self.output, 'lib',
+                                          '.'.join(chunk_parts))
+                if not chunk_path in self.chunk_files:
+                    f = file(chunk_path, 'w')
+                    f.write(code)
+                    f.close()
+                    self.chunk_files.append(chunk_path)
+                for path in libs:
+                    name = lib_module_name(path)
+                    manifest_libs.append((name, path, chunk_path))
+                    if name in available_modules:
+                        available_modules.remove(name)
+            if self.multi_file:
+                dynamic_app_libs = [path for path in app_libs
+                                    if lib_module_name(path) in initial]
+            else:
+                static_app_libs = [path for path in app_libs
+                                   if lib_module_name(path) in initial]
+
+        if self.defer_app_files:
+            # link_apps only needs the inlined modules to make the
+            # vendor bundle
+            self.inlined_modules[platform] = [
+                (lib_module_name(path), path) for path in static_app_libs]
+            return None
+        if platform in self.vendor_bundles:
+            bundle_path, bundled = self.vendor_bundles[platform]
+            for path in static_app_libs:
+                if lib_module_name(path) in bundled:
+                    self.remove_files[path] = True
+            static_app_libs = [path for path in static_app_libs
+                               if not lib_module_name(path) in bundled]
+            app_headers += '<script type="text/javascript" src="%s"></script>\n' % (
+                bundle_path[len_ouput_dir:])
+
+        def dynamic_manifest(libs):
+            """returns javascript code which maps every module that is
+            loaded dynamically to its file and the dynamic modules it
+            imports, so that the runtime can load them in parallel"""
+            files = dict([(name, url) for name, path, url in libs])
+            entries = []
+            for name, path, url in sorted(libs):
+                # modules in the same chunk are loaded with the module
+                deps = [dep for dep in lib_dependencies(path, files)
+                        if files[dep] != url]
+                entries.append("'%s': ['%s', [%s]]" % (
+                    name, url[len_ouput_dir:],
+                    ', '.join(["'%s'" % dep for dep in deps])))
+            return "\n$pyjs.dynamic_manifest = {\n%s\n};" % (
+                ',\n'.join(entries))
+        if manifest_libs:
+            dynamic_manifest = dynamic_manifest(manifest_libs)
+        else:
+            dynamic_manifest = ''
+
         dynamic_modules = self.unique_list_values(available_modules + [js_modname(lib) for lib in dynamic_js_libs])
         available_modules = self.unique_list_values(available_modules + early_static_app_libs + dynamic_modules)
         if len(dynamic_modules) > 0:
@@ -244,18 +539,32 @@ class BrowserLinker(linker.BaseLinker):
         static_js_libs = static_code(static_js_libs, "javascript lib")
         late_static_js_libs = static_code(late_static_js_libs, "javascript lib")
 
-        setoptions = "\n".join([("$pyjs.options['%s'] = %s;" % (n, v)).lower() for n,v in self.runtime_options])
+        runtime_options = self.runtime_options
+        if manifest_libs:
+            runtime_options = [(n, v or n == 'dynamic_loading')
+                               for n, v in runtime_options]
+        if self.source_map:
+            runtime_options = runtime_options + [('source_map', True)]
+        setoptions = "\n".join([("$pyjs.options['%s'] = %s;" % (n, v)).lower() for n,v in runtime_options])
 
         file_contents = template % locals()
+        out_path = os.path.join(self.output, '.'.join((name_parts)))
+        if self.minify:
+            file_contents = self.minify_code(out_path, file_contents,
+                                             minify.minify_html)
+        if self.source_map:
+            file_contents, source_map = self.extract_source_map(file_contents)
         if self.cache_buster:
             import hashlib
             md5 = hashlib.md5(file_contents).hexdigest()
             name_parts.insert(2, md5)
-        out_path = os.path.join(self.output, '.'.join((name_parts)))
+            out_path = os.path.join(self.output, '.'.join((name_parts)))
 
         out_file = file(out_path, 'w')
         out_file.write(file_contents)
         out_file.close()
+        if self.source_map:
+            self.write_source_map(out_path, source_map)
         return out_path
 
     def _create_nocache_html(self):
@@ -314,6 +623,46 @@ class BrowserLinker(linker.BaseLinker):
         fh.close  ()
         return 1
 
+def link_apps(linkers):
+    """links several applications into the same output directory.
+    the modules inlined by all of them are moved into a vendor bundle
+    per platform, which the app files load"""
+    for l in linkers:
+        l.defer_app_files = True
+        l()
+    first = linkers[0]
+    for platform in first.platforms:
+        bundled = vendor.shared_modules(
+            [l.inlined_modules[platform] for l in linkers])
+        if not bundled:
+            continue
+        code = vendor.bundle_code(bundled, first.read_output_file)
+        bundle_path = os.path.join(first.output, 'lib',
+                                   vendor.bundle_name(code))
+        if not bundle_path in first.chunk_files:
+            f = file(bundle_path, 'w')
+            f.write(code)
+            f.close()
+            # minified, mapped and compressed like a chunk
+            first.chunk_files.append(bundle_path)
+        for l in linkers:
+            l.vendor_bundles[platform] = (bundle_path, set(bundled))
+    # the files of the modules are removed by visit_end, so all app
+    # files are generated first
+    for l in linkers:
+        l.defer_app_files = False
+        for platform in l.platforms:
+            start = time.time()
+            l.app_files[platform] = l._generate_app_file(platform)
+            if l.profile is not None:
+                l.profile.add('generate_app_file', time.time() - start,
+                              platform=platform)
+            if l.gzip:
+                l.start_gzip([l.app_files[platform]])
+    for l in linkers:
+        l.visit_end()
+
+
 def build_script():
     usage = """
     usage: %prog [options] <application module name>
@@ -359,6 +708,14 @@ def build_script():
         help="Specifiy the public folder. (Contents copied into the output dir, see -o)."
         )
 
+    parser.add_option(
+        "--hardlink-public", dest="hardlink_public",
+        default=False,
+        action="store_true",
+        help="Hardlink the files of the public folders into the output"
+             " dir instead of copying them"
+        )
+
     parser.add_option(
         "--dynamic",
         dest="unlinked_modules",
@@ -366,6 +723,14 @@ def build_script():
         help="regular expression for modules that will not be linked and thus loaded dynamically"
         )
 
+    parser.add_option(
+        "--split",
+        dest="split_modules",
+        action="append",
+        help="regular expression for modules which start a chunk that is"
+             " loaded on demand (like modules marked with #@PYJS_SPLIT_POINT)"
+        )
+
     parser.add_option(
         "--keep-lib-files", dest="keep_lib_files",
         default=False,
@@ -373,6 +738,50 @@ def build_script():
         help="Keep the files generated in the lib directory"
         )
 
+    parser.add_option(
+        "--minify", dest="minify",
+        default=False,
+        action="store_true",
+        help="Minify the generated javascript: strip whitespace and comments,"
+             " shorten temporary names and share repeated strings"
+        )
+
+    parser.add_option(
+        "--minify-report", dest="minify_report",
+        default=None,
+        help="file to which the sizes of the minified files are written"
+        )
+
+    parser.add_option(
+        "--gzip", dest="gzip",
+        default=False,
+        action="store_true",
+        help="Write a gzip compressed copy (.gz) of every app file and"
+             " module file, for servers which serve precompressed files"
+        )
+
+    parser.add_option(
+        "--gzip-report", dest="gzip_report",
+        default=None,
+        help="file to which the sizes of the compressed files are written"
+        )
+
+    parser.add_option(
+        "--vendor-bundle", dest="vendor_bundle",
+        default=False,
+        action="store_true",
+        help="Build each application module given as its own application"
+             " and move the modules they all use into a vendor bundle,"
+             " which their app files share"
+        )
+
+    parser.add_option(
+        "--watch", dest="watch",
+        default=False,
+        action="store_true",
+        help="Keep running and rebuild the application whenever a source file changes"
+        )
+
     parser.set_defaults(output="output",
                         js_includes=[],
                         js_static_includes=[],
@@ -381,6 +790,7 @@ def build_script():
                         bootstrap_file="bootstrap.js",
                         public_folder="public",
                         unlinked_modules=[],
+                        split_modules=[],
                         )
     options, _args = parser.parse_args()
     args = []
@@ -398,13 +808,30 @@ def build_script():
     if len(args) < 1:
         parser.error("incorrect number of arguments")
 
+    if options.vendor_bundle:
+        if len(args) < 2:
+            parser.error("--vendor-bundle needs two or more applications")
+        if options.multi_file:
+            parser.error("--vendor-bundle can not be used with -m, the"
+                         " module files are shared by the applications"
+                         " already")
+        if options.tree_shake:
+            parser.error("--vendor-bundle can not be used with"
+                         " --tree-shake, which removes different code"
+                         " for each application")
+        if options.watch:
+            parser.error("--vendor-bundle can not be used with --watch")
+
     top_module = args[0]
     for d in options.library_dirs:
         pyjs.path.append(os.path.abspath(d))
 
     if options.platforms:
        app_platforms = options.platforms.lower().split(',')
-    print "Building:", top_module
+    if options.vendor_bundle:
+        print "Building:", ", ".join(args)
+    else:
+        print "Building:", top_module
     print "PYJSPATH:", pyjs.path
 
     runtime_options = []
@@ -430,9 +857,15 @@ def build_script():
         inline_code = options.inline_code,
         operator_funcs = options.operator_funcs,
         number_classes = options.number_classes,
+        source_map = options.source_map,
+        optimize = options.optimize,
     )
 
-    l = BrowserLinker(args,
+    if options.build_profile:
+        profile = buildprofile.BuildProfile()
+    else:
+        profile = None
+    linker_arguments = dict(
                       compiler=compiler,
                       output=options.output,
                       platforms=app_platforms,
@@ -445,7 +878,84 @@ def build_script():
                       cache_buster=options.cache_buster,
                       bootstrap_file=options.bootstrap_file,
                       public_folder=options.public_folder,
+                      hardlink_public=options.hardlink_public,
                       runtime_options=runtime_options,
+                      cache_dir=options.cache_dir,
+                      jobs=options.jobs,
+                      tree_shake=options.tree_shake,
+                      keep_names=options.keep_names,
+                      minify=options.minify,
+                      gzip=options.gzip,
+                      split_modules=options.split_modules,
+                      profile=profile,
                      )
-    l()
+    if options.vendor_bundle:
+        # one linker per application, the modules are translated once
+        cache = buildcache.TranslationCache(options.cache_dir)
+        linkers = [BrowserLinker([app], translation_cache=cache,
+                                 **linker_arguments)
+                   for app in args]
+        link_apps(linkers)
+        l = linkers[0]
+    else:
+        l = BrowserLinker(args, **linker_arguments)
+        linkers = [l]
+        if options.watch:
+            from pyjs import watch
+            print "Output   :", os.path.abspath(options.output)
+            try:
+                watch.Watcher(l).run()
+            except KeyboardInterrupt:
+                pass
+            return
+        l()
+    if l.translation_cache is not None:
+        print l.translation_cache.report()
+    if profile is not None:
+        profile.finish()
+        profile.write(options.build_profile)
+        for line in profile.summary():
+            print line
+    if options.module_graph:
+        if len(linkers) == 1:
+            l.write_module_graph(options.module_graph)
+        else:
+            # one graph per application of a vendor bundle build
+            root, ext = os.path.splitext(options.module_graph)
+            for app_linker in linkers:
+                app_linker.write_module_graph('%s.%s%s' % (
+                    root, app_linker.top_module, ext))
+    if options.tree_shake:
+        from pyjs import treeshake
+        removed = treeshake.report(l.dead_code)
+        print "Tree shaking removed %d functions, classes and methods" % (
+            len(removed))
+        if options.tree_shake_report:
+            f = open(options.tree_shake_report, 'w')
+            f.write('\n'.join(removed) + '\n')
+            f.close()
+    if options.minify:
+        minified = sum([l.minified for l in linkers], [])
+        before = sum([b for p, b, a in minified])
+        after = sum([a for p, b, a in minified])
+        print "Minified %d files: %d -> %d bytes (%d%%)" % (
+            len(minified), before, after, 100 * after / max(before, 1))
+        if options.minify_report:
+            f = open(options.minify_report, 'w')
+            for path, before, after in minified:
+                f.write("%d\t%d\t%s\n" % (before, after,
+                                            os.path.relpath(path, options.output)))
+            f.close()
+    if options.gzip:
+        compressed = sum([l.compressed for l in linkers], [])
+        before = sum([b for p, b, a in compressed])
+        after = sum([a for p, b, a in compressed])
+        print "Compressed %d files: %d -> %d bytes (%d%%)" % (
+            len(compressed), before, after, 100 * after / max(before, 1))
+        if options.gzip_report:
+            f = open(options.gzip_report, 'w')
+            for path, before, after in compressed:
+                f.write("%d\t%d\t%s\n" % (before, after,
+                                            os.path.relpath(path, options.output)))
+            f.close()
     print "Built to :", os.path.abspath(options.output)
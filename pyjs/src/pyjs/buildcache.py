@@ -0,0 +1,126 @@
+import os
+import types
+import hashlib
+import cPickle
+import logging
+import translator
+
+# bump this if the layout of the cache entries changes
+CACHE_FORMAT = 1
+
+def translator_sources():
+    """returns the sources of the translator and of the modules of the
+    package which it imports, directly or not (type inference, constant
+    folding ...), which all shape the generated javascript"""
+    directory = os.path.dirname(os.path.abspath(translator.__file__))
+    sources = set()
+    modules = [translator]
+    while modules:
+        module = modules.pop()
+        src = os.path.splitext(os.path.abspath(module.__file__))[0] + '.py'
+        if src in sources:
+            continue
+        sources.add(src)
+        for value in vars(module).values():
+            if isinstance(value, types.ModuleType) \
+               and getattr(value, '__file__', None) \
+               and os.path.dirname(os.path.abspath(value.__file__)) \
+                   == directory:
+                modules.append(value)
+    return sorted(sources)
+
+_translator_version = None
+def translator_version():
+    """returns a hash of the translator sources, so that cached
+    translations are invalidated whenever the translator changes"""
+    global _translator_version
+    if _translator_version is None:
+        h = hashlib.md5()
+        for src in translator_sources():
+            f = open(src, 'rb')
+            h.update('%s\n%s\n' % (os.path.basename(src), f.read()))
+            f.close()
+        _translator_version = h.hexdigest()
+    return _translator_version
+
+
+class TranslationCache(object):
+    """Cache of translated modules.
+
+    Entries are keyed on the content of the module source and its
+    platform overrides, the translator arguments and the translator
+    version. If cache_dir is None, entries are only kept in memory.
+    """
+
+    def __init__(self, cache_dir=None):
+        self.cache_dir = cache_dir
+        self.memory = {}
+        self.hits = 0
+        self.misses = 0
+        if cache_dir and not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+
+    def key(self, module_name, sources, translator_arguments, compiler=None):
+        h = hashlib.md5()
+        h.update('%s\n%s\n' % (CACHE_FORMAT, translator_version()))
+        h.update('%s\n' % getattr(compiler, '__name__', compiler))
+        h.update('%s\n' % module_name)
+        h.update('%r\n' % sorted(translator_arguments.items()))
+        for src in sources:
+            f = open(src, 'rb')
+            h.update('%s\n%s\n' % (os.path.basename(src), f.read()))
+            f.close()
+        return h.hexdigest()
+
+    def entry_path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key)
+
+    def get(self, key):
+        """returns (js, deps, js_libs) for key or None"""
+        entry = self.memory.get(key)
+        if entry is None and self.cache_dir:
+            path = self.entry_path(key)
+            if os.path.isfile(path):
+                try:
+                    f = open(path, 'rb')
+                    try:
+                        entry = cPickle.load(f)
+                    finally:
+                        f.close()
+                except (IOError, EOFError, cPickle.UnpicklingError), e:
+                    logging.warning('Ignoring broken cache entry %r: %s' % (
+                        path, e))
+                    entry = None
+                if entry is not None:
+                    self.memory[key] = entry
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        js, deps, js_libs = entry
+        return js, list(deps), list(js_libs)
+
+    def put(self, key, js, deps, js_libs):
+        entry = (js, list(deps), list(js_libs))
+        self.memory[key] = entry
+        if not self.cache_dir:
+            return
+        path = self.entry_path(key)
+        dir_name = os.path.dirname(path)
+        if not os.path.isdir(dir_name):
+            try:
+                os.makedirs(dir_name)
+            except OSError:
+                # created concurrently
+                pass
+        tmp_path = '%s.%s.tmp' % (path, os.getpid())
+        f = open(tmp_path, 'wb')
+        try:
+            cPickle.dump(entry, f, cPickle.HIGHEST_PROTOCOL)
+        finally:
+            f.close()
+        os.rename(tmp_path, path)
+
+    def report(self):
+        return "Translation cache: %d hits, %d misses" % (
+            self.hits, self.misses)
@@ -0,0 +1,111 @@
+import time
+try:
+    import json
+except ImportError:
+    import simplejson as json
+
+
+class BuildProfile(object):
+    """Wall time of the phases of a build.
+
+    Module phases (resolve, parse, merge, optimize, translate, write,
+    cache and merge_resources) are recorded per module and platform,
+    together with the size of the generated javascript and the number
+    of imported modules. Build phases (e.g. generate_app_file) are
+    recorded per platform.
+    """
+
+    def __init__(self):
+        self.start = time.time()
+        self.end = None
+        # (module name, platform) -> dict(phases, bytes, dependencies)
+        self.modules = {}
+        # (phase, platform) -> seconds
+        self.build_phases = {}
+
+    def module(self, module_name, platform=None):
+        key = (module_name, platform)
+        if not key in self.modules:
+            self.modules[key] = dict(phases={}, bytes=None, dependencies=None)
+        return self.modules[key]
+
+    def add(self, phase, seconds, module_name=None, platform=None):
+        if module_name is None:
+            phases = self.build_phases
+            key = (phase, platform)
+        else:
+            phases = self.module(module_name, platform)['phases']
+            key = phase
+        phases[key] = phases.get(key, 0.0) + seconds
+
+    def add_timings(self, timings, module_name, platform=None):
+        for phase, seconds in timings.items():
+            self.add(phase, seconds, module_name, platform)
+
+    def set_output(self, module_name, platform, size, dependencies):
+        m = self.module(module_name, platform)
+        m['bytes'] = size
+        m['dependencies'] = dependencies
+
+    def finish(self):
+        self.end = time.time()
+
+    def report(self, slowest=10):
+        """returns the profile as a dict, which can be written as
+        json"""
+        modules = []
+        totals = {}
+        for (module_name, platform), m in sorted(self.modules.items()):
+            total = sum(m['phases'].values())
+            for phase, seconds in m['phases'].items():
+                totals[phase] = totals.get(phase, 0.0) + seconds
+            modules.append(dict(module=module_name,
+                                platform=platform,
+                                total=total,
+                                phases=m['phases'],
+                                bytes=m['bytes'],
+                                dependencies=m['dependencies']))
+        build = []
+        for (phase, platform), seconds in sorted(self.build_phases.items()):
+            totals[phase] = totals.get(phase, 0.0) + seconds
+            build.append(dict(phase=phase, platform=platform,
+                              total=seconds))
+        ranked = sorted(modules, key=lambda m: -m['total'])[:slowest]
+        return dict(total=(self.end or time.time()) - self.start,
+                    phases=totals,
+                    build=build,
+                    modules=modules,
+                    slowest=[dict(module=m['module'],
+                                  platform=m['platform'],
+                                  total=m['total'],
+                                  phase=slowest_phase(m['phases']))
+                             for m in ranked])
+
+    def write(self, path):
+        f = open(path, 'w')
+        try:
+            json.dump(self.report(), f, indent=1, sort_keys=True)
+        finally:
+            f.close()
+
+    def summary(self, count=5):
+        """returns lines describing the phase totals and the slowest
+        modules"""
+        report = self.report(count)
+        lines = ["Build profile: %.2fs" % report['total']]
+        phases = sorted(report['phases'].items(),
+                        key=lambda p: (-p[1], p[0]))
+        lines.append("  " + ", ".join(["%s %.2fs" % p for p in phases]))
+        for m in report['slowest']:
+            name = m['module']
+            if m['platform']:
+                name += ' (%s)' % m['platform']
+            lines.append("  %.3fs %s, mostly %s" % (m['total'], name,
+                                                   m['phase']))
+        return lines
+
+
+def slowest_phase(phases):
+    if not phases:
+        return None
+    return sorted(phases.items(), key=lambda p: (-p[1], p[0]))[0][0]
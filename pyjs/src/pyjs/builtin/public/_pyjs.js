@@ -48,17 +48,12 @@ function $pyjs_kwargs_call(obj, func, star_args, dstar_args, args)
                     call_args[i]= star_args.__getitem__(i)
                 }
             } else {
-                var __i = star_args.__iter__();
+                var __i = pyjslib.$iter_wrap(star_args.__iter__());
                 var i = 0;
-                try {
-                    while (true) {
-                        call_args[i]=__i.next();
-                        i++;
-                    }
-                } catch (e) {
-                    if (e.__name__ != 'StopIteration') {
-                        throw e;
-                    }
+                var item;
+                while ((item=__i.$next()) !== pyjslib.$iter_stop) {
+                    call_args[i]=item;
+                    i++;
                 }
             }
             args = args.concat(call_args);
@@ -738,17 +738,27 @@ def __dynamic_load__(importName):
     if sys is None or dynamic is None or __nondynamic_modules__.has_key(importName):
         return module
     if JS("""typeof module == 'undefined'"""):
-        try:
-            dynamic.ajax_import("lib/" + importName + ".__" + platform + "__.js")
-            module = JS("""$pyjs.loaded_modules[importName]""")
-        except:
-            pass
-    if JS("""typeof module == 'undefined'"""):
-        try:
-            dynamic.ajax_import("lib/" + importName + ".js")
-            module = JS("""$pyjs.loaded_modules[importName]""")
-        except:
-            pass
+        if JS("""typeof $pyjs.dynamic_manifest != 'undefined'"""):
+            # the linker lists the file of every dynamic module
+            url = dynamic.module_url(importName)
+            if url is not None:
+                try:
+                    dynamic.ajax_import(url)
+                    module = JS("""$pyjs.loaded_modules[importName]""")
+                except:
+                    pass
+        else:
+            try:
+                dynamic.ajax_import("lib/" + importName + ".__" + platform + "__.js")
+                module = JS("""$pyjs.loaded_modules[importName]""")
+            except:
+                pass
+            if JS("""typeof module == 'undefined'"""):
+                try:
+                    dynamic.ajax_import("lib/" + importName + ".js")
+                    module = JS("""$pyjs.loaded_modules[importName]""")
+                except:
+                    pass
         if JS("""typeof module == 'undefined'"""):
             __nondynamic_modules__[importName] = 1.0
     return module
@@ -761,6 +771,9 @@ class BaseException:
         self.args = args
         if len(args) == 1:
             self.message = args[0]
+        if JS("$pyjs.options.source_map"):
+            # the traceback is resolved through the source maps
+            JS("self.__jsstack__ = (new Error()).stack;")
 
     def __getitem__(self, index):
         return self.args.__getitem__(index)
@@ -845,7 +858,9 @@ pyjslib._errorMapping = function(err) {
             message = err.message;
         } catch ( e) {
         }
-        return pyjslib.AttributeError(message);
+        var error = pyjslib.AttributeError(message);
+        if (typeof err.stack != 'undefined') error.__jsstack__ = err.stack;
+        return error;
     }
     return err;
 };
@@ -864,6 +879,35 @@ pyjslib.StopIteration = function () { };
 pyjslib.StopIteration.prototype = new Error();
 pyjslib.StopIteration.__name__ = 'StopIteration';
 //pyjslib.StopIteration.message = 'StopIteration';
+""")
+    # The $next method of iterators returns $iter_stop at the end instead
+    # of throwing StopIteration, which is slow and keeps the javascript
+    # engines from optimizing the function with the loop.
+    # $iter_wrap adds $next to iterators which only have next
+    JS("""
+pyjslib.$iter_stop = {};
+
+var $iter_wrapper = function (iter) {
+    this.iter = iter;
+}
+$iter_wrapper.prototype.next = function ( ) {
+    return this.iter.next();
+}
+$iter_wrapper.prototype.$next = function ( ) {
+    try {
+        return this.iter.next();
+    } catch (e) {
+        if (e.__name__ != 'StopIteration') throw e;
+        return pyjslib.$iter_stop;
+    }
+}
+$iter_wrapper.prototype.__iter__ = function ( ) {
+    return this;
+}
+pyjslib.$iter_wrap = function (iter) {
+    if (typeof iter.$next == 'function') return iter;
+    return new $iter_wrapper(iter);
+};
 """)
 
     # Patching of the standard javascript String object
@@ -905,17 +949,14 @@ String.prototype.join = function(data) {
         return data.l.join(this);
     }
     else if (pyjslib.isIteratable(data)) {
-        var iter=data.__iter__();
-        try {
-            text+=iter.next();
-            while (true) {
-                var item=iter.next();
+        var iter=pyjslib.$iter_wrap(data.__iter__());
+        var item=iter.$next();
+        if (item !== pyjslib.$iter_stop) {
+            text+=item;
+            while ((item=iter.$next()) !== pyjslib.$iter_stop) {
                 text+=this + item;
             }
         }
-        catch (e) {
-            if (e.__name__ != 'StopIteration') throw e;
-        }
     }
 
     return text;
@@ -997,6 +1038,12 @@ String.prototype.__iter__ = function() {
             }
             return s.substring(i++, i, 1);
         },
+        '$next': function() {
+            if (i >= s.length) {
+                return pyjslib.$iter_stop;
+            }
+            return s.substring(i++, i, 1);
+        },
         '__iter__': function() {
             return this;
         }
@@ -3482,6 +3529,12 @@ $iter_array.prototype.next = function ( ) {
     }
     return this.l[this.i];
 }
+$iter_array.prototype.$next = function ( ) {
+    if (++this.i == this.l.length) {
+        return pyjslib.$iter_stop;
+    }
+    return this.l[this.i];
+}
 $iter_array.prototype.__iter__ = function ( ) {
     return this;
 }
@@ -3494,9 +3547,16 @@ JS("""
     this.tl = this.tuple.l;
 }
 $enumerate_array.prototype.next = function ( ) {
-    if (++this.i == this.l.length) {
+    var item = this.$next();
+    if (item === pyjslib.$iter_stop) {
         throw pyjslib.StopIteration;
     }
+    return item;
+}
+$enumerate_array.prototype.$next = function ( ) {
+    if (++this.i == this.l.length) {
+        return pyjslib.$iter_stop;
+    }
     this.tl[1] = this.l[this.i];
     if (this.tl[0].__number__ == 0x01) {
         this.tl[0] = this.i;
@@ -3535,18 +3595,11 @@ class List:
                 self.l[n++]=data.l[i];
             }
         } else if (pyjslib.isIteratable(data)) {
-            var iter=data.__iter__();
+            var iter=pyjslib.$iter_wrap(data.__iter__());
             var i=self.l.length;
-            try {
-                while (true) {
-                    var item=iter.next();
-                    self.l[i++]=item;
-                    }
-                }
-            catch (e) {
-                if (e.__name__ != 'StopIteration') {
-                    throw e;
-                }
+            var item;
+            while ((item=iter.$next()) !== pyjslib.$iter_stop) {
+                self.l[i++]=item;
             }
         }
         """)
@@ -3783,17 +3836,11 @@ class Tuple:
                 self.l[n++]=data.l[i];
             }
         } else if (pyjslib.isIteratable(data)) {
-            var iter=data.__iter__();
+            var iter=pyjslib.$iter_wrap(data.__iter__());
             var i=self.l.length;
-            try {
-                while (true) {
-                    var item=iter.next();
-                    self.l[i++]=item;
-                }
-            } catch (e) {
-                if (e.__name__ != 'StopIteration') {
-                    throw e;
-                }
+            var item;
+            while ((item=iter.$next()) !== pyjslib.$iter_stop) {
+                self.l[i++]=item;
             }
         }
         """)
@@ -3917,16 +3964,10 @@ class Dict:
                 //self.d[sKey]=item[1];
             }
         } else if (pyjslib.isIteratable(data)) {
-            var iter=data.__iter__();
-            try {
-                while (true) {
-                    var item=iter.next();
-                    self.__setitem__(item.__getitem__(0), item.__getitem__(1));
-                }
-            } catch (e) {
-                if (e.__name__ != 'StopIteration') {
-                    throw e;
-                }
+            var iter=pyjslib.$iter_wrap(data.__iter__());
+            var item;
+            while ((item=iter.$next()) !== pyjslib.$iter_stop) {
+                self.__setitem__(item.__getitem__(0), item.__getitem__(1));
             }
         } else if (pyjslib.isObject(data)) {
             for (var key in data) {
@@ -4238,6 +4279,8 @@ def xrange(start, stop = None, step = 1):
         raise TypeError("xrange() integer end argument expected, got %s" % stop.__class__.__name__)
     if not isNumber(step):
         raise TypeError("xrange() integer step argument expected, got %s" % stop.__class__.__name__)
+    if step == 0:
+        raise ValueError("xrange() step argument must not be zero")
     rval = nval = start
     JS("""
     var nstep = (stop-start)/step;
@@ -4258,6 +4301,12 @@ def xrange(start, stop = None, step = 1):
     return INT(rval);
     JS("""
         },
+        '$next': function() {
+            if (nval == stop) {
+                return pyjslib.$iter_stop;
+            }
+            return this.next();
+        },
         '__iter__': function() {
             return this;
         },
@@ -4291,6 +4340,8 @@ def range(start, stop = None, step = 1):
         raise TypeError("range() integer end argument expected, got %s" % stop.__class__.__name__)
     if not isNumber(step):
         raise TypeError("range() integer step argument expected, got %s" % stop.__class__.__name__)
+    if step == 0:
+        raise ValueError("range() step argument must not be zero")
     items = JS("new Array()")
     JS("""
     var nstep = (stop-start)/step;
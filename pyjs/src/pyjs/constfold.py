@@ -0,0 +1,553 @@
+"""Constant folding and propagation.
+
+The translator emits a run time operation for every operator, so
+expressions like 2 * math.pi, 'a' + 'b', -1 or 1 << 16 are computed
+each time they are evaluated, and module level constants are looked up
+at every use. optimize() rewrites the tree of a module before it is
+translated:
+
+level 1 folds the operations on constants, and removes the branches of
+if and while statements and conditional expressions whose condition is
+constant, e.g. if False: or if 0:.
+
+level 2 also replaces the names of module level constants by their
+values: names in upper case, which the module binds only once, to a
+number or a short string. Other modules are assumed not to assign
+them. math.pi and math.e are replaced as well, if the module binds
+math only once, by import math.
+
+Operations whose result depends on the number mode are not folded:
+int / int, % with operands of different signs, operations on ints
+beyond 2**53, shifts beyond 32 bits and right shifts of negative ints.
+Nor is the repetition of strings, e.g. 'ab' * 2, without operator
+functions (or if the module sets the compiler options itself), as the
+javascript * multiplies them.
+Only the constants of the module itself are propagated, as every module
+is translated (and cached) on its own.
+"""
+
+import math
+
+import signatures
+
+# ints beyond 2**53 are not exact javascript numbers
+MAX_INT = 2 ** 53
+INT32_MIN = -2 ** 31
+INT32_MAX = 2 ** 31 - 1
+
+# strings are not built beyond this length
+MAX_STRING = 1024
+# nor copied to every use of a constant
+MAX_PROPAGATED_STRING = 64
+
+MATH_CONSTANTS = {
+    'pi': math.pi,
+    'e': math.e,
+}
+
+BINARY_OPS = ('Add', 'Sub', 'Mul', 'Div', 'FloorDiv', 'Mod', 'Power',
+              'LeftShift', 'RightShift')
+
+BITWISE_OPS = {
+    'Bitand': lambda a, b: a & b,
+    'Bitor': lambda a, b: a | b,
+    'Bitxor': lambda a, b: a ^ b,
+}
+
+COMPARE_OPS = {
+    '<': lambda a, b: a < b,
+    '<=': lambda a, b: a <= b,
+    '>': lambda a, b: a > b,
+    '>=': lambda a, b: a >= b,
+    '==': lambda a, b: a == b,
+    '!=': lambda a, b: a != b,
+}
+
+BUILTIN_CONSTANTS = {
+    'True': True,
+    'False': False,
+    'None': None,
+}
+
+UNKNOWN = object()
+
+
+def is_number(value):
+    return isinstance(value, (int, long, float)) \
+       and not isinstance(value, bool)
+
+
+def is_int(value):
+    return isinstance(value, (int, long)) and not isinstance(value, bool)
+
+
+def is_int32(value):
+    return is_int(value) and INT32_MIN <= value <= INT32_MAX
+
+
+def exact(value):
+    """returns value if the translator can emit it as it is, else
+    UNKNOWN"""
+    if isinstance(value, float):
+        if value != value or value in (float('inf'), float('-inf')):
+            return UNKNOWN
+    elif is_int(value):
+        if abs(value) > MAX_INT:
+            return UNKNOWN
+    elif isinstance(value, basestring):
+        if len(value) > MAX_STRING:
+            return UNKNOWN
+    return value
+
+
+def constant_name(name):
+    """returns True if name is spelled like a constant, e.g. MAX_WIDTH"""
+    return name.upper() == name and name.lower() != name
+
+
+def fold_binary(op, left, right, operator_funcs=True):
+    """returns the value of the binary operation op (the name of the
+    ast node) on the constants left and right, or UNKNOWN if it is not
+    folded. strings are only repeated with operator_funcs"""
+    numbers = is_number(left) and is_number(right)
+    if op == 'Add':
+        if numbers or (isinstance(left, basestring)
+                       and type(left) is type(right)):
+            return exact(left + right)
+    elif op == 'Sub':
+        if numbers:
+            return exact(left - right)
+    elif op == 'Mul':
+        if numbers:
+            return exact(left * right)
+        if not operator_funcs:
+            return UNKNOWN
+        if is_int(left) and isinstance(right, basestring):
+            left, right = right, left
+        if isinstance(left, basestring) and is_int(right) \
+           and 0 <= right and len(left) * right <= MAX_STRING:
+            return left * right
+    elif op == 'Div':
+        # int / int floors in python but not in javascript
+        if numbers and right != 0 \
+           and (isinstance(left, float) or isinstance(right, float)):
+            return exact(left / right)
+    elif op == 'FloorDiv':
+        if numbers and right != 0:
+            return exact(left // right)
+    elif op == 'Mod':
+        # the sign of the result is the sign of the divisor in python
+        # and of the dividend in javascript
+        if is_int(left) and is_int(right) \
+           and ((left >= 0 and right > 0) or (left <= 0 and right < 0)):
+            return exact(left % right)
+    elif op == 'Power':
+        # a negative exponent gives a float
+        if is_int(left) and is_int(right) and right >= 0 \
+           and (abs(left) <= 1 or right <= 64):
+            return exact(left ** right)
+    elif op == 'LeftShift':
+        if is_int32(left) and is_int(right) and 0 <= right < 32:
+            value = left << right
+            if is_int32(value):
+                return value
+    elif op == 'RightShift':
+        # the run time shifts with >>>, which does not keep the sign
+        if is_int32(left) and left >= 0 and is_int(right) \
+           and 0 <= right < 32:
+            return left >> right
+    return UNKNOWN
+
+
+def fold_compare(left, ops):
+    """returns the value of a comparison of constants, or UNKNOWN"""
+    for op, right in ops:
+        if not op in COMPARE_OPS:
+            return UNKNOWN
+        if is_number(left) and is_number(right):
+            pass
+        elif isinstance(left, basestring) and type(left) is type(right) \
+             and op in ('==', '!='):
+            pass
+        else:
+            return UNKNOWN
+        if not COMPARE_OPS[op](left, right):
+            return False
+        left = right
+    return True
+
+
+class Names(object):
+    """collects the names which a function or class body binds"""
+
+    def __init__(self, ast):
+        self.ast = ast
+        self.bound = set()
+        self.globals = set()
+        # exec or import * may bind any name
+        self.opaque = False
+
+    def visit(self, node):
+        ast = self.ast
+        if isinstance(node, (ast.Function, ast.Class)):
+            self.bound.add(node.name)
+            self.visit_outer(node)
+        elif isinstance(node, ast.Lambda):
+            self.visit_outer(node)
+        elif isinstance(node, ast.AssName):
+            self.bound.add(node.name)
+        elif isinstance(node, ast.AugAssign) \
+             and isinstance(node.node, ast.Name):
+            self.bound.add(node.node.name)
+            self.visit(node.expr)
+        elif isinstance(node, ast.Import):
+            for name, asname in node.names:
+                self.bound.add(asname or name.split('.')[0])
+        elif isinstance(node, ast.From):
+            for name, asname in node.names:
+                if name == '*':
+                    self.opaque = True
+                else:
+                    self.bound.add(asname or name)
+        elif isinstance(node, ast.Global):
+            self.globals.update(node.names)
+        elif isinstance(node, ast.Exec):
+            self.opaque = True
+        else:
+            for child in node.getChildNodes():
+                self.visit(child)
+
+    def visit_outer(self, node):
+        """visits the parts of a function, lambda or class definition
+        which are evaluated in the enclosing scope"""
+        ast = self.ast
+        if isinstance(node, ast.Class):
+            children = list(node.bases)
+        else:
+            children = list(node.defaults)
+        if getattr(node, 'decorators', None) is not None:
+            children.append(node.decorators)
+        for child in children:
+            self.visit(child)
+
+    def local_names(self):
+        return self.bound - self.globals
+
+
+def flatten_args(argnames):
+    names = []
+    for name in argnames:
+        if isinstance(name, tuple):
+            names.extend(flatten_args(name))
+        else:
+            names.append(name)
+    return names
+
+
+class Scope(object):
+    """the constants of a scope and the local names which hide them"""
+
+    def __init__(self, constants, hidden, opaque=False, functions=None):
+        self.constants = constants
+        self.hidden = hidden
+        self.opaque = opaque
+        # the scope which encloses the functions defined in this scope,
+        # which is not a class body
+        self.functions = functions or self
+
+    def visible(self, name):
+        """returns True if name refers to the module level binding"""
+        return not self.opaque and not name in self.hidden
+
+    def lookup(self, name):
+        if not self.visible(name):
+            return UNKNOWN
+        return self.constants.get(name, UNKNOWN)
+
+    def nested(self, names, functions=None):
+        return Scope(self.constants, self.hidden | names.local_names(),
+                     self.opaque or names.opaque, functions)
+
+
+def sets_compiler_options(ast, node):
+    """returns True if the tree node calls setCompilerOptions, which may
+    turn the operator functions on or off"""
+    if isinstance(node, ast.Name) and node.name == 'setCompilerOptions':
+        return True
+    for child in node.getChildNodes():
+        if sets_compiler_options(ast, child):
+            return True
+    return False
+
+
+class ConstantFolder(object):
+
+    def __init__(self, ast, level, operator_funcs=True):
+        self.ast = ast
+        self.level = level
+        self.operator_funcs = operator_funcs
+
+    def optimize(self, tree):
+        ast = self.ast
+        self.bindings = signatures.Bindings(ast)
+        self.bindings.visit(tree)
+        if sets_compiler_options(ast, tree):
+            self.operator_funcs = False
+        # the constants of the module, which functions see
+        self.constants = {}
+        # the top level statements which define them
+        self.definitions = {}
+        self.math_names = set()
+        if self.level >= 2 and not self.bindings.give_up:
+            self.find_constants(tree.node)
+
+        # top level statements only see the constants defined before
+        functions = Scope(self.constants, set())
+        module = Scope({}, set(), functions=functions)
+        nodes = []
+        for node in tree.node.nodes:
+            nodes.extend(self.statement(node, module))
+            for name, value in self.definitions.get(id(node), ()):
+                module.constants[name] = value
+        tree.node.nodes = nodes
+        return tree
+
+    def bound_once(self, name):
+        return self.bindings.count.get(name) == 1 \
+           and not name in self.bindings.rebound
+
+    def find_constants(self, stmt):
+        """finds the top level statements which bind a name to a
+        constant: name = <constant expression>, from math import pi and
+        import math"""
+        ast = self.ast
+        scope = Scope({}, set(), functions=Scope({}, set()))
+        for node in stmt.nodes:
+            names = []
+            if isinstance(node, ast.Assign) and len(node.nodes) == 1 \
+               and isinstance(node.nodes[0], ast.AssName) \
+               and node.nodes[0].flags == 'OP_ASSIGN' \
+               and constant_name(node.nodes[0].name) \
+               and self.bound_once(node.nodes[0].name):
+                node.expr = self.transform(node.expr, scope)
+                if isinstance(node.expr, ast.Const) \
+                   and self.propagated(node.expr.value):
+                    names.append((node.nodes[0].name, node.expr.value))
+            elif isinstance(node, ast.From) and node.modname == 'math':
+                for name, asname in node.names:
+                    if name in MATH_CONSTANTS \
+                       and self.bound_once(asname or name):
+                        names.append((asname or name, MATH_CONSTANTS[name]))
+            elif isinstance(node, ast.Import):
+                for name, asname in node.names:
+                    if name == 'math' and self.bound_once(asname or name):
+                        self.math_names.add(asname or name)
+            if names:
+                self.definitions[id(node)] = names
+                for name, value in names:
+                    scope.constants[name] = value
+                    self.constants[name] = value
+
+    def propagated(self, value):
+        if is_number(value):
+            return True
+        return isinstance(value, basestring) \
+           and len(value) <= MAX_PROPAGATED_STRING
+
+    def statements(self, nodes, stmt):
+        """returns nodes as the statements of the body stmt, which must
+        not be empty"""
+        if not nodes:
+            lineno = stmt.nodes and stmt.nodes[0].lineno or stmt.lineno
+            nodes = [self.ast.Pass(lineno)]
+        return nodes
+
+    def statement(self, node, scope):
+        """returns the list of statements which replace the statement
+        node"""
+        ast = self.ast
+        node = self.transform(node, scope)
+        if isinstance(node, ast.If):
+            return self.fold_if(node, scope)
+        if isinstance(node, ast.While) \
+           and self.truth(node.test, scope) is False \
+           and self.removable(node.body):
+            return self.body(node.else_)
+        return [node]
+
+    def body(self, stmt):
+        if stmt is None:
+            return []
+        return stmt.nodes
+
+    def fold_if(self, node, scope):
+        tests = []
+        for i, (test, body) in enumerate(node.tests):
+            truth = self.truth(test, scope)
+            if truth is False and self.removable(body):
+                continue
+            if truth is True:
+                rest = [b for t, b in node.tests[i + 1:]] + [node.else_]
+                if not False in map(self.removable, rest):
+                    if not tests:
+                        return self.body(body)
+                    node.tests = tests
+                    node.else_ = body
+                    return [node]
+            tests.append((test, body))
+        if not tests:
+            return self.body(node.else_)
+        node.tests = tests
+        return [node]
+
+    def removable(self, node):
+        """returns False if removing node changes the scope of a name
+        or turns a generator into a function"""
+        ast = self.ast
+        if node is None:
+            return True
+        if isinstance(node, (ast.Yield, ast.Global)):
+            return False
+        for child in node.getChildNodes():
+            if not self.removable(child):
+                return False
+        return True
+
+    def truth(self, node, scope):
+        """returns the truth value of a constant condition, or
+        UNKNOWN"""
+        ast = self.ast
+        if isinstance(node, ast.Const):
+            return bool(node.value)
+        if isinstance(node, ast.Name):
+            if node.name in BUILTIN_CONSTANTS and scope.visible(node.name) \
+               and not node.name in self.bindings.count \
+               and not node.name in self.bindings.rebound \
+               and not self.bindings.give_up:
+                return bool(BUILTIN_CONSTANTS[node.name])
+            return UNKNOWN
+        if isinstance(node, ast.Not):
+            truth = self.truth(node.expr, scope)
+            if truth is UNKNOWN:
+                return UNKNOWN
+            return not truth
+        if isinstance(node, (ast.And, ast.Or)):
+            # the first operand which decides the result
+            decides = isinstance(node, ast.Or)
+            for child in node.nodes:
+                truth = self.truth(child, scope)
+                if truth is UNKNOWN or truth is decides:
+                    return truth
+            return not decides
+        if isinstance(node, ast.Compare):
+            operands = [node.expr] + [expr for op, expr in node.ops]
+            for operand in operands:
+                if not isinstance(operand, ast.Const):
+                    return UNKNOWN
+            return fold_compare(node.expr.value,
+                                [(op, expr.value) for op, expr in node.ops])
+        return UNKNOWN
+
+    def transform(self, node, scope):
+        """returns node with its constant expressions folded"""
+        ast = self.ast
+        if isinstance(node, ast.Stmt):
+            nodes = []
+            for child in node.nodes:
+                nodes.extend(self.statement(child, scope))
+            node.nodes = self.statements(nodes, node)
+            return node
+        if isinstance(node, (ast.Function, ast.Lambda)):
+            node.defaults = self.transform_value(node.defaults, scope)
+            if getattr(node, 'decorators', None) is not None:
+                node.decorators = self.transform(node.decorators, scope)
+            names = Names(ast)
+            names.bound.update(flatten_args(node.argnames))
+            names.visit(node.code)
+            node.code = self.transform(node.code,
+                                       scope.functions.nested(names))
+            return node
+        if isinstance(node, ast.Class):
+            node.bases = self.transform_value(node.bases, scope)
+            if getattr(node, 'decorators', None) is not None:
+                node.decorators = self.transform(node.decorators, scope)
+            names = Names(ast)
+            names.visit(node.code)
+            node.code = self.transform(node.code,
+                                       scope.nested(names, scope.functions))
+            return node
+        if isinstance(node, ast.Name):
+            value = scope.lookup(node.name)
+            if value is UNKNOWN:
+                return node
+            return ast.Const(value, node.lineno)
+        if isinstance(node, ast.Getattr) and isinstance(node.expr, ast.Name) \
+           and node.expr.name in self.math_names \
+           and node.attrname in MATH_CONSTANTS \
+           and scope.visible(node.expr.name):
+            return ast.Const(MATH_CONSTANTS[node.attrname], node.lineno)
+        if isinstance(node, ast.AugAssign) and isinstance(node.node, ast.Name):
+            node.expr = self.transform(node.expr, scope)
+            return node
+
+        for attr, value in node.__dict__.items():
+            node.__dict__[attr] = self.transform_value(value, scope)
+        return self.fold(node, scope)
+
+    def transform_value(self, value, scope):
+        if isinstance(value, self.ast.Node):
+            return self.transform(value, scope)
+        if isinstance(value, list):
+            return [self.transform_value(v, scope) for v in value]
+        if isinstance(value, tuple):
+            return tuple([self.transform_value(v, scope) for v in value])
+        return value
+
+    def fold(self, node, scope):
+        """returns the constant which replaces the operation node, or
+        node"""
+        ast = self.ast
+        op = node.__class__.__name__
+        value = UNKNOWN
+        if op in BINARY_OPS:
+            if isinstance(node.left, ast.Const) \
+               and isinstance(node.right, ast.Const):
+                value = fold_binary(op, node.left.value, node.right.value,
+                                    self.operator_funcs)
+        elif op in BITWISE_OPS:
+            values = []
+            for child in node.nodes:
+                if not isinstance(child, ast.Const) \
+                   or not is_int32(child.value):
+                    return node
+                values.append(child.value)
+            value = reduce(BITWISE_OPS[op], values)
+        elif op in ('UnarySub', 'UnaryAdd', 'Invert'):
+            if isinstance(node.expr, ast.Const):
+                operand = node.expr.value
+                if op == 'Invert':
+                    if is_int32(operand):
+                        value = ~operand
+                elif is_number(operand):
+                    if op == 'UnarySub':
+                        value = exact(-operand)
+                    else:
+                        value = operand
+        elif op == 'IfExp':
+            truth = self.truth(node.test, scope)
+            if truth is True and self.removable(node.else_):
+                return node.then
+            if truth is False and self.removable(node.then):
+                return node.else_
+        if value is UNKNOWN:
+            return node
+        return ast.Const(value, node.lineno)
+
+
+def optimize(ast, tree, level, operator_funcs=True):
+    """folds the constant expressions of the module tree (a Module
+    node) at the optimisation level (0, 1 or 2). operator_funcs is the
+    compiler option of the same name"""
+    if level > 0:
+        ConstantFolder(ast, level, operator_funcs).optimize(tree)
+    return tree
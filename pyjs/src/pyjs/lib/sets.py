@@ -69,16 +69,10 @@ class Set:
             }
         }
         else if (pyjslib.isIteratable(data)) {
-            var iter=data.__iter__();
-            var i=0;
-            try {
-                while (true) {
-                    var item=iter.next();
-                    self.d[pyjslib.hash(item)]=item;
-                }
-            }
-            catch (e) {
-                if (e != pyjslib.StopIteration) throw e;
+            var iter=pyjslib.$iter_wrap(data.__iter__());
+            var item;
+            while ((item=iter.$next()) !== pyjslib.$iter_stop) {
+                self.d[pyjslib.hash(item)]=item;
             }
         }
         """)
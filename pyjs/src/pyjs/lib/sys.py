@@ -52,11 +52,140 @@ JS("""sys.save_exception_stack = function () {
 return null;
 }""")
 
+# the source maps are read when an exception is formatted, see
+# pyjs/sourcemap.py for the format written by the linker
+JS("""sys.source_maps = {};
+sys.source_line_offsets = {};
+sys.load_source_map = function (url) {
+    if (typeof sys.source_maps[url] != 'undefined') {
+        return sys.source_maps[url];
+    }
+    var map = null;
+    try {
+        var req = new XMLHttpRequest();
+        req.open('GET', url + '.map', false);
+        req.send(null);
+        if (req.status == 200 || req.status == 0) {
+            var text = req.responseText;
+            if (typeof JSON != 'undefined') {
+                map = JSON.parse(text);
+            } else {
+                map = eval('(' + text + ')');
+            }
+            map.lines = sys.decode_mappings(map.mappings);
+            map.source_lines = [];
+        }
+    } catch (e) {
+        map = null;
+    }
+    sys.source_maps[url] = map;
+    return map;
+};
+sys.decode_mappings = function (mappings) {
+    var chars = 'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/';
+    var lines = [], segments = [], values = [];
+    var value = 0, shift = 0, column = 0, source = 0, source_line = 0;
+    for (var i = 0; i <= mappings.length; i++) {
+        var c = mappings.charAt(i);
+        if (c == ',' || c == ';' || c == '') {
+            if (values.length > 0) {
+                column += values[0];
+            }
+            if (values.length >= 4) {
+                source += values[1];
+                source_line += values[2];
+                segments.push([column, source, source_line]);
+            }
+            values = [];
+            if (c != ',') {
+                lines.push(segments);
+                segments = [];
+                column = 0;
+            }
+            continue;
+        }
+        var digit = chars.indexOf(c);
+        value += (digit & 31) << shift;
+        if (digit & 32) {
+            shift += 5;
+        } else {
+            values.push(value & 1 ? -(value >> 1) : value >> 1);
+            value = shift = 0;
+        }
+    }
+    return lines;
+};
+sys.source_position = function (url, line, column) {
+    var map = sys.load_source_map(url);
+    if (map == null) return null;
+    if (typeof sys.source_line_offsets[url] != 'undefined') {
+        line -= sys.source_line_offsets[url];
+    }
+    if (line < 1 || line > map.lines.length) return null;
+    var segments = map.lines[line - 1], found = null;
+    for (var i = 0; i < segments.length && segments[i][0] <= column - 1; i++) {
+        found = segments[i];
+    }
+    if (found == null) return null;
+    var text = '';
+    if (map.sourcesContent && map.sourcesContent[found[1]]) {
+        if (!map.source_lines[found[1]]) {
+            map.source_lines[found[1]] = map.sourcesContent[found[1]].__split('\\n');
+        }
+        text = map.source_lines[found[1]][found[2]] || '';
+    }
+    return [map.sources[found[1]], found[2] + 1, text];
+};
+sys.mapped_stack = function (stack) {
+    var frames = [];
+    var lines = stack.__split('\\n');
+    for (var i = lines.length - 1; i >= 0; i--) {
+        var m = lines[i].match(/([^\\s(@]+):(\\d+):(\\d+)\\)?\\s*$/);
+        if (m == null) continue;
+        var pos = sys.source_position(m[1], parseInt(m[2]), parseInt(m[3]));
+        if (pos == null) continue;
+        var msg = pos[0] + ', line ' + pos[1];
+        if (pos[2]) {
+            msg += ':\\n    ' + pos[2].__replace(/^\\s+/, '');
+        }
+        frames.push(msg);
+    }
+    return frames.join('\\n');
+};
+sys.exception_jsstack = function (error) {
+    if (error == null) return null;
+    if (typeof error.__jsstack__ != 'undefined') {
+        // drop the frame of BaseException.__init__, where the stack
+        // was recorded
+        var lines = error.__jsstack__.__split('\\n');
+        for (var i = 0; i < lines.length; i++) {
+            if (lines[i].match(/:\\d+:\\d+\\)?\\s*$/)) {
+                lines.splice(i, 1);
+                break;
+            }
+        }
+        return lines.join('\\n');
+    }
+    if (typeof error.stack != 'undefined') return error.stack;
+    return null;
+};
+""")
+
 def trackstackstr(stack=None):
+    """returns the python traceback of the last exception, or of
+    stack. without stack tracking, the javascript stack of the
+    exception is resolved through the source maps (see --source-map)"""
     if stack is None:
         stack = JS('$pyjs.__last_exception_stack__')
+        if (    not stack
+            and JS('$pyjs.options.source_map')
+            and JS('$pyjs.__last_exception__')
+           ):
+            stack = JS('sys.exception_jsstack($pyjs.__last_exception__.error)')
     if not stack:
         return ''
+    if JS("typeof stack == 'string'"):
+        return JS('sys.mapped_stack(stack)')
     stackstrings = []
     msg = ''
     for s in list(stack):
@@ -3,6 +3,13 @@ import os
 import sys
 import util
 import logging
+import time
+import hashlib
+import buildcache
+import astcache
+import pathindex
+import treeshake
+import modulegraph
 import pyjs
 
 
@@ -18,6 +25,24 @@ else:
     PYJAMASLIB_PATH = os.path.join(pyjs.pyjspth, "library")
 
 _path_cache= {}
+_path_index = pathindex.PathIndex()
+def clear_path_cache():
+    """forgets all module lookups, e.g. after files were added"""
+    _path_cache.clear()
+    _path_index.revalidate()
+
+PATH_INDEX_FILE = 'pathindex'
+
+def is_dir(path):
+    """whether path is a directory, answered from the path index"""
+    return _path_index.is_dir(path)
+
+def load_path_index(cache_dir):
+    _path_index.load(os.path.join(cache_dir, PATH_INDEX_FILE))
+
+def save_path_index(cache_dir):
+    _path_index.save(os.path.join(cache_dir, PATH_INDEX_FILE))
+
 def module_path(name, path):
     global _path_cache
     candidates = []
@@ -47,12 +72,11 @@ def module_path(name, path):
             if p in cache:
                 if cache[p] is None:
                     break
-            elif os.path.isdir(cp) and os.path.exists(
-                os.path.join(cp, '__init__.py')):
+            elif _path_index.is_package(cp):
                 cache[p] = os.path.join(cp, '__init__.py')
-            elif os.path.exists(cp + '.py'):
+            elif _path_index.exists(cp + '.py'):
                 cache[p] = cp + '.py'
-            elif pn.endswith('.js') and os.path.exists(cp):
+            elif pn.endswith('.js') and _path_index.exists(cp):
                 cache[p] = cp
             else:
                 cache[p] = None
@@ -64,6 +88,40 @@ def module_path(name, path):
     raise RuntimeError, "Module %r not found" % name
 
 
+def _translate_job(compiler_name, sources, out_file, module_name,
+                   translator_arguments, ast_cache_dir=None):
+    """translates a module in a worker process of the linker pool"""
+    __import__(compiler_name)
+    compiler = sys.modules[compiler_name]
+    timings = {}
+    if ast_cache_dir:
+        ast_cache = astcache.ASTCache(ast_cache_dir)
+    else:
+        ast_cache = None
+    deps, js_libs = translator.translate(compiler, sources, out_file,
+                                         module_name=module_name,
+                                         timings=timings,
+                                         ast_cache=ast_cache,
+                                         **translator_arguments)
+    return deps, js_libs, timings
+
+
+class _Translated(object):
+    """result of a translation which is already finished, mimics the
+    interface of multiprocessing's AsyncResult"""
+
+    def __init__(self, deps, js_libs, timings=None):
+        self.deps = deps
+        self.js_libs = js_libs
+        self.timings = timings or {}
+
+    def get(self):
+        return self.deps, self.js_libs, self.timings
+
+    def wait(self):
+        pass
+
+
 class BaseLinker(object):
 
     platform_parents = {}
@@ -75,19 +133,28 @@ class BaseLinker(object):
                  early_static_app_libs = [], unlinked_modules = [], keep_lib_files = False,
                  platforms=[], path=[],
                  translator_arguments={},
-                 compile_inplace=False):
+                 compile_inplace=False,
+                 cache_dir=None, translation_cache=None,
+                 jobs=1,
+                 tree_shake=False, keep_names=[],
+                 profile=None):
         modules = [mod.replace(os.sep, '.') for mod in modules]
         self.compiler = compiler
         self.js_path = os.path.abspath(output)
         self.top_module = modules[0]
         self.modules = modules
         self.output = os.path.abspath(output)
-        self.js_libs = list(js_libs)
-        self.static_js_libs = list(static_js_libs)
-        self.early_static_js_libs = list(early_static_js_libs)
-        self.late_static_js_libs = list(late_static_js_libs)
-        self.dynamic_js_libs = list(dynamic_js_libs)
-        self.early_static_app_libs = list(early_static_app_libs)
+        # the lib lists are extended while linking, keep the initial
+        # values so that the linker can be called more than once
+        self.initial_libs = dict(
+            js_libs=list(js_libs),
+            static_js_libs=list(static_js_libs),
+            early_static_js_libs=list(early_static_js_libs),
+            late_static_js_libs=list(late_static_js_libs),
+            dynamic_js_libs=list(dynamic_js_libs),
+            early_static_app_libs=list(early_static_app_libs),
+            )
+        self.reset_libs()
         self.unlinked_modules = unlinked_modules
         self.keep_lib_files = keep_lib_files
         self.platforms = platforms
@@ -96,24 +163,129 @@ class BaseLinker(object):
         self.compile_inplace = compile_inplace
         self.top_module_path = None
         self.remove_files = {}
+        self.cache_dir = cache_dir
+        if translation_cache is None and cache_dir:
+            translation_cache = buildcache.TranslationCache(cache_dir)
+        self.translation_cache = translation_cache
+        if cache_dir:
+            self.ast_cache = astcache.ASTCache(os.path.join(cache_dir, 'ast'))
+        else:
+            self.ast_cache = None
+        self.jobs = jobs
+        self.pool = None
+        self.tree_shake = tree_shake
+        self.keep_names = keep_names
+        self.dead_code = {}
+        self.profile = profile
 
     def __call__(self):
+        if self.jobs > 1:
+            import multiprocessing
+            self.pool = multiprocessing.Pool(self.jobs)
+        if self.cache_dir:
+            load_path_index(self.cache_dir)
         try:
-            self.visited_modules = {}
-            self.done = {}
-            self.dependencies = {}
-            self.visit_start()
-            for platform in [None] + self.platforms:
-                self.visit_start_platform(platform)
-                old_path = self.path
-                self.path = [BUILTIN_PATH, PYLIB_PATH, PYJAMASLIB_PATH]
-                self.visit_modules(['pyjslib'], platform)
-                self.path = old_path
-                self.visit_modules(self.modules, platform)
-                self.visit_end_platform(platform)
-            self.visit_end()
+            self.dead_code = {}
+            if self.tree_shake:
+                # the first pass discovers the modules of the application
+                self.link()
+                self.dead_code = self.find_dead_code()
+            self.link()
+            if self.cache_dir:
+                save_path_index(self.cache_dir)
         except translator.TranslationError, e:
             raise e
+        finally:
+            if self.pool is not None:
+                self.pool.close()
+                self.pool.join()
+                self.pool = None
+
+    def link(self):
+        self.reset_libs()
+        # platform -> module graph, done and visited_modules hold the
+        # files and module names of the graphs
+        self.module_graphs = {}
+        self.visited_modules = {}
+        self.done = {}
+        self.dependencies = {}
+        self.pending = {}
+        self.module_files = {}
+        self.module_sources = {}
+        self.output_digests = {}
+        self.output_sizes = {}
+        self.js_modules = set()
+        self.source_files = set()
+        self.remove_files = {}
+        self.visit_start()
+        for platform in [None] + self.platforms:
+            self.visit_start_platform(platform)
+            old_path = self.path
+            self.path = [BUILTIN_PATH, PYLIB_PATH, PYJAMASLIB_PATH]
+            self.visit_modules(['pyjslib'], platform)
+            self.path = old_path
+            self.visit_modules(self.modules, platform)
+            self.visit_end_platform(platform)
+            if platform is None and self.pool is not None:
+                self.prefetch_platforms()
+        self.discard_pending()
+        self.visit_end()
+
+    def find_dead_code(self):
+        """returns the functions, classes and methods of the modules
+        visited by the last pass which are not reachable"""
+        modules = []
+        for module_name, sources in sorted(self.module_sources.items()):
+            defs = treeshake.ModuleDefinitions(module_name)
+            for src in sorted(sources):
+                defs.add_tree(self.compiler.ast,
+                              astcache.parse_file(self.compiler, src,
+                                                  self.ast_cache))
+            modules.append(defs)
+        return treeshake.find_dead_code(modules, self.js_sources(),
+                                        self.keep_names)
+
+    def js_sources(self):
+        """returns the code of the javascript libraries, which may
+        reference python names"""
+        code = []
+        seen = set()
+        for libs in [self.js_libs, self.dynamic_js_libs, self.static_js_libs,
+                     self.early_static_js_libs, self.late_static_js_libs,
+                     self.early_static_app_libs, list(self.js_modules)]:
+            for lib in libs:
+                for fname in [lib, os.path.join(self.output, lib),
+                              os.path.join(BUILTIN_PATH, 'public', lib)]:
+                    if os.path.isfile(fname):
+                        break
+                else:
+                    continue
+                if fname in seen:
+                    continue
+                seen.add(fname)
+                f = open(fname)
+                code.append(f.read())
+                f.close()
+        return code
+
+    def module_graph(self, platform):
+        if not platform in self.module_graphs:
+            graph = modulegraph.ModuleGraph(platform)
+            self.module_graphs[platform] = graph
+            self.done[platform] = graph.files
+            self.visited_modules[platform] = graph.modules
+        return self.module_graphs[platform]
+
+    def write_module_graph(self, path):
+        """writes the module graphs of the last build as json, or in
+        the dot language if path ends with .dot"""
+        modulegraph.write([self.module_graphs[platform]
+                           for platform in [None] + self.platforms
+                           if platform in self.module_graphs], path)
+
+    def reset_libs(self):
+        for name, libs in self.initial_libs.items():
+            setattr(self, name, list(libs))
 
     def visit_modules(self, module_names, platform=None, parent_file = None):
         prefix = ''
@@ -137,7 +309,9 @@ class BaseLinker(object):
                     abs_name = os.path.split(parent_file)[0]
                     abs_name = '.'.join(abs_name[len(parent_base)+1:].split(os.sep))
 
+        to_visit = []
         for mn in all_names:
+            start = time.time()
             p = None
             if abs_name:
                 p = module_path(abs_name + '.' + mn, [parent_base])
@@ -146,33 +320,78 @@ class BaseLinker(object):
             if not p:
                 p = module_path(mn, paths)
             if not p:
+                if self.profile is not None:
+                    # imports which are not modules, e.g. __pyjamas__
+                    self.profile.add('resolve', time.time() - start,
+                                     platform=platform)
                 continue
                 raise RuntimeError, "Module %r not found. Dep of %r" % (
                     mn, self.dependencies)
             if mn==self.top_module:
                 self.top_module_path = p
-            override_paths=[]
-            if platform:
-                for pl in self.platform_parents.get(platform, []) + [platform]:
-                    override_path = module_path('__%s__.%s' % (pl, mn),
-                                                paths)
-                    # prevent package overrides
-                    if override_path and not override_path.endswith('__init__.py'):
-                        override_paths.append(override_path)
+            if platform is None:
+                self.module_files.setdefault(mn, (p, paths))
+            override_paths = self.platform_overrides(mn, platform, paths)
+            to_visit.append((p, override_paths, mn))
+            if self.profile is not None:
+                self.profile.add('resolve', time.time() - start, mn, platform)
+        if self.pool is not None:
+            # start translating the whole frontier in the pool, the
+            # modules are still visited depth-first below
+            for p, override_paths, mn in to_visit:
+                self.prefetch_module(p, override_paths, platform, mn)
+        for p, override_paths, mn in to_visit:
             self.visit_module(p, override_paths, platform, module_name=mn)
 
-    def visit_module(self, file_path, overrides, platform,
-                     module_name):
+    def platform_overrides(self, module_name, platform, paths):
+        """returns the override files of a module for a platform and
+        its parent platforms"""
+        override_paths=[]
+        if platform:
+            for pl in self.platform_parents.get(platform, []) + [platform]:
+                override_path = module_path('__%s__.%s' % (pl, module_name),
+                                            paths)
+                # prevent package overrides
+                if override_path and not override_path.endswith('__init__.py'):
+                    override_paths.append(override_path)
+        return override_paths
+
+    def prefetch_platforms(self):
+        """starts translating the overridden modules of all platforms
+        at once, so the platforms are translated concurrently. modules
+        without an override are shared with the platform independent
+        build and are never translated again"""
+        for platform in self.platforms:
+            for mn in self.visited_modules.get(None, []):
+                if not mn in self.module_files:
+                    continue
+                p, paths = self.module_files[mn]
+                overrides = self.platform_overrides(mn, platform, paths)
+                if overrides:
+                    self.prefetch_module(p, overrides, platform, mn)
+
+    def discard_pending(self):
+        """removes the output of prefetched translations of modules
+        which were never visited, e.g. the override of a module which
+        the platform does not import"""
+        for out_file, (key, result) in self.pending.items():
+            result.wait()
+            if os.path.isfile(out_file):
+                os.remove(out_file)
+        self.pending = {}
+
+    def module_out_file(self, file_path, overrides, platform, module_name):
+        """returns the output file of a module or None if the module
+        file does not match the module name"""
         dir_name, file_name = os.path.split(file_path)
         if (     not file_name.endswith('.js')
              and file_name.split('.')[0] != module_name.split('.')[-1]
            ):
             if file_name == "__init__.py":
                 if os.path.basename(dir_name) != module_name.split('.')[-1]:
-                    return
+                    return None
             else:
-                return
-        self.merge_resources(dir_name)
+                return None
         if platform and overrides:
             plat_suffix = '.__%s__' % platform
         else:
@@ -183,17 +402,56 @@ class BaseLinker(object):
         else:
             out_file = os.path.join(self.output, 'lib',
                                     '%s%s.js' % (module_name, plat_suffix))
-        if out_file in self.done.get(platform, []):
-            return
-        
+        return out_file
+
+    def needs_translation(self, out_file, overrides, platform):
         # translate if
         #  -    no platform
         #  - or if we have an override
         #  - or the module is used in an override only
-        if (   platform is None
-            or (platform and overrides)
-            or (out_file not in self.done.get(None,[]))
+        return (   platform is None
+                or (platform and overrides)
+                or (out_file not in self.done.get(None,[]))
+               )
+
+    def prefetch_module(self, file_path, overrides, platform, module_name):
+        """starts the translation of a module in the pool"""
+        if file_path.endswith('.js'):
+            return
+        out_file = self.module_out_file(file_path, overrides, platform,
+                                        module_name)
+        if (   out_file is None
+            or out_file in self.pending
+            or out_file in self.done.get(platform, [])
+            or not self.needs_translation(out_file, overrides, platform)
            ):
+            return
+        self.pending[out_file] = self.start_translation(
+            [file_path] + overrides, out_file, module_name, platform)
+
+    def visit_module(self, file_path, overrides, platform,
+                     module_name):
+        out_file = self.module_out_file(file_path, overrides, platform,
+                                        module_name)
+        if out_file is None:
+            return
+        dir_name, file_name = os.path.split(file_path)
+        self.source_files.add(file_path)
+        self.source_files.update(overrides)
+        if file_name.endswith('.js'):
+            self.js_modules.add(file_path)
+        else:
+            self.module_sources.setdefault(module_name, set()).update(
+                [file_path] + overrides)
+        start = time.time()
+        self.merge_resources(dir_name)
+        if self.profile is not None:
+            self.profile.add('merge_resources', time.time() - start,
+                             module_name, platform)
+        if out_file in self.done.get(platform, []):
+            return
+        
+        if self.needs_translation(out_file, overrides, platform):
             if file_name.endswith('.js'):
                 fp = open(out_file, 'w')
                 fp.write("/* start javascript include: %s */\n" % file_name)
@@ -203,13 +461,8 @@ class BaseLinker(object):
                 deps = []
                 self.dependencies[out_file] = deps
             else:
-                logging.info('Translating module:%s platform:%s out:%r' % (
-                    module_name, platform or '-', out_file))
-                deps, js_libs = translator.translate(self.compiler,
-                                            [file_path] +  overrides,
-                                            out_file,
-                                            module_name=module_name,
-                                            **self.translator_arguments)
+                deps, js_libs = self.translate_module(
+                    file_path, overrides, out_file, module_name, platform)
                 self.dependencies[out_file] = deps
                 for path, mode, location in js_libs:
                     if mode == 'default':
@@ -237,13 +490,94 @@ class BaseLinker(object):
                             deps[i] = '.'.join(module_name.split('.')[:-1] + [dep])
         else:
             deps = self.dependencies[out_file]
-        if out_file not in self.done.setdefault(platform, []):
-            self.done[platform].append(out_file)
-        if module_name not in self.visited_modules.setdefault(platform, []):
-            self.visited_modules[platform].append(module_name)
+        if not out_file in self.output_sizes:
+            # cache busting renames the files of shared modules after
+            # the first platform
+            self.output_sizes[out_file] = os.path.getsize(out_file)
+        self.module_graph(platform).add(module_name, out_file,
+                                        [file_path], overrides, deps,
+                                        self.output_sizes[out_file])
         if deps:
             self.visit_modules(deps, platform, file_path)
 
+    def start_translation(self, sources, out_file, module_name,
+                          platform=None):
+        """starts the translation of a module, either in the pool or
+        synchronously. returns the cache key under which the translation
+        should be stored (None for cached translations) and the result"""
+        translator_arguments = self.translator_arguments
+        if module_name in self.dead_code:
+            translator_arguments = dict(translator_arguments,
+                prune=sorted(self.dead_code[module_name]))
+        cache = self.translation_cache
+        key = None
+        if cache is not None:
+            key = cache.key(module_name, sources, translator_arguments,
+                            self.compiler)
+            start = time.time()
+            entry = cache.get(key)
+            if entry is not None:
+                js, deps, js_libs = entry
+                logging.info('Using cached module:%s platform:%s out:%r' % (
+                    module_name, platform or '-', out_file))
+                fp = open(out_file, 'w')
+                fp.write(js)
+                fp.close()
+                self.output_digests[out_file] = hashlib.md5(js).hexdigest()
+                return None, _Translated(deps, js_libs,
+                                         {'cache': time.time() - start})
+        logging.info('Translating module:%s platform:%s out:%r' % (
+            module_name, platform or '-', out_file))
+        if self.pool is not None:
+            result = self.pool.apply_async(_translate_job, (
+                self.compiler.__name__, sources, out_file, module_name,
+                translator_arguments,
+                self.ast_cache and self.ast_cache.cache_dir))
+        else:
+            timings = {}
+            deps, js_libs = translator.translate(self.compiler,
+                                                 sources,
+                                                 out_file,
+                                                 module_name=module_name,
+                                                 timings=timings,
+                                                 ast_cache=self.ast_cache,
+                                                 **translator_arguments)
+            result = _Translated(deps, js_libs, timings)
+        return key, result
+
+    def translate_module(self, file_path, overrides, out_file, module_name,
+                         platform=None):
+        """translates a module to out_file, or writes the cached
+        translation if neither the sources nor the translator arguments
+        have changed. returns the dependencies and imported js libs"""
+        if out_file in self.pending:
+            key, result = self.pending.pop(out_file)
+        else:
+            key, result = self.start_translation([file_path] + overrides,
+                                                 out_file, module_name,
+                                                 platform)
+        deps, js_libs, timings = result.get()
+        if key is not None:
+            fp = open(out_file, 'r')
+            js = fp.read()
+            fp.close()
+            self.translation_cache.put(key, js, deps, js_libs)
+            self.output_digests[out_file] = hashlib.md5(js).hexdigest()
+        if self.profile is not None:
+            self.profile.add_timings(timings, module_name, platform)
+            self.profile.set_output(module_name, platform,
+                                    os.path.getsize(out_file), len(deps))
+        return deps, js_libs
+
+    def output_digest(self, out_file):
+        """returns the md5 of a generated file. the digest of a module is
+        taken when it is written, other files are read once"""
+        if not out_file in self.output_digests:
+            fp = open(out_file, 'rb')
+            self.output_digests[out_file] = hashlib.md5(fp.read()).hexdigest()
+            fp.close()
+        return self.output_digests[out_file]
+
     def merge_resources(self, dir_name):
         """gets a directory path for each module visited, this can be
         used to collect resources e.g. public folders"""
@@ -278,3 +612,43 @@ def add_linker_options(parser):
                       default=[],
                       action="append", help="additional paths appended to PYJSPATH")
 
+    parser.add_option("--cache-dir", dest="cache_dir",
+                      default=None,
+                      help="directory in which translated modules are cached"
+                           " between builds")
+
+    parser.add_option("--tree-shake", dest="tree_shake",
+                      default=False, action="store_true",
+                      help="remove functions, classes and methods which"
+                           " are not reachable from the application")
+
+    parser.add_option("--keep", dest="keep_names",
+                      default=[], action="append",
+                      help="regular expression for qualified names"
+                           " (module.name or module.Class.method) which"
+                           " must not be removed by --tree-shake, e.g."
+                           " names only used via getattr")
+
+    parser.add_option("--tree-shake-report", dest="tree_shake_report",
+                      default=None,
+                      help="file to which the names removed by"
+                           " --tree-shake are written")
+
+    parser.add_option("--build-profile", dest="build_profile",
+                      default=None,
+                      help="file to which the time spent in each phase of"
+                           " the build is written (as json), per module")
+
+    parser.add_option("--module-graph", dest="module_graph",
+                      default=None,
+                      help="file to which the modules, their imports,"
+                           " platform overrides and sizes are written, as"
+                           " json or as graphviz dot if it ends with .dot")
+
+    parser.add_option("--jobs", dest="jobs",
+                      default=1, type="int",
+                      help="number of processes used to translate modules"
+                           " in parallel. the modules of all platforms are"
+                           " only translated concurrently with more than"
+                           " one job")
+
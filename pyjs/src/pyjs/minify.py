@@ -0,0 +1,317 @@
+"""Minification of the generated javascript.
+
+The code is split into tokens, comments and whitespace are removed and
+the temporary variables of the translator (see Translator.uniqid) are
+renamed to short names. String literals which are repeated inside a
+module are replaced by variables declared at the top of the module
+function.
+
+Line breaks are kept where automatic semicolon insertion could depend
+on them (the same rules as jsmin). The markers of the source maps are
+kept, so that the maps are made from the minified code.
+"""
+
+import re
+import sourcemap
+
+TOKENS = re.compile(r'''
+    (?P<newline>\n)
+  | (?P<space>[ \t\r\f\v]+)
+  | (?P<comment>//[^\n]*|/\*.*?\*/)
+  | (?P<string>'(?:[^'\\\n]|\\.)*'|"(?:[^"\\\n]|\\.)*")
+  | (?P<number>0[xX][0-9a-fA-F]+|(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)
+  | (?P<name>[A-Za-z_$\x80-\xff][\w$\x80-\xff]*)
+  | (?P<punct>>>>=?|===|!==|<<=|>>=|\+\+|--|&&|\|\||[-+*/%&|^!=<>]=|<<|>>
+              |[{}()\[\];,.<>+\-*/%&|^!~?:=])
+''', re.VERBOSE | re.DOTALL)
+
+REGEX = re.compile(r'/(?:[^/\\\[\n]|\\.|\[(?:[^\]\\\n]|\\.)*\])+/[A-Za-z]*')
+
+# after these a / starts a regular expression and not a division
+REGEX_KEYWORDS = set(['return', 'typeof', 'instanceof', 'in', 'new',
+                      'delete', 'void', 'throw', 'case', 'do', 'else'])
+
+# names generated by Translator.uniqid and the stack tracking code
+TEMPORARY = re.compile(r'^\$(?:[A-Za-z_]+\d{6}|pyjs__trackstack_size_\d+)$')
+
+IDENTIFIER = re.compile(r'[A-Za-z_$][\w$]*')
+NAME_CHARS = ('0123456789abcdefghijklmnopqrstuvwxyz'
+              'ABCDEFGHIJKLMNOPQRSTUVWXYZ_')
+
+SCRIPT = re.compile(r'(<script(?:\s[^>]*)?>)(.*?)(</script>)',
+                    re.DOTALL | re.IGNORECASE)
+
+
+class MinifyError(Exception):
+    pass
+
+
+def is_word(c):
+    return c.isalnum() or c in '_$\\' or c >= '\x80'
+
+
+def tokenize(js):
+    """returns a list of [kind, text, newline_before] tokens. kind is one
+    of name, number, string, regex, punct, comment (only for
+    conditional compilation comments) and marker (source map markers)"""
+    tokens = []
+    pos = 0
+    newline = False
+    prev = None
+    end = len(js)
+    while pos < end:
+        if js[pos] == '/' and js[pos+1:pos+2] not in ('/', '*'):
+            if (   prev is None
+                or (prev[0] == 'punct' and not prev[1] in (')', ']', '}',
+                                                           '++', '--'))
+                or (prev[0] == 'name' and prev[1] in REGEX_KEYWORDS)
+               ):
+                m = REGEX.match(js, pos)
+                if m is None:
+                    raise MinifyError("Invalid regular expression at %d" % pos)
+                prev = ['regex', m.group(), newline]
+                tokens.append(prev)
+                newline = False
+                pos = m.end()
+                continue
+        m = TOKENS.match(js, pos)
+        if m is None:
+            raise MinifyError("Unexpected character %r at %d" % (js[pos], pos))
+        pos = m.end()
+        kind = m.lastgroup
+        if kind == 'newline':
+            newline = True
+        elif kind == 'space':
+            pass
+        elif kind == 'comment':
+            text = m.group()
+            if text.startswith('/*@'):
+                # conditional compilation
+                prev = ['comment', text, newline]
+                tokens.append(prev)
+                newline = False
+            elif sourcemap.MARKER.match(text):
+                tokens.append(['marker', text, newline])
+                newline = False
+            elif '\n' in text:
+                newline = True
+        else:
+            prev = [kind, m.group(), newline]
+            tokens.append(prev)
+            newline = False
+    return tokens
+
+
+def needs_space(a, b):
+    """whether the tokens a and b must be separated"""
+    x, y = a[1][-1], b[1][0]
+    if is_word(x) and is_word(y):
+        return True
+    if a[0] == 'number' and y == '.' and not '.' in a[1]:
+        return True
+    if x + y in ('++', '--', '//', '/*', '<!', '->'):
+        return True
+    return False
+
+
+def keeps_newline(a, b):
+    """whether a line break between a and b could be significant"""
+    x, y = a[1][-1], b[1][0]
+    return (    (is_word(x) or x in ')]}\'"/' or a[1] in ('++', '--'))
+            and (is_word(y) or y in '([{\'"/!~+-'))
+
+
+class NameGenerator(object):
+    """generates short names not contained in used"""
+
+    def __init__(self, used):
+        self.used = used
+        self.count = 0
+
+    def next(self):
+        while True:
+            n = self.count
+            self.count += 1
+            name = ''
+            while True:
+                name = NAME_CHARS[n % len(NAME_CHARS)] + name
+                n = n // len(NAME_CHARS)
+                if n == 0:
+                    break
+            name = '$' + name
+            if not name in self.used:
+                return name
+
+
+def used_names(tokens):
+    used = set()
+    for kind, text, newline in tokens:
+        if kind == 'name':
+            used.add(text)
+        elif kind in ('string', 'comment'):
+            used.update(IDENTIFIER.findall(text))
+    return used
+
+
+def rename_temporaries(tokens, names):
+    counts = {}
+    for i, token in enumerate(tokens):
+        if (    token[0] == 'name'
+            and TEMPORARY.match(token[1])
+            and not (i and tokens[i-1][1] == '.')
+           ):
+            counts[token[1]] = counts.get(token[1], 0) + 1
+    # the most frequent names get the shortest replacement
+    order = sorted(counts.keys(), key=lambda n: (-counts[n], n))
+    mapping = {}
+    for name in order:
+        mapping[name] = names.next()
+    for i, token in enumerate(tokens):
+        if token[0] == 'name' and token[1] in mapping:
+            if not (i and tokens[i-1][1] == '.'):
+                token[1] = mapping[token[1]]
+
+
+def function_bodies(tokens):
+    """returns (start, end) indexes of the braces of the function bodies
+    which are not nested in another function"""
+    bodies = []
+    parens = []
+    braces = []
+    depth = 0
+    body_start = None
+    for i, (kind, text, newline) in enumerate(tokens):
+        if text == '(':
+            parens.append(
+                    (i > 0 and tokens[i-1][1] == 'function')
+                 or (i > 1 and tokens[i-2][1] == 'function'))
+        elif text == ')':
+            if parens and parens.pop():
+                body_start = i + 1
+        elif text == '{':
+            is_body = body_start == i
+            if is_body:
+                if depth == 0:
+                    start = i
+                depth += 1
+            braces.append(is_body)
+        elif text == '}':
+            if braces and braces.pop():
+                depth -= 1
+                if depth == 0:
+                    bodies.append((start, i))
+    return bodies
+
+
+def is_property_name(tokens, i):
+    return (    tokens[i+1][1] == ':'
+            and tokens[i-1][1] in ('{', ','))
+
+
+def share_strings(tokens, names):
+    """replaces repeated string literals in the outermost function bodies
+    by variables. returns the new token list"""
+    result = []
+    last = 0
+    for start, end in function_bodies(tokens):
+        counts = {}
+        for i in xrange(start + 1, end):
+            if tokens[i][0] == 'string' and not is_property_name(tokens, i):
+                counts[tokens[i][1]] = counts.get(tokens[i][1], 0) + 1
+        body_names = NameGenerator(names.used)
+        body_names.count = names.count
+        mapping = {}
+        name = None
+        for s in sorted(counts.keys(), key=lambda s: (-counts[s], s)):
+            if counts[s] < 2:
+                continue
+            if name is None:
+                name = body_names.next()
+            # the declaration costs the name, the literal and 2 chars
+            saved = counts[s] * (len(s) - len(name))
+            if saved > len(name) + len(s) + 2:
+                mapping[s] = name
+                name = None
+        if not mapping:
+            continue
+        first = start + 1
+        # keep directives like "use strict" in front
+        while (    tokens[first][0] == 'string'
+               and tokens[first+1:first+2]
+               and tokens[first+1][1] == ';'
+              ):
+            first += 2
+        result.extend(tokens[last:first])
+        decl = [['name', 'var', False]]
+        for s, name in sorted(mapping.items(), key=lambda i: i[1]):
+            if len(decl) > 1:
+                decl.append(['punct', ',', False])
+            decl.extend([['name', name, False], ['punct', '=', False],
+                         ['string', s, False]])
+        decl.append(['punct', ';', False])
+        result.extend(decl)
+        for i in xrange(first, end):
+            token = tokens[i]
+            if (    token[0] == 'string'
+                and token[1] in mapping
+                and not is_property_name(tokens, i)
+               ):
+                token = ['name', mapping[token[1]], token[2]]
+            result.append(token)
+        last = end
+    result.extend(tokens[last:])
+    return result
+
+
+def minify(js, rename=True, strings=True):
+    """returns the minified javascript code"""
+    tokens = tokenize(js)
+    if not tokens:
+        return ''
+    names = NameGenerator(used_names(tokens))
+    if rename:
+        rename_temporaries(tokens, names)
+    if strings:
+        tokens = share_strings(tokens, names)
+    out = []
+    prev = None
+    # markers do not separate tokens, they are written in front of the
+    # token which follows them
+    markers = []
+    newline = False
+    for token in tokens:
+        if token[0] == 'marker':
+            markers.append(token[1])
+            newline = newline or token[2]
+            continue
+        if prev is not None:
+            if (token[2] or newline) and keeps_newline(prev, token):
+                out.append('\n')
+            elif needs_space(prev, token):
+                out.append(' ')
+        out.extend(markers)
+        out.append(token[1])
+        prev = token
+        markers = []
+        newline = False
+    out.extend(markers)
+    return ''.join(out)
+
+
+def minify_html(html, **kwargs):
+    """minifies the inline scripts of a html page"""
+    def replace(m):
+        start, code, end = m.groups()
+        if 'src=' in start.lower() and not code.strip():
+            return m.group()
+        head = tail = ''
+        stripped = code.strip()
+        if stripped.startswith('<!--'):
+            head = '<!--\n'
+            stripped = stripped[4:]
+            if stripped.endswith('//-->'):
+                stripped, tail = stripped[:-5], '\n//-->'
+            elif stripped.endswith('-->'):
+                stripped, tail = stripped[:-3], '\n-->'
+        return start + head + minify(stripped, **kwargs) + tail + end
+    return SCRIPT.sub(replace, html)
@@ -0,0 +1,183 @@
+"""Module graph of a build.
+
+The linker keeps one graph per platform (None is the platform
+independent build). It holds the modules in the order they were
+visited, their output files, sources, platform overrides, sizes and
+imports. Membership tests are constant time, so the linker can ask
+whether a module was visited or a file was written for every import.
+
+The graphs can be exported as json or in the dot language of graphviz,
+e.g. to see which modules make an application large or where to split
+it.
+"""
+
+try:
+    import json
+except ImportError:
+    import simplejson as json
+
+
+class UniqueList(list):
+    """a list without duplicates, with constant time membership tests.
+    append and extend skip items which are in the list already"""
+
+    def __init__(self, items=()):
+        list.__init__(self)
+        self.members = set()
+        self.extend(items)
+
+    def __contains__(self, item):
+        return item in self.members
+
+    def append(self, item):
+        if not item in self.members:
+            self.members.add(item)
+            list.append(self, item)
+
+    def extend(self, items):
+        for item in items:
+            self.append(item)
+
+    def __iadd__(self, items):
+        self.extend(items)
+        return self
+
+    def remove(self, item):
+        list.remove(self, item)
+        self.members.discard(item)
+
+
+class ModuleGraph(object):
+
+    def __init__(self, platform=None):
+        self.platform = platform
+        # the output files and module names in the order they were
+        # visited, these are the linker's done and visited_modules
+        self.files = UniqueList()
+        self.modules = UniqueList()
+        # module name -> dict(file, sources, overrides, bytes, imports)
+        self.info = {}
+
+    def add(self, module_name, out_file, sources=(), overrides=(),
+            imports=(), size=None):
+        """adds a module and the names it imports"""
+        self.files.append(out_file)
+        self.modules.append(module_name)
+        if not module_name in self.info:
+            self.info[module_name] = dict(file=out_file,
+                                          sources=list(sources),
+                                          overrides=list(overrides),
+                                          bytes=size,
+                                          imports=list(imports))
+
+    def __contains__(self, module_name):
+        return module_name in self.modules
+
+    def dependencies(self, module_name):
+        """returns the modules of the graph imported by a module,
+        including the packages they are part of"""
+        deps = UniqueList()
+        info = self.info.get(module_name)
+        if info is None:
+            return deps
+        for name in info['imports']:
+            parts = name.split('.')
+            for i in range(1, len(parts) + 1):
+                dep = '.'.join(parts[:i])
+                if dep in self.info and dep != module_name:
+                    deps.append(dep)
+        return deps
+
+    def edges(self):
+        """returns (module, imported module) pairs"""
+        return [(name, dep) for name in self.modules
+                for dep in self.dependencies(name)]
+
+    def topological_order(self):
+        """returns the modules with the modules they import first.
+        modules which import each other keep their visiting order"""
+        order = UniqueList()
+        entered = set()
+        for root in self.modules:
+            if root in entered:
+                continue
+            entered.add(root)
+            stack = [(root, iter(self.dependencies(root)))]
+            while stack:
+                name, deps = stack[-1]
+                for dep in deps:
+                    if not dep in entered:
+                        entered.add(dep)
+                        stack.append((dep, iter(self.dependencies(dep))))
+                        break
+                else:
+                    stack.pop()
+                    order.append(name)
+        return list(order)
+
+    def report(self):
+        """returns the graph as a dict, which can be written as json"""
+        modules = []
+        for name in self.modules:
+            info = self.info[name]
+            modules.append(dict(module=name,
+                                file=info['file'],
+                                sources=info['sources'],
+                                overrides=info['overrides'],
+                                bytes=info['bytes'],
+                                imports=list(self.dependencies(name))))
+        return dict(platform=self.platform,
+                    modules=modules,
+                    edges=[list(e) for e in self.edges()],
+                    order=self.topological_order())
+
+
+def write_json(graphs, path):
+    """writes the graphs of all platforms as json"""
+    f = open(path, 'w')
+    try:
+        json.dump([g.report() for g in graphs], f, indent=1,
+                  sort_keys=True)
+    finally:
+        f.close()
+
+
+def dot(graphs):
+    """returns the graph of the platform independent build in the dot
+    language. modules with platform overrides are drawn in bold and
+    name the platforms"""
+    graph = graphs[0]
+    overridden = {}
+    for g in graphs[1:]:
+        for name in g.modules:
+            if g.info[name]['overrides']:
+                overridden.setdefault(name, []).append(g.platform)
+    lines = ['digraph modules {', '  node [shape=box];']
+    for name in graph.modules:
+        label = name
+        size = graph.info[name]['bytes']
+        if size is not None:
+            label += '\\n%.1f KB' % (size / 1024.0)
+        attributes = ['label="%s"' % label]
+        if name in overridden:
+            attributes[0] = 'label="%s\\n(%s)"' % (
+                label, ', '.join(overridden[name]))
+            attributes.append('style=bold')
+        lines.append('  "%s" [%s];' % (name, ', '.join(attributes)))
+    for name, dep in graph.edges():
+        lines.append('  "%s" -> "%s";' % (name, dep))
+    lines.append('}')
+    return '\n'.join(lines) + '\n'
+
+
+def write(graphs, path):
+    """writes the graphs to path, in the dot language if the file name
+    ends with .dot and as json otherwise"""
+    if path.endswith('.dot'):
+        f = open(path, 'w')
+        try:
+            f.write(dot(graphs))
+        finally:
+            f.close()
+    else:
+        write_json(graphs, path)
@@ -0,0 +1,121 @@
+"""Index of the directories on the module path.
+
+module_path looks for every prefix of a module name in every directory
+of the path, as a package and as a module, and the linker looks for
+the platform overrides of every module. Instead of probing the file
+system for each candidate, the index lists a directory the first time
+it is needed and answers all lookups in it from the listing.
+
+The listings can be saved and loaded by a later build. A loaded
+listing is only used if the modification time of its directory did
+not change since it was listed.
+"""
+
+import os
+import stat
+import time
+import cPickle
+import logging
+
+# bump this if the layout of the saved index changes
+INDEX_FORMAT = 1
+
+
+class PathIndex(object):
+
+    def __init__(self):
+        # directory -> (mtime, time listed, names), mtime is None if
+        # the directory does not exist
+        self.listings = {}
+        # listings which have to be validated before they are used
+        self.snapshot = {}
+        self.listed = 0
+        self.reused = 0
+
+    def entries(self, dir_name):
+        """returns the names in a directory"""
+        listing = self.listings.get(dir_name)
+        if listing is None:
+            listing = self.list_dir(dir_name)
+            self.listings[dir_name] = listing
+        return listing[2]
+
+    def list_dir(self, dir_name):
+        try:
+            st = os.stat(dir_name or os.curdir)
+        except OSError:
+            return (None, None, frozenset())
+        if not stat.S_ISDIR(st.st_mode):
+            return (None, None, frozenset())
+        saved = self.snapshot.pop(dir_name, None)
+        # a directory modified in the second it was listed may have
+        # changed after it was listed
+        if (    saved is not None
+            and saved[0] == st.st_mtime
+            and saved[1] - saved[0] > 1
+           ):
+            self.reused += 1
+            return saved
+        self.listed += 1
+        listed_at = time.time()
+        try:
+            names = frozenset(os.listdir(dir_name or os.curdir))
+        except OSError:
+            return (None, None, frozenset())
+        return (st.st_mtime, listed_at, names)
+
+    def exists(self, path):
+        dir_name, name = os.path.split(path)
+        return name in self.entries(dir_name)
+
+    def is_dir(self, path):
+        if not self.exists(path):
+            return False
+        self.entries(path)
+        return self.listings[path][0] is not None
+
+    def is_package(self, path):
+        return self.exists(path) and '__init__.py' in self.entries(path)
+
+    def revalidate(self):
+        """checks the modification times of all directories again
+        before their listings are used, e.g. after files were added"""
+        for dir_name, listing in self.listings.items():
+            if listing[0] is not None:
+                self.snapshot[dir_name] = listing
+        self.listings.clear()
+
+    def load(self, file_name):
+        if not os.path.isfile(file_name):
+            return
+        try:
+            f = open(file_name, 'rb')
+            try:
+                version, listings = cPickle.load(f)
+            finally:
+                f.close()
+        except (IOError, EOFError, ValueError, cPickle.UnpicklingError), e:
+            logging.warning('Ignoring broken path index %r: %s' % (
+                file_name, e))
+            return
+        if version != INDEX_FORMAT:
+            return
+        for dir_name, listing in listings.items():
+            if not dir_name in self.listings:
+                self.snapshot[dir_name] = listing
+        logging.debug('Loaded path index %r (%d directories)' % (
+            file_name, len(listings)))
+
+    def save(self, file_name):
+        listings = dict(self.snapshot)
+        for dir_name, listing in self.listings.items():
+            if listing[0] is not None:
+                listings[dir_name] = listing
+        tmp_name = '%s.%s.tmp' % (file_name, os.getpid())
+        f = open(tmp_name, 'wb')
+        try:
+            cPickle.dump((INDEX_FORMAT, listings), f,
+                         cPickle.HIGHEST_PROTOCOL)
+        finally:
+            f.close()
+        os.rename(tmp_name, file_name)
@@ -0,0 +1,250 @@
+"""Development server.
+
+pyjsserve serves an application without building it first. The app
+files only link the runtime (pyjslib, sys and dynamic) and load all
+other modules dynamically, like a multi file build. A module is
+translated the first time the browser loads it and again when one of
+its sources changed. The public folders are served as they are.
+"""
+
+import os
+import time
+import logging
+import posixpath
+import urllib
+import tempfile
+import mimetypes
+import BaseHTTPServer
+from optparse import OptionParser
+from pyjs import browser
+from pyjs import linker
+from pyjs import translator
+import pyjs
+
+
+class ServeLinker(browser.BrowserLinker):
+    """links the runtime into the app files, but not the modules of the
+    application"""
+
+    def __init__(self, *args, **kwargs):
+        kwargs['multi_file'] = True
+        super(ServeLinker, self).__init__(*args, **kwargs)
+        self.modules = []
+
+    def visit_start(self):
+        super(ServeLinker, self).visit_start()
+        self.top_module_path = linker.module_path(self.top_module, self.path)
+
+
+class DevServer(object):
+    """translates the modules of an application when they are requested
+    and keeps them in memory"""
+
+    def __init__(self, linker_):
+        self.linker = linker_
+        # (module name, platform) -> (sources and mtimes, javascript)
+        self.translations = {}
+        self.linked = False
+        self.module_dirs = []
+
+    def link(self):
+        """links the app files, the first time they are requested"""
+        if not self.linked:
+            start = time.time()
+            self.linker()
+            self.linked = True
+            logging.info('Linked the runtime in %.2fs' % (time.time() - start))
+        # modules may have been added since the last page load
+        linker.clear_path_cache()
+
+    def runtime_modules(self):
+        return self.linker.visited_modules.get(None, [])
+
+    def module(self, file_name):
+        """returns the javascript of the module file lib/file_name, or
+        None if there is no such module"""
+        name = file_name[:-3]
+        platform = None
+        parts = name.split('.')
+        if parts[-1].startswith('__') and parts[-1].endswith('__'):
+            platform = parts[-1][2:-2]
+            name = '.'.join(parts[:-1])
+        if name in self.runtime_modules():
+            return None
+        file_path = linker.module_path(name, self.linker.path)
+        if file_path is None or file_path.endswith('.js'):
+            return None
+        overrides = []
+        if platform:
+            if not platform in self.linker.platforms:
+                return None
+            overrides = self.linker.platform_overrides(name, platform,
+                                                       self.linker.path)
+            if not overrides:
+                # the runtime loads the module without platform next
+                return None
+        sources = [file_path] + overrides
+        stamp = [(src, os.stat(src).st_mtime) for src in sources]
+        key = (name, platform)
+        entry = self.translations.get(key)
+        if entry is None or entry[0] != stamp:
+            entry = (stamp, self.translate(sources, file_name, name))
+            self.translations[key] = entry
+        dir_name = os.path.dirname(file_path)
+        if not dir_name in self.module_dirs:
+            self.module_dirs.append(dir_name)
+        return entry[1]
+
+    def translate(self, sources, file_name, module_name):
+        start = time.time()
+        out_file = os.path.join(self.linker.output, 'lib', file_name)
+        translator.translate(self.linker.compiler, sources, out_file,
+                             module_name=module_name,
+                             ast_cache=self.linker.ast_cache,
+                             **self.linker.translator_arguments)
+        f = open(out_file)
+        js = f.read()
+        f.close()
+        logging.info('Translated %s in %.2fs' % (module_name,
+                                                 time.time() - start))
+        return js
+
+    def public_folders(self):
+        """the public folders of the application and of the modules
+        loaded so far"""
+        dirs = [os.path.dirname(self.linker.top_module_path or '')]
+        dirs += [d for d in self.module_dirs if not d in dirs]
+        return [os.path.join(d, self.linker.public_folder) for d in dirs]
+
+    def find_file(self, path):
+        """returns the file of a static url path, from the public folders
+        or the generated files"""
+        for d in self.public_folders() + [self.linker.output]:
+            file_name = os.path.join(d, *path.split('/'))
+            if os.path.isfile(file_name):
+                return file_name
+        return None
+
+    def get(self, path):
+        """returns (status, content type, content) of a request path"""
+        path = posixpath.normpath(urllib.unquote(path.split('?')[0]))
+        path = path.lstrip('/')
+        if path.startswith('..'):
+            return 403, 'text/plain', 'Forbidden'
+        if path in ('', '.'):
+            path = self.linker.top_module + '.html'
+        if path.endswith('.html') or not self.linked:
+            self.link()
+        dir_name, file_name = posixpath.split(path)
+        if dir_name == 'lib' and file_name.endswith('.js'):
+            try:
+                js = self.module(file_name)
+            except (translator.TranslationError, SyntaxError), e:
+                logging.error('%s: %s' % (file_name, e))
+                return 500, 'text/plain', str(e)
+            if js is not None:
+                return 200, 'text/javascript', js
+        file_name = self.find_file(path)
+        if file_name is None:
+            return 404, 'text/plain', 'Not found: %s' % path
+        content_type = mimetypes.guess_type(file_name)[0]
+        f = open(file_name, 'rb')
+        content = f.read()
+        f.close()
+        return 200, content_type or 'application/octet-stream', content
+
+
+class DevRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        status, content_type, content = self.server.dev.get(self.path)
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(content)))
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        logging.debug(format % args)
+
+
+def make_server(dev, host='localhost', port=8000):
+    server = BaseHTTPServer.HTTPServer((host, port), DevRequestHandler)
+    server.dev = dev
+    return server
+
+
+def serve_script():
+    usage = """
+    usage: %prog [options] <application module name>
+
+    Serves the application at http://localhost:8000/ and translates
+    its modules when the browser loads them.
+    """
+    parser = OptionParser(usage = usage)
+    translator.add_compile_options(parser)
+    parser.add_option("-o", "--output", dest="output", default=None,
+                      help="directory for the generated files"
+                           " (a temporary directory by default)")
+    parser.add_option("-I", "--library_dir", dest="library_dirs",
+                      default=[], action="append",
+                      help="additional paths appended to PYJSPATH")
+    parser.add_option("-P", "--platforms", dest="platforms",
+                      default=','.join(browser.AVAILABLE_PLATFORMS),
+                      help="platforms to serve, comma-separated")
+    parser.add_option("--host", dest="host", default="localhost",
+                      help="address to listen on")
+    parser.add_option("--port", dest="port", default=8000, type="int",
+                      help="port to listen on")
+    options, args = parser.parse_args()
+    if len(args) != 1:
+        parser.error("incorrect number of arguments")
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+
+    top_module = args[0]
+    if top_module.lower().endswith('.py'):
+        top_module = top_module[:-3]
+    for d in options.library_dirs:
+        pyjs.path.append(os.path.abspath(d))
+    output = options.output or tempfile.mkdtemp(prefix='pyjsserve')
+
+    runtime_options = []
+    for name in ["arg_ignore", "arg_count", "arg_is_instance",
+                 "arg_instance_type", "arg_kwarg_dup",
+                 "arg_kwarg_unexpected_keyword", "arg_kwarg_multiple_values"]:
+        runtime_options.append((name, options.function_argument_checking))
+    runtime_options.append(("dynamic_loading", True))
+
+    translator_arguments=dict(
+        debug=options.debug,
+        print_statements = options.print_statements,
+        function_argument_checking=options.function_argument_checking,
+        attribute_checking=options.attribute_checking,
+        bound_methods=options.bound_methods,
+        descriptors=options.descriptors,
+        source_tracking=options.source_tracking,
+        line_tracking=options.line_tracking,
+        store_source=options.store_source,
+        inline_code = options.inline_code,
+        operator_funcs = options.operator_funcs,
+        number_classes = options.number_classes,
+        source_map = options.source_map,
+        optimize = options.optimize,
+    )
+    l = ServeLinker([top_module],
+                    compiler=translator.import_compiler(options.internal_ast),
+                    output=output,
+                    platforms=options.platforms.lower().split(','),
+                    path=pyjs.path,
+                    translator_arguments=translator_arguments,
+                    runtime_options=runtime_options,
+                   )
+    server = make_server(DevServer(l), options.host, options.port)
+    print "Serving %s at http://%s:%d/" % (top_module, options.host,
+                                           options.port)
+    print "Output   :", output
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
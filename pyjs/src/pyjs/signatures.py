@@ -0,0 +1,228 @@
+"""Signatures of the functions and classes of a module.
+
+A call with keyword arguments is translated into a call of
+$pyjs_kwargs_call, which matches the keywords to the arguments of the
+callee at run time. If the callee is a function or class of the module
+being translated, which is bound only once, its arguments are known at
+compile time and the translator can pass the keywords as positional
+arguments.
+
+module_signatures() returns the signatures of these functions and
+classes, Signature.resolve() the positional arguments of a call.
+Calls which could pass anything to a **kwargs argument, which miss an
+argument or give one twice are left to the run time, which raises the
+errors.
+
+local_names() returns the names a function binds, which hide the
+functions and classes of the module in its body, even before they are
+assigned.
+"""
+
+
+class Signature(object):
+
+    def __init__(self, argnames, ndefaults, varargs, kwargs):
+        self.argnames = list(argnames)
+        self.ndefaults = ndefaults
+        self.varargs = varargs
+        self.kwargs = kwargs
+
+    def resolve(self, nargs, keywords):
+        """returns the arguments of a call with nargs positional
+        arguments and the keyword arguments named keywords as a list
+        of positional indexes, keyword names and None for the default
+        value of an argument. returns None if the call cannot be
+        resolved"""
+        argnames = self.argnames
+        if nargs > len(argnames):
+            return None
+        given = {}
+        for name in keywords:
+            if not name in argnames or name in given:
+                return None
+            if argnames.index(name) < nargs:
+                return None
+            given[name] = True
+        first_default = len(argnames) - self.ndefaults
+        args = range(nargs)
+        for i in range(nargs, len(argnames)):
+            name = argnames[i]
+            if name in given:
+                args.append(name)
+            elif i >= first_default:
+                args.append(None)
+            else:
+                return None
+        while args and args[-1] is None:
+            args.pop()
+        return args
+
+
+def function_signature(node, skip_self=False):
+    """returns the signature of a function or method node, or None"""
+    if getattr(node, 'decorators', None) is not None:
+        return None
+    argnames = list(node.argnames)
+    if node.kwargs:
+        argnames.pop()
+    if node.varargs:
+        argnames.pop()
+    for name in argnames:
+        if isinstance(name, tuple):
+            return None
+    if skip_self:
+        if not argnames:
+            return None
+        argnames = argnames[1:]
+    return Signature(argnames, len(node.defaults), node.varargs, node.kwargs)
+
+
+class Bindings(object):
+    """counts the bindings of the names of a module or class body"""
+
+    def __init__(self, ast):
+        self.ast = ast
+        self.count = {}
+        # names which functions declare global
+        self.rebound = set()
+        self.functions = {}
+        self.classes = {}
+        self.give_up = False
+
+    def bind(self, name):
+        self.count[name] = self.count.get(name, 0) + 1
+
+    def visit(self, node, top_level=True):
+        ast = self.ast
+        if isinstance(node, ast.Function):
+            if top_level:
+                self.bind(node.name)
+                self.functions[node.name] = node
+            self.visit_children(node, False)
+        elif isinstance(node, ast.Class):
+            if top_level:
+                self.bind(node.name)
+                self.classes[node.name] = node
+            self.visit_children(node, False)
+        elif isinstance(node, ast.Lambda):
+            self.visit_children(node, False)
+        elif isinstance(node, ast.AssName):
+            if top_level:
+                self.bind(node.name)
+        elif isinstance(node, ast.AugAssign) \
+             and isinstance(node.node, ast.Name):
+            if top_level:
+                self.bind(node.node.name)
+            self.visit(node.expr, top_level)
+        elif isinstance(node, ast.Import):
+            if top_level:
+                for name, asname in node.names:
+                    self.bind(asname or name.split('.')[0])
+        elif isinstance(node, ast.From):
+            for name, asname in node.names:
+                if name == '*':
+                    self.give_up = True
+                elif top_level:
+                    self.bind(asname or name)
+        elif isinstance(node, ast.Global):
+            self.rebound.update(node.names)
+        elif isinstance(node, ast.Exec):
+            self.give_up = True
+        else:
+            self.visit_children(node, top_level)
+
+    def visit_children(self, node, top_level):
+        for child in node.getChildNodes():
+            self.visit(child, top_level)
+
+
+def flatten_argnames(argnames):
+    names = []
+    for name in argnames:
+        if isinstance(name, tuple):
+            names.extend(flatten_argnames(name))
+        else:
+            names.append(name)
+    return names
+
+
+def local_names(ast, function_node):
+    """returns the set of names which a function or lambda node binds
+    in its own scope, or None if exec or import * may bind any name"""
+    bindings = Bindings(ast)
+    bindings.visit(function_node.code)
+    if bindings.give_up:
+        return None
+    names = set(bindings.count)
+    names.update(flatten_argnames(function_node.argnames))
+    return names
+
+
+def module_signatures(ast, module_node):
+    """returns a dict with the signatures of the functions and classes
+    of a module which are bound only once"""
+    bindings = Bindings(ast)
+    bindings.visit(module_node)
+    if bindings.give_up:
+        return {}
+    known = lambda name: (bindings.count.get(name) == 1
+                          and not name in bindings.rebound)
+
+    signatures = {}
+    for name, node in bindings.functions.iteritems():
+        if known(name):
+            signature = function_signature(node)
+            if signature is not None:
+                signatures[name] = signature
+
+    if '__metaclass__' in bindings.count:
+        # the metaclass of all classic classes
+        return signatures
+    class_bindings = {}
+    for name, node in bindings.classes.iteritems():
+        class_bindings[name] = Bindings(ast)
+        class_bindings[name].visit(node.code)
+
+    plain = {}
+    def plain_class(name):
+        """returns True if calling the class only calls its own
+        __init__, i.e. neither the class nor its bases define __new__
+        or a metaclass"""
+        if name == 'object' and not name in bindings.count:
+            return True
+        if not name in plain:
+            plain[name] = False
+            node = bindings.classes.get(name)
+            if node is None or not known(name) \
+               or getattr(node, 'decorators', None) is not None:
+                return False
+            for base in node.bases:
+                if not isinstance(base, ast.Name) \
+                   or not plain_class(base.name):
+                    return False
+            body = class_bindings[name]
+            if body.give_up or '__new__' in body.count \
+               or '__metaclass__' in body.count:
+                return False
+            plain[name] = True
+        return plain[name]
+
+    def init_signature(name):
+        """returns the signature of the __init__ of a plain class,
+        which may be inherited from its only base"""
+        body = class_bindings[name]
+        if not '__init__' in body.count:
+            bases = bindings.classes[name].bases
+            if len(bases) == 1 and bases[0].name in bindings.classes:
+                return init_signature(bases[0].name)
+            return None
+        if body.count['__init__'] != 1 or not '__init__' in body.functions:
+            return None
+        return function_signature(body.functions['__init__'], skip_self=True)
+
+    for name in bindings.classes:
+        if plain_class(name):
+            signature = init_signature(name)
+            if signature is not None:
+                signatures[name] = signature
+    return signatures
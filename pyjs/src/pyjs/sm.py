@@ -1,4 +1,5 @@
 import os
+from pyjs import buildprofile
 from pyjs import linker
 from pyjs import translator
 from pyjs import util
@@ -89,7 +90,7 @@ class SpidermonkeyLinker(linker.BaseLinker):
         if not self.js_libs or dir_name in self.merged_public:
             return
         public_folder = os.path.join(dir_name, 'public')
-        if not os.path.isdir(public_folder):
+        if not linker.is_dir(public_folder):
             return
         for i, js_lib in enumerate(self.js_libs):
             p = os.path.join(public_folder, js_lib)
@@ -166,15 +167,32 @@ def build_script():
         attribute_checking=options.attribute_checking,
         source_tracking=options.source_tracking,
         line_tracking=options.line_tracking,
-        store_source=options.store_source
+        store_source=options.store_source,
+        optimize=options.optimize,
         )
 
+    if options.build_profile:
+        profile = buildprofile.BuildProfile()
+    else:
+        profile = None
     l = SpidermonkeyLinker(top_module,
                            output=options.output,
                            platforms=[PLATFORM],
                            path=pyjs.path,
-                           translator_arguments=translator_arguments)
+                           translator_arguments=translator_arguments,
+                           cache_dir=options.cache_dir,
+                           jobs=options.jobs,
+                           profile=profile)
     l()
+    if l.translation_cache is not None:
+        print l.translation_cache.report()
+    if profile is not None:
+        profile.finish()
+        profile.write(options.build_profile)
+        for line in profile.summary():
+            print line
+    if options.module_graph:
+        l.write_module_graph(options.module_graph)
 
 
 
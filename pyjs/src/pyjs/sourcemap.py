@@ -0,0 +1,166 @@
+"""Source maps.
+
+With the source_map option the translator does not generate code to
+track the line numbers at runtime. Instead it marks the start of every
+statement with a comment holding the module name and the python line
+number (see marker). The markers are left in place while the modules
+are linked and minified. When an output file is written, they are
+removed and a source map (version 3) which maps the positions of the
+markers to the python sources is written next to it.
+
+Positions on a line without a marker are mapped to the statement
+before them, so that every line of a statement can be resolved. A
+marker with line 0 ends the current statement (e.g. at the end of a
+module).
+"""
+
+import re
+try:
+    import json
+except ImportError:
+    import simplejson as json
+
+MARKER = re.compile(r'/\*#pyjs:([\w.$]*):(\d+)\*/')
+
+BASE64 = ('ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz'
+          '0123456789+/')
+
+
+def marker(module_name, lineno):
+    return '/*#pyjs:%s:%d*/' % (module_name, lineno)
+
+
+def encode_vlq(value):
+    """returns the base64 VLQ encoding of an integer"""
+    if value < 0:
+        value = ((-value) << 1) | 1
+    else:
+        value <<= 1
+    encoded = ''
+    while True:
+        digit = value & 31
+        value >>= 5
+        if value:
+            digit |= 32
+        encoded += BASE64[digit]
+        if not value:
+            return encoded
+
+
+def decode_vlq(encoded):
+    """returns the integers of a base64 VLQ encoded segment"""
+    values = []
+    value = shift = 0
+    for c in encoded:
+        digit = BASE64.index(c)
+        value += (digit & 31) << shift
+        if digit & 32:
+            shift += 5
+            continue
+        if value & 1:
+            values.append(-(value >> 1))
+        else:
+            values.append(value >> 1)
+        value = shift = 0
+    return values
+
+
+class SourceMap(object):
+    """a source map of a generated file.
+
+    resolve is called with a module name and returns the name under
+    which the python source is listed in the map and its content (or
+    None)
+    """
+
+    def __init__(self, file_name, resolve=None):
+        self.file_name = file_name
+        self.resolve = resolve
+        self.sources = []
+        self.contents = []
+        self.source_index = {}
+        # (line, column, source index, source line), zero based
+        self.segments = []
+
+    def source(self, module_name):
+        if not module_name in self.source_index:
+            if self.resolve is None:
+                name, content = module_name.replace('.', '/') + '.py', None
+            else:
+                name, content = self.resolve(module_name)
+            self.source_index[module_name] = len(self.sources)
+            self.sources.append(name)
+            self.contents.append(content)
+        return self.source_index[module_name]
+
+    def add(self, line, column, source, source_line):
+        if self.segments and self.segments[-1][:2] == (line, column):
+            self.segments[-1] = (line, column, source, source_line)
+        else:
+            self.segments.append((line, column, source, source_line))
+
+    def mappings(self):
+        lines = []
+        segments = []
+        line = 0
+        prev_column = prev_source = prev_source_line = 0
+        for seg_line, column, source, source_line in self.segments:
+            while line < seg_line:
+                lines.append(','.join(segments))
+                segments = []
+                prev_column = 0
+                line += 1
+            segments.append(''.join([encode_vlq(column - prev_column),
+                                     encode_vlq(source - prev_source),
+                                     encode_vlq(source_line - prev_source_line),
+                                     encode_vlq(0)]))
+            prev_column, prev_source, prev_source_line = (
+                column, source, source_line)
+        lines.append(','.join(segments))
+        return ';'.join(lines)
+
+    def to_json(self):
+        data = dict(version=3,
+                    file=self.file_name,
+                    sources=self.sources,
+                    names=[],
+                    mappings=self.mappings())
+        if [c for c in self.contents if c is not None]:
+            data['sourcesContent'] = self.contents
+        return json.dumps(data, sort_keys=True)
+
+
+def extract(code, source_map):
+    """removes the markers from code and adds their positions to
+    source_map. returns the code without markers"""
+    out = []
+    line = column = pos = 0
+    current = None
+    for m in MARKER.finditer(code):
+        text = code[pos:m.start()]
+        out.append(text)
+        newlines = text.count('\n')
+        if newlines:
+            if current is not None:
+                for i in xrange(1, newlines + 1):
+                    source_map.add(line + i, 0, *current)
+            line += newlines
+            column = len(text) - text.rfind('\n') - 1
+        else:
+            column += len(text)
+        module_name, lineno = m.group(1), int(m.group(2))
+        if lineno:
+            current = (source_map.source(module_name), lineno - 1)
+            source_map.add(line, column, *current)
+        else:
+            current = None
+            segments = source_map.segments
+            if segments and segments[-1][:2] == (line, column):
+                del segments[-1]
+        pos = m.end()
+    text = code[pos:]
+    out.append(text)
+    if current is not None:
+        for i in xrange(1, text.count('\n') + 1):
+            source_map.add(line + i, 0, *current)
+    return ''.join(out)
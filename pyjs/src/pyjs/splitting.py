@@ -0,0 +1,63 @@
+"""Code splitting.
+
+The modules of an application are partitioned into an initial chunk,
+which is loaded when the application starts, and chunks which are
+loaded on demand, the first time one of their modules is imported.
+
+A split point is a module which starts an on demand chunk. The chunk
+of a split point contains all modules which are only reachable through
+it. Modules which are reachable through several split points (but not
+from the initial chunk) are moved into a common chunk shared by these
+split points.
+"""
+
+import hashlib
+
+SPLIT_POINT_FLAG = 'SPLIT_POINT'
+
+
+def reachable(graph, start, stop=()):
+    """returns the modules reachable from start without passing a
+    module in stop. graph maps module names to imported module names"""
+    seen = set()
+    pending = list(start)
+    while pending:
+        name = pending.pop()
+        if name in seen or not name in graph:
+            continue
+        seen.add(name)
+        for dep in graph[name]:
+            if not dep in seen and not dep in stop:
+                pending.append(dep)
+    return seen
+
+
+def common_chunk_name(split_points):
+    return 'common.' + hashlib.md5('+'.join(sorted(split_points))).hexdigest()[:8]
+
+
+def partition(graph, roots, split_points):
+    """returns the modules of the initial chunk and a dict of chunk name
+    to the modules of each on demand chunk"""
+    split_points = set([p for p in split_points
+                        if p in graph and not p in roots])
+    initial = reachable(graph, roots, split_points)
+    owners = {}
+    for point in split_points:
+        for name in reachable(graph, [point], split_points - set([point])):
+            if not name in initial:
+                owners.setdefault(name, set()).add(point)
+    chunks = {}
+    for name in graph:
+        if name in initial:
+            continue
+        points = owners.get(name)
+        if not points:
+            # not imported by the application at all, keep it where it
+            # was without splitting
+            initial.add(name)
+        elif len(points) == 1:
+            chunks.setdefault(list(points)[0], set()).add(name)
+        else:
+            chunks.setdefault(common_chunk_name(points), set()).add(name)
+    return initial, chunks
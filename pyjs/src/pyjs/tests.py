@@ -15,5 +15,54 @@ def test_suite():
     util = DocFileSuite('util.txt',
                 optionflags=doctest.NORMALIZE_WHITESPACE | doctest.ELLIPSIS,
                         )
-    s = unittest.TestSuite((translator, browser, sm, util))
+    buildcache = DocFileSuite('buildcache.txt',
+                optionflags=doctest.NORMALIZE_WHITESPACE | doctest.ELLIPSIS,
+                        )
+    treeshake = DocFileSuite('treeshake.txt',
+                optionflags=doctest.NORMALIZE_WHITESPACE | doctest.ELLIPSIS,
+                        )
+    minify = DocFileSuite('minify.txt',
+                optionflags=doctest.NORMALIZE_WHITESPACE | doctest.ELLIPSIS,
+                        )
+    splitting = DocFileSuite('splitting.txt',
+                optionflags=doctest.NORMALIZE_WHITESPACE | doctest.ELLIPSIS,
+                        )
+    sourcemap = DocFileSuite('sourcemap.txt',
+                optionflags=doctest.NORMALIZE_WHITESPACE | doctest.ELLIPSIS,
+                        )
+    buildprofile = DocFileSuite('buildprofile.txt',
+                optionflags=doctest.NORMALIZE_WHITESPACE | doctest.ELLIPSIS,
+                        )
+    pathindex = DocFileSuite('pathindex.txt',
+                optionflags=doctest.NORMALIZE_WHITESPACE | doctest.ELLIPSIS,
+                        )
+    vendor = DocFileSuite('vendor.txt',
+                optionflags=doctest.NORMALIZE_WHITESPACE | doctest.ELLIPSIS,
+                        )
+    serve = DocFileSuite('serve.txt',
+                optionflags=doctest.NORMALIZE_WHITESPACE | doctest.ELLIPSIS,
+                        )
+    astcache = DocFileSuite('astcache.txt',
+                optionflags=doctest.NORMALIZE_WHITESPACE | doctest.ELLIPSIS,
+                        )
+    modulegraph = DocFileSuite('modulegraph.txt',
+                optionflags=doctest.NORMALIZE_WHITESPACE | doctest.ELLIPSIS,
+                        )
+    typeinfer = DocFileSuite('typeinfer.txt',
+                optionflags=doctest.NORMALIZE_WHITESPACE | doctest.ELLIPSIS,
+                        )
+    signatures = DocFileSuite('signatures.txt',
+                optionflags=doctest.NORMALIZE_WHITESPACE | doctest.ELLIPSIS,
+                        )
+    constfold = DocFileSuite('constfold.txt',
+                optionflags=doctest.NORMALIZE_WHITESPACE | doctest.ELLIPSIS,
+                        )
+    watch = DocFileSuite('watch.txt',
+                optionflags=doctest.NORMALIZE_WHITESPACE | doctest.ELLIPSIS,
+                        )
+    s = unittest.TestSuite((translator, browser, sm, util, buildcache,
+                            treeshake, minify, splitting, sourcemap,
+                            buildprofile, pathindex, vendor, serve,
+                            astcache, modulegraph, typeinfer,
+                            signatures, constfold, watch))
     return s
@@ -21,10 +21,16 @@ from cStringIO import StringIO
 import re
 import hashlib
 import logging
+import time
 import compiler
 from compiler.visitor import ASTVisitor
 
 import pyjs
+import sourcemap
+import astcache
+import typeinfer
+import signatures
+import constfold
 
 if pyjs.pyjspth is None:
     LIBRARY_PATH = os.path.abspath(os.path.dirname(__file__))
@@ -556,6 +562,16 @@ def escapejs(value):
         value = value.replace(bad, good)
     return value
 
+def number_literal(value):
+    """Parenthesizes negative number literals (from constant folding)."""
+    if value.startswith('-'):
+        return '(%s)' % value
+    return value
+
+def constant_name(value):
+    """Returns the suffix of the variable of an int or long constant."""
+    return str(value).replace('-', 'm')
+
 
 class YieldVisitor(ASTVisitor):
     has_yield = False
@@ -599,6 +615,11 @@ class TranslationError(Exception):
     def __str__(self):
         return self.message
 
+    def __reduce__(self):
+        # translation errors are passed back from the linker's worker
+        # processes
+        return (TranslationError, (self.msg, self.node, self.module_name))
+
 def strip_py(name):
     return name
 
@@ -669,6 +690,7 @@ class Translator:
                  inline_code=True,
                  operator_funcs=True,
                  number_classes=True,
+                 source_map=False,
                 ):
 
         monkey_patch_broken_transformer(compiler)
@@ -707,6 +729,7 @@ class Translator:
         self.number_classes = number_classes
         if self.number_classes:
             self.operator_funcs = True
+        self.source_map = source_map
 
         self.imported_modules = []
         self.imported_js = []
@@ -716,6 +739,10 @@ class Translator:
         self.stacksize_depth = 0
         self.option_stack = []
         self.lookup_stack = [{}]
+        # lookup depth of a function -> types of its local variables
+        self.local_types = {}
+        # lookup depth of a function -> the names it binds
+        self.local_names = {}
         self.indent_level = 0
         self.__unique_ids__ = {}
         self.try_depth = -1
@@ -772,6 +799,10 @@ class Translator:
         save_output = self.output
         self.output = StringIO()
 
+        # functions and classes whose keyword arguments can be
+        # resolved at compile time
+        self.signatures = signatures.module_signatures(self.ast, mod)
+
         mod.lineno = 1
         self.track_lineno(mod, True)
         for child in mod.node:
@@ -843,6 +874,8 @@ class Translator:
 
         print >> self.output, self.spacing() + "return this;"
         print >> self.output, self.dedent() + "}; /* end %s */"  % module_name
+        if self.source_map:
+            self.output.write(sourcemap.marker(module_name, 0))
         print >> self.output, "\n"
         print >> self.output, self.spacing() + "/* end module: %s */" % module_name
         print >> self.output, "\n"
@@ -1053,12 +1086,71 @@ class Translator:
     def constant_decl(self):
         s = self.spacing()
         lines = []
-        for name in self.constant_int:
-            lines.append("%(s)svar $constant_int_%(name)s = pyjslib['int'](%(name)s);" % locals())
-        for name in self.constant_long:
-            lines.append("%(s)svar $constant_long_%(name)s = pyjslib['long'](%(name)s);" % locals())
+        for value in self.constant_int:
+            name = constant_name(value)
+            lines.append("%(s)svar $constant_int_%(name)s = pyjslib['int'](%(value)s);" % locals())
+        for value in self.constant_long:
+            name = constant_name(value)
+            lines.append("%(s)svar $constant_long_%(name)s = pyjslib['long'](%(value)s);" % locals())
         return "\n".join(lines)
 
+    def push_local_types(self, node):
+        self.local_types[len(self.lookup_stack) - 1] = \
+            typeinfer.function_types(node, self.ast, self.is_builtin,
+                                     self.number_classes)
+        self.local_names[len(self.lookup_stack) - 1] = \
+            signatures.local_names(self.ast, node)
+
+    def pop_local_types(self):
+        self.local_types.pop(len(self.lookup_stack) - 1, None)
+        self.local_names.pop(len(self.lookup_stack) - 1, None)
+
+    def bound_in_function(self, name):
+        """returns True if one of the functions being translated binds
+        name, possibly after the current statement"""
+        for names in self.local_names.itervalues():
+            if names is None or name in names:
+                return True
+        return False
+
+    def is_builtin(self, name):
+        return self.lookup(name)[0] == 'builtin'
+
+    def local_type(self, name):
+        name_type, pyname, jsname, depth, is_local = self.lookup(name)
+        if name_type != 'variable':
+            return None
+        return self.local_types.get(depth, {}).get(name)
+
+    def numbers(self, *nodes):
+        """returns True if the expressions are plain javascript numbers"""
+        inference = typeinfer.TypeInference(self.ast, self.is_builtin,
+                                            self.number_classes)
+        for node in nodes:
+            t = inference.expr_type(node, self.local_type)
+            if not t in typeinfer.NUMBERS:
+                return False
+            if self.number_classes and t != 'float':
+                return False
+        return True
+
+    def number_compare(self, node):
+        """returns True if node compares plain javascript numbers"""
+        if not isinstance(node, self.ast.Compare):
+            return False
+        lhs_node = node.expr
+        for op, rhs_node in node.ops:
+            if not op in ("==", "!=", "<", "<=", ">", ">=") \
+               or not self.numbers(lhs_node, rhs_node):
+                return False
+            lhs_node = rhs_node
+        return True
+
+    def nonzero_number(self, node):
+        return isinstance(node, self.ast.Const) \
+           and isinstance(node.value, (int, long, float)) \
+           and node.value != 0
+
     def local_js_vars_decl(self, ignore_py_vars):
         names = []
         for name in self.lookup_stack[-1].keys():
@@ -1105,7 +1197,10 @@ class Translator:
          true ) )"""
     __inline_bool_code_str = __inline_bool_code_str.replace("    ", "\t").replace("\n", "\n%(s)s")
 
-    def inline_bool_code(self, e):
+    def inline_bool_code(self, e, node=None):
+        if node is not None and self.number_compare(node):
+            # already a javascript boolean
+            return e
         if self.inline_bool:
             v = self.uniqid('$bool')
             self.add_lookup('variable', v, v)
@@ -1157,11 +1252,15 @@ class Translator:
         if self.source_tracking and node.lineno:
             if module:
                 print >> self.output, self.spacing() + "$pyjs.track.module='%s';" % self.module_name
-            if self.line_tracking:
+            # the source maps replace the line tracking code, even if a
+            # module turns it on with setCompilerOptions
+            if self.line_tracking and not self.source_map:
                 print >> self.output, self.spacing() + "$pyjs.track.lineno=%d;" % node.lineno
                 #print >> self.output, self.spacing() + "if ($pyjs.track.module!='%s') debugger;" % self.module_name
-            if self.store_source:
+            if self.store_source and not self.source_map:
                 self.track_lines[node.lineno] = self.get_line_trace(node)
+        if self.source_map and node.lineno:
+            self.output.write(sourcemap.marker(self.module_name, node.lineno))
 
     def track_call(self, call_code, lineno=None):
         if not self.ignore_debug and self.debug and len(call_code.strip()) > 0:
@@ -1232,6 +1331,24 @@ try{var %(dbg)s_res=%(call_code)s;}catch(%(dbg)s_err){
 %(s)s\t$is_executing=false;
 %(s)s\treturn $res;
 %(s)s};
+%(s)s$generator['$next'] = function () {
+%(src1)s
+%(s)s\t$yield_value = $exc = null;
+%(s)s\ttry {
+%(s)s\t\tvar $res = $generator['__next']();
+%(s)s\t} catch (e) {
+%(src2)s
+%(s)s\t\t$is_executing=false;
+%(s)s\t\t$generator_state[0] = -1;
+%(s)s\t\tthrow e;
+%(s)s\t}
+%(s)s\t$is_executing=false;
+%(s)s\tif (typeof $res == 'undefined') {
+%(s)s\t\t$generator_state[0] = -1;
+%(s)s\t\treturn pyjslib.$iter_stop;
+%(s)s\t}
+%(s)s\treturn $res;
+%(s)s};
 %(s)s$generator['__iter__'] = function () {return $generator;};
 %(s)s$generator['send'] = function ($val) {
 %(src1)s
@@ -1255,6 +1372,7 @@ try{var %(dbg)s_res=%(call_code)s;}catch(%(dbg)s_err){
 %(s)s\t$exc=(typeof $exc_value == 'undefined'?$exc_type():$exc_type($exc_value));
 %(s)s\ttry {
 %(s)s\t\tvar $res = $generator['__next']();
+%(s)s\t\tif (typeof $res == 'undefined') throw pyjslib.StopIteration;
 %(s)s\t} catch (e) {
 %(src2)s
 %(s)s\t\t$generator_state[0] = -1;
@@ -1272,6 +1390,8 @@ try{var %(dbg)s_res=%(call_code)s;}catch(%(dbg)s_err){
 %(s)s\t\tvar $res = $generator['__next']();
 %(s)s\t\t$is_executing=false;
 %(s)s\t\tif (typeof $res != 'undefined') throw pyjslib.RuntimeError('generator ignored GeneratorExit');
+%(s)s\t\t$generator_state[0] = -1;
+%(s)s\t\treturn null;
 %(s)s\t} catch (e) {
 %(src2)s
 %(s)s\t\t$generator_state[0] = -1;
@@ -1288,7 +1408,11 @@ try{var %(dbg)s_res=%(call_code)s;}catch(%(dbg)s_err){
 """ % locals()
             self.indent()
             print >>self.output, code
-            print >>self.output, self.spacing(), "throw pyjslib.StopIteration;"
+            # the end of the generator: next() and send() raise
+            # StopIteration, $next() returns pyjslib.$iter_stop
+            if self.source_tracking:
+                print >>self.output, self.spacing() + "$pyjs.trackstack.pop();$pyjs.track=$pyjs.trackstack.pop();$pyjs.trackstack.push($pyjs.track);"
+            print >>self.output, self.spacing(), "return;"
             print >>self.output, self.dedent(), "}"
             print >>self.output, self.spacing(), "return $generator;"
         else:
@@ -1859,6 +1983,7 @@ var %s = arguments.length >= %d ? arguments[arguments.length-1] : arguments[argu
                 "Decorators staticmethod and classmethod not implemented for functions",
                 v.node, self.module_name)
         self.push_lookup()
+        self.push_local_types(node)
 
         arg_names = []
         for arg in node.argnames:
@@ -1949,6 +2074,7 @@ var %s = arguments.length >= %d ? arguments[arguments.length-1] : arguments[argu
         print >>self.output, self.dedent() + "};"
         print >>self.output, self.spacing() + "%s.__name__ = '%s';\n" % (function_name, node.name)
 
+        self.pop_local_types()
         self.pop_lookup()
         self.func_args(node, current_klass, function_name, 'static', declared_arg_names, varargname, kwargname)
 
@@ -2030,8 +2156,13 @@ var %s = arguments.length >= %d ? arguments[arguments.length-1] : arguments[argu
 
         self.ignore_debug = False
         method_name = None
+        signature = None
         if isinstance(v.node, self.ast.Name):
             name_type, pyname, jsname, depth, is_local = self.lookup(v.node.name)
+            if (name_type is None or (depth == 0 and
+                                      name_type in ('function', 'class'))) \
+               and not self.bound_in_function(v.node.name):
+                signature = self.signatures.get(v.node.name)
             if name_type == '__pyjamas__':
                 try:
                     raw_js = getattr(__pyjamas__, v.node.name)
@@ -2106,14 +2237,24 @@ var %s = arguments.length >= %d ? arguments[arguments.length-1] : arguments[argu
         if v.dstar_args:
             dstar_arg_name = self.expr(v.dstar_args, current_klass)
 
+        keywords = []
         for ch4 in v.args:
             if isinstance(ch4, self.ast.Keyword):
-                kwarg = ch4.name + ":" + self.expr(ch4.expr, current_klass)
+                expr = self.expr(ch4.expr, current_klass)
+                kwarg = ch4.name + ":" + expr
                 kwargs.append(kwarg)
+                keywords.append((ch4.name, expr, ch4.expr))
             else:
                 arg = self.expr(ch4, current_klass)
                 call_args.append(arg)
 
+        if kwargs and signature is not None \
+           and not star_arg_name and not dstar_arg_name:
+            resolved_args = self.resolve_call(signature, call_args, keywords)
+            if resolved_args is not None:
+                kwargs = []
+                call_args = resolved_args
+
         if kwargs:
             fn_args = ", ".join(['{' + ', '.join(kwargs) + '}']+call_args)
         else:
@@ -2142,6 +2283,31 @@ var %s = arguments.length >= %d ? arguments[arguments.length-1] : arguments[argu
             call_code = call_name + "(" + ", ".join(call_args) + ")"
         return call_code
 
+    def resolve_call(self, signature, call_args, keywords):
+        """returns the positional arguments of a call with keyword
+        arguments of a function with a known signature, or None"""
+        args = signature.resolve(len(call_args), [k[0] for k in keywords])
+        if args is None:
+            return None
+        exprs = {}
+        for name, expr, node in keywords:
+            exprs[name] = expr
+        order = [k[0] for k in keywords]
+        if [a for a in args if a in order] != order:
+            # the keyword arguments are evaluated in another order
+            for name, expr, node in keywords:
+                if not isinstance(node, (self.ast.Const, self.ast.Name)):
+                    return None
+        resolved_args = []
+        for a in args:
+            if a is None:
+                resolved_args.append('undefined')
+            elif isinstance(a, str):
+                resolved_args.append(exprs[a])
+            else:
+                resolved_args.append(call_args[a])
+        return resolved_args
+
     def _callfunc(self, v, current_klass):
         call_code = self._callfunc_code(v, current_klass)
         if not self.ignore_debug:
@@ -2508,6 +2674,7 @@ var %(e)s_name = (typeof %(e)s.__name__ == 'undefined' ? %(e)s.name : %(e)s.__na
 
         self.pop_lookup()
         self.push_lookup()
+        self.push_local_types(node)
         arg_names = []
         for arg in node.argnames:
             if isinstance(arg, tuple):
@@ -2608,6 +2775,7 @@ var %(e)s_name = (typeof %(e)s.__name__ == 'undefined' ? %(e)s.name : %(e)s.__na
         elif classmethod:
             bind_type = 'class'
 
+        self.pop_local_types()
         self.pop_lookup()
         self.func_args(node, current_klass, None, bind_type, declared_arg_names, varargname, kwargname)
 
@@ -2999,12 +3167,12 @@ var %(e)s_name = (typeof %(e)s.__name__ == 'undefined' ? %(e)s.name : %(e)s.__na
             expr = self.expr(test, current_klass)
 
             if not self.is_generator:
-                print >>self.output, self.indent() +keyword + " (" + self.track_call(self.inline_bool_code(expr), test.lineno)+") {"
+                print >>self.output, self.indent() +keyword + " (" + self.track_call(self.inline_bool_code(expr, test), test.lineno)+") {"
             else:
                 self.generator_states[-1] += 1
                 print >>self.output, self.indent() +keyword + "(($generator_state[%d]==%d)||($generator_state[%d]<%d&&(" % (\
                     len(self.generator_states)-1, self.generator_states[-1], len(self.generator_states)-1, self.generator_states[-1],) + \
-                    self.track_call(self.inline_bool_code(expr), test.lineno)+"))) {"
+                    self.track_call(self.inline_bool_code(expr, test), test.lineno)+"))) {"
                 print >>self.output, self.spacing() + "$generator_state[%d]=%d;" % (len(self.generator_states)-1, self.generator_states[-1])
 
         else:
@@ -3040,12 +3208,15 @@ var %(e)s_name = (typeof %(e)s.__name__ == 'undefined' ? %(e)s.name : %(e)s.__na
 
         if len(node.ops) != 1:
             cmp = []
+            lhs_node = node.expr
             for op, rhs_node in node.ops:
                 rhsname = self.uniqid("$compare")
                 rhs = self.expr(rhs_node, current_klass)
                 rhs = "(%s = %s)" % (rhsname, rhs)
-                cmp.append(self.compare_code(op, lhs, rhs))
+                numbers = self.numbers(lhs_node, rhs_node)
+                cmp.append(self.compare_code(op, lhs, rhs, numbers))
                 lhs = rhsname
+                lhs_node = rhs_node
             return "(%s)" % "&&".join(cmp)
             raise TranslationError(
                 "only one ops supported (in _compare)", node,  self.module_name)
@@ -3053,9 +3224,12 @@ var %(e)s_name = (typeof %(e)s.__name__ == 'undefined' ? %(e)s.name : %(e)s.__na
         op = node.ops[0][0]
         rhs_node = node.ops[0][1]
         rhs = self.expr(rhs_node, current_klass)
-        return self.compare_code(op, lhs, rhs)
+        return self.compare_code(op, lhs, rhs,
+                                 self.numbers(node.expr, rhs_node))
 
-    def compare_code(self, op, lhs, rhs):
+    def compare_code(self, op, lhs, rhs, numbers=False):
+        if numbers and op in ("==", "!=", "<", "<=", ">", ">="):
+            return "(%s %s %s)" % (lhs, op, rhs)
         if op == "==":
             return self.inline_eq_code(lhs, rhs)
         if op == "!=":
@@ -3086,7 +3260,7 @@ var %(e)s_name = (typeof %(e)s.__name__ == 'undefined' ? %(e)s.name : %(e)s.__na
 
     def _not(self, node, current_klass):
         expr = self.expr(node.expr, current_klass)
-        return "!" + self.inline_bool_code(expr)
+        return "!" + self.inline_bool_code(expr, node.expr)
 
     def _or(self, node, current_klass):
         s = self.spacing()
@@ -3143,6 +3317,15 @@ var %(e)s_name = (typeof %(e)s.__name__ == 'undefined' ? %(e)s.name : %(e)s.__na
             raise TranslationError(
                 "unsupported type (in _for)", node.assign, self.module_name)
 
+        if isinstance(node.assign, self.ast.AssName) \
+           and not self.is_generator:
+            range_call = self._range_call(node.list)
+            if range_call is not None:
+                assign_name = self.add_lookup('variable', assign_name, assign_name)
+                self._for_range(node, current_klass, assign_name, range_call)
+                self.is_generator = save_is_generator
+                return
+
         if isinstance(node.list, self.ast.Name):
             list_expr = self._name(node.list, current_klass)
         elif isinstance(node.list, self.ast.Getattr):
@@ -3177,12 +3360,18 @@ var %(e)s_name = (typeof %(e)s.__name__ == 'undefined' ? %(e)s.name : %(e)s.__na
             var_trackstack_size = "$pyjs__trackstack_size_%d" % self.stacksize_depth
             self.add_lookup('variable', var_trackstack_size, var_trackstack_size)
             print >>self.output, self.spacing() + "%s=$pyjs.trackstack.length;" % var_trackstack_size
+        # the loop fetches the items with $next(), which returns
+        # pyjslib.$iter_stop at the end instead of throwing StopIteration
+        if assign_tuple:
+            item_name = lhs
+        else:
+            item_name = iterator_name + '_item'
+            self.add_lookup('variable', item_name, item_name)
         s = self.spacing()
         print >>self.output, """\
-%(s)s%(iterator_name)s = """ % locals() + self.track_call("%(list_expr)s.__iter__()" % locals(), node.lineno) + ';'
+%(s)s%(iterator_name)s = pyjslib.$iter_wrap(""" % locals() + self.track_call("%(list_expr)s.__iter__()" % locals(), node.lineno) + ');'
         self.generator_switch_case(increment=True)
 
-        print >>self.output, self.indent() + """try {"""
         if self.is_generator:
             print >>self.output, self.indent() + "for (;true;$generator_state[%d] = 0) {" % (len(self.generator_states), )
         else:
@@ -3191,8 +3380,11 @@ var %(e)s_name = (typeof %(e)s.__name__ == 'undefined' ? %(e)s.name : %(e)s.__na
         self.generator_switch_open()
         self.generator_switch_case(increment=False)
 
-        print >>self.output, self.spacing() + """%(lhs)s %(op)s""" % locals(),
-        print >>self.output, self.track_call("%(iterator_name)s.next()"% locals(), node.lineno) + ";"
+        print >>self.output, self.spacing() + "if ((%s = %s) === pyjslib.$iter_stop) break;" % (
+            item_name,
+            self.track_call("%(iterator_name)s.$next()" % locals(), node.lineno))
+        if item_name != lhs:
+            print >>self.output, self.spacing() + """%(lhs)s %(op)s %(item_name)s;""" % locals()
         print >>self.output, self.spacing() + """%(assign_tuple)s""" % locals()
         for node in node.body.nodes:
             self._stmt(node, current_klass)
@@ -3201,12 +3393,6 @@ var %(e)s_name = (typeof %(e)s.__name__ == 'undefined' ? %(e)s.name : %(e)s.__na
         self.generator_switch_close()
         self.generator_del_state()
 
-        print >>self.output, self.dedent() + "}"
-        print >>self.output, self.dedent() + "} catch (e) {"
-        self.indent()
-        print >>self.output, self.indent() + "if (e.__name__ != 'StopIteration') {"
-        print >>self.output, self.spacing() + "throw e;"
-        print >>self.output, self.dedent() + "}"
         print >>self.output, self.dedent() + "}"
         if self.source_tracking:
             print >>self.output, """\
@@ -3219,6 +3405,113 @@ var %(e)s_name = (typeof %(e)s.__name__ == 'undefined' ? %(e)s.name : %(e)s.__na
         self.generator_switch_case(increment=True)
         self.is_generator = save_is_generator
 
+    def _range_call(self, node):
+        """returns (range function, its arguments) if node calls the
+        builtin range or xrange, which a for loop can count itself"""
+        if self.number_classes:
+            return None
+        if not isinstance(node, self.ast.CallFunc) \
+           or not isinstance(node.node, self.ast.Name) \
+           or node.node.name not in ('range', 'xrange') \
+           or node.star_args is not None or node.dstar_args is not None \
+           or not 1 <= len(node.args) <= 3:
+            return None
+        for arg in node.args:
+            if isinstance(arg, self.ast.Keyword):
+                return None
+        name_type, pyname, jsname, depth, is_local = self.lookup(node.node.name)
+        if name_type != 'builtin':
+            return None
+        return jsname, node.args
+
+    def _int_const(self, node):
+        """returns the value of an integer constant, or None"""
+        if isinstance(node, self.ast.UnarySub):
+            value = self._int_const(node.expr)
+            if value is not None:
+                return -value
+        elif isinstance(node, self.ast.Const) \
+             and isinstance(node.value, (int, long)):
+            return node.value
+        return None
+
+    def _for_range(self, node, current_klass, lhs, range_call):
+        """for loop over range() or xrange(), as a counted javascript
+        loop. the arguments are evaluated once, in their order"""
+        range_func, args = range_call
+        n_args = len(args)
+        counter = self.uniqid('$range')
+        self.add_lookup('variable', counter, counter)
+        s = self.spacing()
+
+        if len(args) == 1:
+            args = [self.ast.Const(0)] + list(args)
+        # the names of the arguments which are not constant
+        checked = []
+        bounds = []
+        for arg, name in zip(args, (counter, counter + '_end',
+                                    counter + '_step')):
+            value = self._int_const(arg)
+            if value is None:
+                if name != counter:
+                    self.add_lookup('variable', name, name)
+                print >>self.output, "%s%s = %s;" % (
+                    s, name, self.expr(arg, current_klass))
+                checked.append(name)
+                bounds.append(name)
+            else:
+                if name == counter:
+                    print >>self.output, "%s%s = %s;" % (s, name, value)
+                    bounds.append(name)
+                else:
+                    bounds.append(str(value))
+        if len(bounds) == 2:
+            bounds.append('1')
+        end, step = bounds[1:]
+        if checked:
+            # the builtin raises the TypeError
+            if n_args == 1:
+                call_args = [end]
+            else:
+                call_args = bounds[:n_args]
+            print >>self.output, "%sif (%s) %s(%s);" % (
+                s, ' || '.join(["typeof %s != 'number'" % name
+                                for name in checked]),
+                range_func, ', '.join(call_args))
+
+        step_value = 1
+        if len(args) == 3:
+            step_value = self._int_const(args[2])
+        if step_value is None:
+            print >>self.output, "%sif (%s == 0) throw pyjslib['ValueError']('%s() step argument must not be zero');" % (
+                s, step, node.list.node.name)
+            condition = "(%s > 0 ? %s < %s : %s > %s)" % (
+                step, counter, end, counter, end)
+            increment = "%s += %s" % (counter, step)
+        elif step_value == 0:
+            print >>self.output, "%sthrow pyjslib['ValueError']('%s() step argument must not be zero');" % (
+                s, node.list.node.name)
+            condition = "false"
+            increment = ""
+        elif step_value == 1:
+            condition = "%s < %s" % (counter, end)
+            increment = counter + "++"
+        elif step_value > 0:
+            condition = "%s < %s" % (counter, end)
+            increment = "%s += %s" % (counter, step_value)
+        else:
+            condition = "%s > %s" % (counter, end)
+            increment = "%s -= %s" % (counter, -step_value)
+
+        print >>self.output, "%sfor (; %s; %s) {" % (s, condition, increment)
+        self.indent()
+        # the body may assign to the loop variable, the next iteration
+        # does not depend on it
+        print >>self.output, "%s%s = %s;" % (self.spacing(), lhs, counter)
+        for child in node.body.nodes:
+            self._stmt(child, current_klass)
+        print >>self.output, self.dedent() + "}"
+
     def _while(self, node, current_klass):
         save_is_generator = self.is_generator
         if self.is_generator:
@@ -3230,13 +3523,13 @@ var %(e)s_name = (typeof %(e)s.__name__ == 'undefined' ? %(e)s.name : %(e)s.__na
             self.generator_switch_case(increment=True)
             print >>self.output, self.indent() + "for (;($generator_state[%d] > 0)||(" % (\
                 (len(self.generator_states),)) + \
-                self.track_call(self.inline_bool_code(test), node.lineno) + ");$generator_state[%d] = 0) {" % (len(self.generator_states), )
+                self.track_call(self.inline_bool_code(test, node.test), node.lineno) + ");$generator_state[%d] = 0) {" % (len(self.generator_states), )
 
             self.generator_add_state()
             self.generator_switch_open()
             self.generator_switch_case(increment=False)
         else:
-            print >>self.output, self.indent() + "while (" + self.track_call(self.inline_bool_code(test), node.lineno) + ") {"
+            print >>self.output, self.indent() + "while (" + self.track_call(self.inline_bool_code(test, node.test), node.lineno) + ") {"
 
         if isinstance(node.body, self.ast.Stmt):
             for child in node.body.nodes:
@@ -3258,19 +3551,19 @@ var %(e)s_name = (typeof %(e)s.__name__ == 'undefined' ? %(e)s.name : %(e)s.__na
     def _const(self, node):
         if isinstance(node.value, int):
             if not self.number_classes:
-                return str(node.value)
+                return number_literal(str(node.value))
             self.constant_int[node.value] = 1
-            return "$constant_int_%s" % str(node.value)
+            return "$constant_int_%s" % constant_name(node.value)
         elif isinstance(node.value, long):
             v = str(node.value)
             if v[-1] == 'L':
                 v = v[:-1]
             if not self.number_classes:
-                return v
+                return number_literal(v)
             self.constant_long[node.value] = 1
-            return "$constant_long_%s" % v
+            return "$constant_long_%s" % constant_name(v)
         elif isinstance(node.value, float):
-            return str(node.value)
+            return number_literal(repr(node.value))
         elif isinstance(node.value, basestring):
             v = node.value
             if isinstance(node.value, unicode):
@@ -3283,7 +3576,7 @@ var %(e)s_name = (typeof %(e)s.__name__ == 'undefined' ? %(e)s.name : %(e)s.__na
                 "unsupported type (in _const)", node, self.module_name)
 
     def _unaryadd(self, node, current_klass):
-        if not self.operator_funcs:
+        if not self.operator_funcs or self.numbers(node.expr):
             return "(%s)" % self.expr(node.expr, current_klass)
         e = self.expr(node.expr, current_klass)
         v = self.uniqid('$uadd')
@@ -3293,7 +3586,7 @@ var %(e)s_name = (typeof %(e)s.__name__ == 'undefined' ? %(e)s.name : %(e)s.__na
 %(s)s\tpyjslib['op_uadd'](%(v)s))""" % locals()
 
     def _unarysub(self, node, current_klass):
-        if not self.operator_funcs:
+        if not self.operator_funcs or self.numbers(node.expr):
             return "-(%s)" % self.expr(node.expr, current_klass)
         e = self.expr(node.expr, current_klass)
         v = self.uniqid('$usub')
@@ -3303,7 +3596,7 @@ var %(e)s_name = (typeof %(e)s.__name__ == 'undefined' ? %(e)s.name : %(e)s.__na
 %(s)s\tpyjslib['op_usub'](%(v)s))""" % locals()
 
     def _add(self, node, current_klass):
-        if not self.operator_funcs:
+        if not self.operator_funcs or self.numbers(node.left, node.right):
             return "(%s)+(%s)" % (self.expr(node.left, current_klass), self.expr(node.right, current_klass))
         e1 = self.expr(node.left, current_klass)
         e2 = self.expr(node.right, current_klass)
@@ -3317,7 +3610,7 @@ var %(e)s_name = (typeof %(e)s.__name__ == 'undefined' ? %(e)s.name : %(e)s.__na
 %(s)s\tpyjslib['op_add'](%(v1)s,%(v2)s))""" % locals()
 
     def _sub(self, node, current_klass):
-        if not self.operator_funcs:
+        if not self.operator_funcs or self.numbers(node.left, node.right):
             return "(%s)-(%s)" % (self.expr(node.left, current_klass), self.expr(node.right, current_klass))
         e1 = self.expr(node.left, current_klass)
         e2 = self.expr(node.right, current_klass)
@@ -3331,7 +3624,8 @@ var %(e)s_name = (typeof %(e)s.__name__ == 'undefined' ? %(e)s.name : %(e)s.__na
 %(s)s\tpyjslib['op_sub'](%(v1)s,%(v2)s))""" % locals()
 
     def _floordiv(self, node, current_klass):
-        if not self.operator_funcs:
+        if not self.operator_funcs or (self.numbers(node.left, node.right)
+                                       and self.nonzero_number(node.right)):
             return "Math.floor(%s/%s)" % (self.expr(node.left, current_klass), self.expr(node.right, current_klass))
         e1 = self.expr(node.left, current_klass)
         e2 = self.expr(node.right, current_klass)
@@ -3345,7 +3639,8 @@ var %(e)s_name = (typeof %(e)s.__name__ == 'undefined' ? %(e)s.name : %(e)s.__na
 %(s)s\tpyjslib['op_floordiv'](%(v1)s,%(v2)s))""" % locals()
 
     def _div(self, node, current_klass):
-        if not self.operator_funcs:
+        if not self.operator_funcs or (self.numbers(node.left, node.right)
+                                       and self.nonzero_number(node.right)):
             return "(%s)/(%s)" % (self.expr(node.left, current_klass), self.expr(node.right, current_klass))
         e1 = self.expr(node.left, current_klass)
         e2 = self.expr(node.right, current_klass)
@@ -3359,7 +3654,7 @@ var %(e)s_name = (typeof %(e)s.__name__ == 'undefined' ? %(e)s.name : %(e)s.__na
 %(s)s\tpyjslib['op_div'](%(v1)s,%(v2)s))""" % locals()
 
     def _mul(self, node, current_klass):
-        if not self.operator_funcs:
+        if not self.operator_funcs or self.numbers(node.left, node.right):
             return "(%s)*(%s)" % (self.expr(node.left, current_klass), self.expr(node.right, current_klass))
         e1 = self.expr(node.left, current_klass)
         e2 = self.expr(node.right, current_klass)
@@ -3375,6 +3670,9 @@ var %(e)s_name = (typeof %(e)s.__name__ == 'undefined' ? %(e)s.name : %(e)s.__na
     def _mod(self, node, current_klass):
         if isinstance(node.left, self.ast.Const) and isinstance(node.left.value, StringType):
             return self.track_call("pyjslib['sprintf']("+self.expr(node.left, current_klass) + ", " + self.expr(node.right, current_klass)+")", node.lineno)
+        if self.numbers(node.left, node.right) \
+           and self.nonzero_number(node.right):
+            return "(%s)%%(%s)" % (self.expr(node.left, current_klass), self.expr(node.right, current_klass))
         e1 = self.expr(node.left, current_klass)
         e2 = self.expr(node.right, current_klass)
         v1 = self.uniqid('$mod')
@@ -3391,7 +3689,7 @@ var %(e)s_name = (typeof %(e)s.__name__ == 'undefined' ? %(e)s.name : %(e)s.__na
 %(s)s\tpyjslib['op_mod'](%(v1)s,%(v2)s))""" % locals()
 
     def _power(self, node, current_klass):
-        if not self.operator_funcs:
+        if not self.operator_funcs or self.numbers(node.left, node.right):
             return "Math.pow(%s,%s)" % (self.expr(node.left, current_klass), self.expr(node.right, current_klass))
         e1 = self.expr(node.left, current_klass)
         e2 = self.expr(node.right, current_klass)
@@ -3620,7 +3918,7 @@ var %(e)s_name = (typeof %(e)s.__name__ == 'undefined' ? %(e)s.name : %(e)s.__na
         test = self.expr(node.test, current_klass)
         then = self.expr(node.then, current_klass)
         else_ = self.expr(node.else_, current_klass)
-        return "(" + self.inline_bool_code(test) + "? (%(then)s) : (%(else_)s))" % locals()
+        return "(" + self.inline_bool_code(test, node.test) + "? (%(then)s) : (%(else_)s))" % locals()
 
     def _backquote(self, node, current_klass):
         return "pyjslib.repr(%s)" % self.expr(node.expr, current_klass)
@@ -3768,7 +4066,23 @@ def translate(compiler, sources, output_file, module_name=None,
               inline_code=False,
               operator_funcs=True,
               number_classes=True,
+              source_map=False,
+              optimize=0,
+              prune=None,
+              timings=None,
+              ast_cache=None,
              ):
+    """translates the sources of a module to output_file. if timings
+    is a dict, the time spent in each phase (parse, merge, optimize,
+    translate and write) is added to it. the sources are parsed with
+    ast_cache, if it is given. optimize is the level of constfold"""
+
+    if timings is None:
+        timings = {}
+    def timed(phase, start):
+        now = time.time()
+        timings[phase] = timings.get(phase, 0.0) + now - start
+        return now
 
     sources = map(os.path.abspath, sources)
     output_file = os.path.abspath(output_file)
@@ -3777,23 +4091,26 @@ def translate(compiler, sources, output_file, module_name=None,
 
     trees = []
     tree= None
+    start = time.time()
     for src in sources:
-        current_tree = compiler.parseFile(src)
-        flags = set()
-        f = file(src)
-        for l in f:
-            if l.startswith('#@PYJS_'):
-                flags.add(l.strip()[7:])
-        f.close()
+        current_tree = astcache.parse_file(compiler, src, ast_cache)
+        start = timed('parse', start)
+        flags = module_flags(src)
         if tree:
             tree = merge(compiler.ast, module_name, tree, current_tree, flags)
         else:
             tree = current_tree
+        start = timed('merge', start)
+    if prune:
+        pruneTree(compiler.ast, tree, prune)
+    if optimize:
+        constfold.optimize(compiler.ast, tree, optimize, operator_funcs)
+        start = timed('optimize', start)
     #XXX: if we have an override the sourcefile and the tree is not the same!
     f = file(sources[0], "r")
     src = f.read()
     f.close()
-    output = file(output_file, 'w')
+    output = StringIO()
 
     t = Translator(compiler,
                    module_name, sources[0], src, tree, output,
@@ -3809,10 +4126,25 @@ def translate(compiler, sources, output_file, module_name=None,
                    inline_code = inline_code,
                    operator_funcs = operator_funcs,
                    number_classes = number_classes,
+                   source_map = source_map,
                   )
-    output.close()
+    start = timed('translate', start)
+    f = file(output_file, 'w')
+    f.write(output.getvalue())
+    f.close()
+    timed('write', start)
     return t.imported_modules, t.imported_js
 
+def module_flags(src):
+    """returns the #@PYJS_ flags of a source file"""
+    flags = set()
+    f = file(src)
+    for l in f:
+        if l.startswith('#@PYJS_'):
+            flags.add(l.strip()[7:])
+    f.close()
+    return flags
+
 def merge(ast, module_name, tree1, tree2, flags):
     if 'FULL_OVERRIDE' in flags:
         return tree2
@@ -3826,6 +4158,29 @@ def merge(ast, module_name, tree1, tree2, flags):
                 "Do not know how to merge %s" % child, child, module_name)
     return tree1
 
+def pruneTree(ast, tree, names):
+    """removes module level functions and classes and class methods
+    (given as 'Class.method') from the tree"""
+    nodes = []
+    for child in tree.node.nodes:
+        if isinstance(child, (ast.Function, ast.Class)):
+            if child.name in names:
+                continue
+        if isinstance(child, ast.Class):
+            code = []
+            for node in child.code.nodes:
+                if (    isinstance(node, ast.Function)
+                    and '%s.%s' % (child.name, node.name) in names
+                   ):
+                    continue
+                code.append(node)
+            if not code:
+                code.append(ast.Pass(lineno=child.lineno))
+            child.code.nodes = code
+        nodes.append(child)
+    tree.node.nodes = nodes
+    return tree
+
 def replaceFunction(ast, module_name, tree, function_name, function_node):
     # find function to replace
     for child in tree.node:
@@ -3892,9 +4247,11 @@ def replaceClassMethods(ast, module_name, tree, class_name, class_node):
 
 class PlatformParser:
     def __init__(self, compiler,
-                       platform_dir = "", verbose=True, chain_plat=None):
+                       platform_dir = "", verbose=True, chain_plat=None,
+                       ast_cache=None):
         self.platform_dir = platform_dir
         self.parse_cache = {}
+        self.ast_cache = ast_cache
         self.platform = ""
         self.verbose = verbose
         self.chain_plat = chain_plat
@@ -3912,7 +4269,8 @@ class PlatformParser:
                 mod, override = self.chain_plat.parseModule(module_name,
                                                             file_name)
             else:
-                mod = self.compiler.parseFile(file_name)
+                mod = astcache.parse_file(self.compiler, file_name,
+                                          self.ast_cache)
             self.parse_cache[file_name] = mod
         else:
             mod = self.parse_cache[file_name]
@@ -3921,7 +4279,9 @@ class PlatformParser:
         platform_file_name = self.generatePlatformFilename(file_name)
         if self.platform and os.path.isfile(platform_file_name):
             mod = copy.deepcopy(mod)
-            mod_override = self.compiler.parseFile(platform_file_name)
+            mod_override = astcache.parse_file(self.compiler,
+                                               platform_file_name,
+                                               self.ast_cache)
             if self.verbose:
                 print "Merging", module_name, self.platform
             self.merge(smod, mod_override)
@@ -4321,6 +4681,23 @@ def add_compile_options(parser):
     speed_options['number_classes'] = False
     pythonic_options['number_classes'] = True
 
+    parser.add_option("--optimize",
+                      dest = "optimize",
+                      type = "int",
+                      metavar = "LEVEL",
+                      help = "Optimisation level: 1 folds constant expressions and removes branches on constant conditions, 2 also propagates module level constants",
+                     )
+
+    parser.add_option("--no-source-map",
+                      dest = "source_map",
+                      action="store_false",
+                      help = "Do not mark the python lines for source maps",
+                     )
+    parser.add_option("--source-map",
+                      dest = "source_map",
+                      action="store_true",
+                      help = "Write source maps which map the generated javascript to the python lines, instead of line tracking code (overrides --line-tracking and --store-source)",
+                     )
 
     def set_multiple(option, opt_str, value, parser, **kwargs):
         for k in kwargs.keys():
@@ -4356,6 +4733,8 @@ def add_compile_options(parser):
                         inline_code = False,
                         operator_funcs = True,
                         number_classes = False,
+                        source_map = False,
+                        optimize = 0,
                        )
 
 
@@ -4402,6 +4781,8 @@ def main():
               inline_code = options.inline_code,
               operator_funcs = options.operator_funcs,
               number_classes = options.number_classes,
+              source_map = options.source_map,
+              optimize = options.optimize,
     ),
 
 if __name__ == "__main__":
@@ -0,0 +1,226 @@
+"""Whole program dead code elimination.
+
+The module level functions, classes and methods of all modules of an
+application are collected, together with the names each of them
+references. Starting from the module level code of every module, the
+javascript libraries and the names the translator emits itself,
+definitions are marked as reachable until no new names are found.
+Everything else can be removed before translation.
+
+The analysis is name based and thus conservative: a definition is kept
+if its name is referenced anywhere in reachable code, as an attribute,
+as a name or as an identifier inside a string (which covers getattr,
+Factory.lookupClass and native javascript code). Methods can be
+listed at runtime, so once dir() is reachable no methods of reachable
+classes are removed (e.g. UnitTest finds its test methods that way).
+"""
+
+import os
+import re
+import tokenize
+
+IDENTIFIER = re.compile(r'[A-Za-z_$][A-Za-z0-9_$]*')
+
+# names of functions which enumerate the methods of an object
+REFLECTION = ('dir',)
+# added to the referenced names by a call to one of them
+REFLECTIVE = '<reflection>'
+
+
+def string_identifiers(text, names):
+    names.update(IDENTIFIER.findall(text))
+
+
+def node_references(ast, node, names):
+    """adds all names referenced in and below node to names"""
+    stack = [node]
+    while stack:
+        n = stack.pop()
+        if isinstance(n, ast.Name):
+            names.add(n.name)
+        elif isinstance(n, ast.CallFunc):
+            if (    isinstance(n.node, ast.Name)
+                and n.node.name in REFLECTION
+               ):
+                names.add(REFLECTIVE)
+        elif isinstance(n, (ast.Getattr, ast.AssAttr)):
+            names.add(n.attrname)
+        elif isinstance(n, ast.Const):
+            if isinstance(n.value, basestring):
+                string_identifiers(n.value, names)
+        elif isinstance(n, ast.From):
+            for name, asname in n.names:
+                names.add(name)
+        stack.extend(n.getChildNodes())
+    return names
+
+
+def is_special(name):
+    return name.startswith('__') and name.endswith('__')
+
+
+class ModuleDefinitions(object):
+    """the prunable definitions of a module and the names they use"""
+
+    def __init__(self, module_name):
+        self.module_name = module_name
+        # name -> referenced names, for functions and classes
+        self.defs = {}
+        # (class name, method name) -> referenced names
+        self.methods = {}
+        # names referenced by module level code
+        self.roots = set()
+        # modules imported with from ... import *
+        self.star_imports = set()
+        self.redefined = set()
+
+    def add_tree(self, ast, tree):
+        """adds the definitions of a module or override ast"""
+        for child in tree.node.nodes:
+            if isinstance(child, ast.Function):
+                refs = self.defs.setdefault(child.name, set())
+                node_references(ast, child, refs)
+            elif isinstance(child, ast.Class):
+                refs = self.defs.setdefault(child.name, set())
+                for n in child.bases:
+                    node_references(ast, n, refs)
+                if getattr(child, 'decorators', None):
+                    node_references(ast, child.decorators, refs)
+                for n in child.code.nodes:
+                    if isinstance(n, ast.Function):
+                        mrefs = self.methods.setdefault((child.name, n.name),
+                                                        set())
+                        node_references(ast, n, mrefs)
+                    else:
+                        node_references(ast, n, refs)
+            else:
+                if isinstance(child, ast.From):
+                    for name, asname in child.names:
+                        if name == '*':
+                            self.star_imports.add(child.modname)
+                node_references(ast, child, self.roots)
+                # module level code may rebind a definition
+                stack = [child]
+                while stack:
+                    n = stack.pop()
+                    if isinstance(n, ast.AssName):
+                        self.redefined.add(n.name)
+                    elif isinstance(n, (ast.Function, ast.Class)):
+                        self.redefined.add(n.name)
+                    stack.extend(n.getChildNodes())
+
+
+_translator_names = None
+def translator_names():
+    """returns the identifiers in the string literals of the translator,
+    i.e. the names used by generated code without appearing in the
+    python sources (e.g. next, op_add or StopIteration)"""
+    global _translator_names
+    if _translator_names is None:
+        import translator
+        names = set()
+        f = open(os.path.splitext(translator.__file__)[0] + '.py')
+        try:
+            for tok in tokenize.generate_tokens(f.readline):
+                if tok[0] == tokenize.STRING:
+                    string_identifiers(tok[1], names)
+        finally:
+            f.close()
+        _translator_names = names
+    return _translator_names
+
+
+def find_dead_code(modules, js_sources=[], keep=[]):
+    """returns the unreachable definitions as a dict of module name to
+    a set of 'name' and 'Class.method' entries.
+
+    modules is a list of ModuleDefinitions, js_sources a list of
+    javascript code which may reference python names and keep a list
+    of regular expressions matching qualified names which must not be
+    removed.
+    """
+    keep = [re.compile(k) for k in keep]
+    def kept(qualified_name):
+        for k in keep:
+            if k.match(qualified_name):
+                return True
+        return False
+
+    # names used by generated and native javascript code
+    external = set(translator_names())
+    for js in js_sources:
+        string_identifiers(js, external)
+    # names used by reachable python code
+    names = set()
+    star_imports = set()
+    for m in modules:
+        names.update(m.roots)
+        star_imports.update(m.star_imports)
+
+    live = {}
+    for m in modules:
+        alive = set()
+        live[m.module_name] = alive
+        star = False
+        for s in star_imports:
+            if m.module_name == s or m.module_name.endswith('.' + s):
+                star = True
+        for name in m.defs.keys():
+            if star or name in m.redefined:
+                alive.add(name)
+                names.update(m.defs[name])
+
+    changed = True
+    while changed:
+        changed = False
+        reflective = REFLECTIVE in names
+        for m in modules:
+            alive = live[m.module_name]
+            mn = m.module_name
+            for name, refs in m.defs.items():
+                if name in alive:
+                    continue
+                if (   name in names
+                    or name in external
+                    or kept('%s.%s' % (mn, name))
+                   ):
+                    alive.add(name)
+                    names.update(refs)
+                    changed = True
+            for (cname, name), refs in m.methods.items():
+                key = '%s.%s' % (cname, name)
+                if key in alive or not cname in alive:
+                    continue
+                if (   reflective
+                    or name in names
+                    or name in external
+                    or is_special(name)
+                    or kept('%s.%s' % (mn, key))
+                   ):
+                    alive.add(key)
+                    names.update(refs)
+                    changed = True
+
+    dead = {}
+    for m in modules:
+        alive = live[m.module_name]
+        removed = set()
+        for name in m.defs.keys():
+            if not name in alive:
+                removed.add(name)
+        for (cname, name) in m.methods.keys():
+            # methods of removed classes go with their class
+            if cname in alive and not '%s.%s' % (cname, name) in alive:
+                removed.add('%s.%s' % (cname, name))
+        if removed:
+            dead[m.module_name] = removed
+    return dead
+
+
+def report(dead):
+    """returns the removed definitions as sorted qualified names"""
+    lines = []
+    for module_name in sorted(dead.keys()):
+        for name in sorted(dead[module_name]):
+            lines.append('%s.%s' % (module_name, name))
+    return lines
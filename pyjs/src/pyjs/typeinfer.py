@@ -0,0 +1,279 @@
+"""Local type inference of numbers.
+
+The translator emits guarded code for arithmetic and comparisons, which
+checks the types of the operands at run time and calls the pyjslib
+operator functions for everything which is not a plain javascript
+number. Inside a function the type of many local variables is known at
+compile time: counters of for loops over range() and xrange(), and
+variables which are only assigned numeric literals, the results of
+int(), float() and len() and arithmetic on such values.
+
+function_types() infers the types of the local variables of a function
+body, expr_type() the type of an expression. The types are 'int',
+'float', 'number' (int or float) and None (unknown). The analysis does
+not look at the order of the statements: a variable has a type only if
+every assignment to it in the function has one.
+
+With number classes ints are objects, which overflow to longs, so only
+floats are plain javascript numbers. Ints are left unknown then and the
+operator functions keep doing the overflow checks.
+"""
+
+UNBOUND = 'unbound'
+UNKNOWN = None
+
+# the types which are plain javascript numbers
+NUMBERS = ('int', 'float', 'number')
+
+AUG_OPS = {
+    '+=': 'Add',
+    '-=': 'Sub',
+    '*=': 'Mul',
+    '/=': 'Div',
+    '//=': 'FloorDiv',
+    '%=': 'Mod',
+    '**=': 'Power',
+}
+
+
+def join(t1, t2):
+    """returns the type of a variable which holds values of the types
+    t1 and t2"""
+    if t1 == UNBOUND:
+        return t2
+    if t2 == UNBOUND or t1 == t2:
+        return t1
+    if t1 in NUMBERS and t2 in NUMBERS:
+        return 'number'
+    return UNKNOWN
+
+
+def arith_type(op, t1, t2):
+    """returns the type of the result of the arithmetic operation op
+    (the name of the ast node) on operands of the types t1 and t2"""
+    if t1 == UNBOUND or t2 == UNBOUND:
+        return UNBOUND
+    if not t1 in NUMBERS or not t2 in NUMBERS:
+        return UNKNOWN
+    if op == 'Power' and (t1 != 'float' and t2 != 'float'):
+        # a negative exponent gives a float
+        return 'number'
+    if t1 == t2:
+        return t1
+    if 'float' in (t1, t2):
+        return 'float'
+    return 'number'
+
+
+class TypeInference(object):
+
+    def __init__(self, ast, is_builtin, number_classes):
+        self.ast = ast
+        self.is_builtin = is_builtin
+        self.number_classes = number_classes
+
+    def const_type(self, value):
+        if isinstance(value, bool):
+            return UNKNOWN
+        if isinstance(value, float):
+            return 'float'
+        if isinstance(value, (int, long)) and not self.number_classes:
+            return 'int'
+        return UNKNOWN
+
+    def call_type(self, node):
+        ast = self.ast
+        if not isinstance(node.node, ast.Name):
+            return UNKNOWN
+        if node.star_args or node.dstar_args:
+            return UNKNOWN
+        for arg in node.args:
+            if isinstance(arg, ast.Keyword):
+                return UNKNOWN
+        name = node.node.name
+        if not self.is_builtin(name):
+            return UNKNOWN
+        if name == 'float' and len(node.args) <= 1:
+            return 'float'
+        if self.number_classes:
+            return UNKNOWN
+        if name == 'int' and 1 <= len(node.args) <= 2:
+            return 'int'
+        if name == 'len' and len(node.args) == 1:
+            return 'int'
+        return UNKNOWN
+
+    def expr_type(self, node, name_type):
+        """returns the type of the expression node. name_type(name)
+        returns the type of a variable"""
+        ast = self.ast
+        if isinstance(node, ast.Const):
+            return self.const_type(node.value)
+        if isinstance(node, ast.Name):
+            return name_type(node.name)
+        if isinstance(node, (ast.Add, ast.Sub, ast.Mul, ast.Div,
+                             ast.FloorDiv, ast.Mod, ast.Power)):
+            return arith_type(node.__class__.__name__,
+                              self.expr_type(node.left, name_type),
+                              self.expr_type(node.right, name_type))
+        if isinstance(node, (ast.UnarySub, ast.UnaryAdd)):
+            return self.expr_type(node.expr, name_type)
+        if isinstance(node, ast.CallFunc):
+            return self.call_type(node)
+        return UNKNOWN
+
+    def range_call(self, node):
+        """returns True if node is a call of the builtin range or
+        xrange, which gives ints"""
+        ast = self.ast
+        if self.number_classes or not isinstance(node, ast.CallFunc):
+            return False
+        if not isinstance(node.node, ast.Name) \
+           or not node.node.name in ('range', 'xrange') \
+           or not self.is_builtin(node.node.name):
+            return False
+        if node.star_args or node.dstar_args \
+           or not 1 <= len(node.args) <= 3:
+            return False
+        for arg in node.args:
+            if isinstance(arg, ast.Keyword):
+                return False
+        return True
+
+
+class Bindings(object):
+    """collects the assignments to the local variables of a function"""
+
+    def __init__(self, ast):
+        self.ast = ast
+        # name -> list of the expressions assigned to it
+        self.values = {}
+        self.unknown = set()
+        # the iterables of for loops over a variable
+        self.ranges = []
+        self.give_up = False
+
+    def bind(self, name, value):
+        self.values.setdefault(name, []).append(value)
+
+    def bind_unknown(self, name):
+        self.values.setdefault(name, [])
+        self.unknown.add(name)
+
+    def visit(self, node):
+        ast = self.ast
+        if isinstance(node, ast.Assign):
+            for target in node.nodes:
+                if isinstance(target, ast.AssName) \
+                   and target.flags == 'OP_ASSIGN':
+                    self.bind(target.name, node.expr)
+                else:
+                    self.visit(target)
+            self.visit(node.expr)
+        elif isinstance(node, ast.AugAssign):
+            if isinstance(node.node, ast.Name) and node.op in AUG_OPS:
+                op = getattr(ast, AUG_OPS[node.op])
+                self.bind(node.node.name, op((node.node, node.expr)))
+            elif isinstance(node.node, ast.Name):
+                self.bind_unknown(node.node.name)
+            else:
+                self.visit(node.node)
+            self.visit(node.expr)
+        elif isinstance(node, ast.For):
+            if isinstance(node.assign, ast.AssName):
+                self.bind(node.assign.name, node.list)
+                self.ranges.append(node.list)
+            else:
+                self.visit(node.assign)
+            for child in (node.list, node.body, node.else_):
+                if child is not None:
+                    self.visit(child)
+        elif isinstance(node, ast.AssName):
+            self.bind_unknown(node.name)
+        elif isinstance(node, (ast.Function, ast.Class)):
+            self.bind_unknown(node.name)
+            self.visit_outer(node)
+        elif isinstance(node, ast.Lambda):
+            self.visit_outer(node)
+        elif isinstance(node, ast.Import):
+            for name, asname in node.names:
+                self.bind_unknown(asname or name.split('.')[0])
+        elif isinstance(node, ast.From):
+            for name, asname in node.names:
+                if name == '*':
+                    self.give_up = True
+                self.bind_unknown(asname or name)
+        elif isinstance(node, ast.Global):
+            for name in node.names:
+                self.bind_unknown(name)
+        elif isinstance(node, ast.Exec):
+            self.give_up = True
+        else:
+            for child in node.getChildNodes():
+                self.visit(child)
+
+    def visit_outer(self, node):
+        """visits the parts of a function, lambda or class definition
+        which are evaluated in the enclosing scope"""
+        ast = self.ast
+        if isinstance(node, ast.Class):
+            children = list(node.bases)
+        else:
+            children = list(node.defaults)
+        if getattr(node, 'decorators', None) is not None:
+            children.append(node.decorators)
+        for child in children:
+            self.visit(child)
+
+
+def function_types(node, ast, is_builtin, number_classes):
+    """returns a dict with the types of the local variables of the
+    function node, which are known"""
+    inference = TypeInference(ast, is_builtin, number_classes)
+    bindings = Bindings(ast)
+    for child in node.code:
+        bindings.visit(child)
+    if bindings.give_up:
+        return {}
+    for arg in node.argnames:
+        if isinstance(arg, tuple):
+            for a in arg:
+                bindings.bind_unknown(a)
+        else:
+            bindings.bind_unknown(arg)
+    local_builtin = lambda name: (not name in bindings.values
+                                  and is_builtin(name))
+    inference.is_builtin = local_builtin
+    loops = set([id(n) for n in bindings.ranges])
+    ranges = set([id(n) for n in bindings.ranges if inference.range_call(n)])
+
+    types = {}
+    for name in bindings.values:
+        if name in bindings.unknown:
+            types[name] = UNKNOWN
+        else:
+            types[name] = UNBOUND
+    name_type = lambda name: types.get(name, UNKNOWN)
+    changed = True
+    while changed:
+        changed = False
+        for name, values in bindings.values.iteritems():
+            if types[name] == UNKNOWN:
+                continue
+            t = UNBOUND
+            for value in values:
+                if id(value) in ranges:
+                    t = join(t, 'int')
+                elif id(value) in loops:
+                    # a for loop over something else
+                    t = UNKNOWN
+                else:
+                    t = join(t, inference.expr_type(value, name_type))
+            if t != types[name]:
+                types[name] = t
+                changed = True
+    known = {}
+    for name, t in types.iteritems():
+        if t in NUMBERS:
+            known[name] = t
+    return known
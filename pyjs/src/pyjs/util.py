@@ -1,5 +1,8 @@
 import os
+import stat
 import shutil
+import filecmp
+import gzip
 import re
 import logging
 
@@ -14,8 +17,48 @@ DEFAULT_SKIP_FILES=re.compile(
     r"(.*\.egg-info.*)|"
     r")$" % {'sep': os.path.sep})
 
+def up_to_date(srcname, dstname, hardlink=False):
+    """whether dstname has the content of srcname. files of the same
+    size and modification time are taken to be equal, files which
+    only differ in their modification time are compared"""
+    try:
+        src_st = os.stat(srcname)
+        dst_st = os.stat(dstname)
+    except OSError:
+        return False
+    if not stat.S_ISREG(dst_st.st_mode):
+        return False
+    if hardlink:
+        return (src_st.st_ino, src_st.st_dev) == (dst_st.st_ino, dst_st.st_dev)
+    if src_st.st_size != dst_st.st_size:
+        return False
+    if int(src_st.st_mtime) == int(dst_st.st_mtime):
+        return True
+    if filecmp.cmp(srcname, dstname, shallow=False):
+        # the next build can tell from the modification time
+        shutil.copystat(srcname, dstname)
+        return True
+    return False
+
+def sync_file(srcname, dstname, hardlink=False):
+    """copies (or hardlinks) srcname to dstname unless dstname is up to
+    date. returns whether the file was copied"""
+    if up_to_date(srcname, dstname, hardlink):
+        return False
+    if hardlink:
+        if os.path.lexists(dstname):
+            os.remove(dstname)
+        try:
+            os.link(srcname, dstname)
+            return True
+        except OSError:
+            # e.g. another file system, copy instead
+            pass
+    shutil.copy2(srcname, dstname)
+    return True
+
 def copytree_exists(src, dst, symlinks=False,
-                    skip_files=DEFAULT_SKIP_FILES):
+                    skip_files=DEFAULT_SKIP_FILES, hardlink=False):
     if not os.path.exists(src):
         return
     names = os.listdir(src)
@@ -35,15 +78,16 @@ def copytree_exists(src, dst, symlinks=False,
                 linkto = os.readlink(srcname)
                 os.symlink(linkto, dstname)
             elif os.path.isdir(srcname):
-                copytree_exists(srcname, dstname, symlinks, skip_files=skip_files)
+                copytree_exists(srcname, dstname, symlinks,
+                                skip_files=skip_files, hardlink=hardlink)
             else:
-                shutil.copy2(srcname, dstname)
+                sync_file(srcname, dstname, hardlink)
         except (IOError, os.error), why:
             errors.append((srcname, dstname, why))
     if errors:
         print errors
 
-def copy_exists(srcname, dstname, symlinks=False):
+def copy_exists(srcname, dstname, symlinks=False, hardlink=False):
     if not os.path.exists(srcname):
         return
     errors = []
@@ -52,10 +96,27 @@ def copy_exists(srcname, dstname, symlinks=False):
             linkto = os.readlink(srcname)
             os.symlink(linkto, dstname)
         else:
-            shutil.copyfile(srcname, dstname)
-            shutil.copystat(srcname, dstname)
+            sync_file(srcname, dstname, hardlink)
     except (IOError, os.error), why:
         errors.append((srcname, dstname, why))
     if errors:
         print errors
 
+
+def gzip_file(path, level=9):
+    """writes path + '.gz' and returns the path, its size and the
+    compressed size. the output does not depend on the time of the
+    build"""
+    f = open(path, 'rb')
+    data = f.read()
+    f.close()
+    tmp_path = '%s.gz.%s.tmp' % (path, os.getpid())
+    f = open(tmp_path, 'wb')
+    try:
+        gz = gzip.GzipFile(os.path.basename(path), 'wb', level, f, mtime=0)
+        gz.write(data)
+        gz.close()
+    finally:
+        f.close()
+    os.rename(tmp_path, path + '.gz')
+    return path, len(data), os.path.getsize(path + '.gz')
@@ -0,0 +1,38 @@
+"""Vendor bundles.
+
+Applications which are built into the same output directory inline
+the modules they all use (pyjslib, sys, pyjamas.DOM, the widgets ...)
+into each of their app files. A vendor bundle holds these modules once
+per platform. The app files load it with a script tag and only inline
+the modules of their own, so browsers download and cache the shared
+modules once for all applications.
+"""
+
+import hashlib
+
+
+def shared_modules(apps):
+    """returns the modules (name -> file) which are inlined by all
+    applications. apps holds a list of (module name, file) per
+    application"""
+    if not apps:
+        return {}
+    shared = dict(apps[0])
+    for modules in apps[1:]:
+        files = dict(modules)
+        for name in shared.keys():
+            if files.get(name) != shared[name]:
+                del shared[name]
+    return shared
+
+
+def bundle_code(modules, read):
+    """returns the code of the bundle of modules (name -> file). read
+    returns the content of a file"""
+    return '\n'.join([read(modules[name]) for name in sorted(modules)])
+
+
+def bundle_name(code):
+    """the bundle is named after its content, so that it can be cached
+    for ever"""
+    return 'vendor.%s.js' % hashlib.md5(code).hexdigest()
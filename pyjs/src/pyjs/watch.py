@@ -0,0 +1,78 @@
+import os
+import sys
+import time
+import logging
+import buildcache
+import linker
+import translator
+
+
+class Watcher(object):
+    """Rebuilds an application whenever one of its sources changes.
+
+    The linker, the module lookups and the translated modules stay in
+    memory between builds, so a rebuild only translates the modules
+    whose sources changed and then links the app files again.
+    """
+
+    def __init__(self, linker_, interval=0.5, out=None):
+        self.linker = linker_
+        self.interval = interval
+        self.out = out or sys.stdout
+        if self.linker.translation_cache is None:
+            self.linker.translation_cache = buildcache.TranslationCache()
+        self.mtimes = {}
+
+    def snapshot(self):
+        """returns the modification times of all sources of the last
+        build and of the directories they live in"""
+        mtimes = {}
+        for path in self.linker.source_files:
+            for p in (path, os.path.dirname(path)):
+                if p in mtimes:
+                    continue
+                try:
+                    mtimes[p] = os.stat(p).st_mtime
+                except OSError:
+                    mtimes[p] = None
+        return mtimes
+
+    def changed(self):
+        """returns the sources and directories which changed since the
+        last build"""
+        mtimes = self.snapshot()
+        return sorted([p for p, mtime in mtimes.items()
+                       if self.mtimes.get(p) != mtime])
+
+    def build(self, changed=[]):
+        if [p for p in changed if os.path.isdir(p)]:
+            # files were added or removed
+            linker.clear_path_cache()
+        cache = self.linker.translation_cache
+        misses = cache.misses
+        start = time.time()
+        try:
+            self.linker()
+        except (translator.TranslationError, SyntaxError), e:
+            print >> self.out, "Build failed:", e
+        else:
+            print >> self.out, "Built in %.2fs (%d modules translated)" % (
+                time.time() - start, cache.misses - misses)
+        self.mtimes = self.snapshot()
+
+    def run(self, count=None):
+        """builds the application and rebuilds it on every change. if
+        count is given, stop after that many rebuilds"""
+        self.build()
+        print >> self.out, "Watching %d files for changes" % (
+            len(self.linker.source_files))
+        while count is None or count > 0:
+            time.sleep(self.interval)
+            changed = self.changed()
+            if not changed:
+                continue
+            for p in changed:
+                logging.info('Changed: %s' % p)
+            self.build(changed)
+            if count is not None:
+                count -= 1
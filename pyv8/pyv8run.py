@@ -269,6 +269,7 @@ def build_script():
         inline_code = options.inline_code,
         operator_funcs = options.operator_funcs,
         number_classes = options.number_classes,
+        optimize = options.optimize,
         )
 
     l = PyV8Linker(args, #[top_module],